@@ -50,6 +50,14 @@
 #define ERR_ALLOC                11
 #define ERR_DIM_NOTVALID         12
 #define ERR_SPREAD_THREAD_NOTVALID 13
+// reading or writing an FFTW wisdom file failed...
+#define ERR_FFTW_WISDOM          14
+// real mode (opts.realmode) for type 3, or wrong execute for a real-mode plan...
+#define ERR_REALMODE             15
+// updatepts NU pt index outside [0,M) of the last setpts...
+#define ERR_PTS_INDEX            16
+// reading or writing a bin tuning file failed...
+#define ERR_BIN_TUNING           17
 
 
 
@@ -10,6 +10,7 @@
 #ifdef SINGLE
   typedef fftwf_complex FFTW_CPX;           //  single-prec has fftwf_*
   typedef fftwf_plan FFTW_PLAN;
+  typedef fftwf_iodim64 FFTW_IODIM64;
   #define FFTW_INIT fftwf_init_threads
   #define FFTW_PLAN_TH fftwf_plan_with_nthreads
   #define FFTW_ALLOC_RE fftwf_alloc_real
@@ -18,10 +19,20 @@
   #define FFTW_PLAN_2D fftwf_plan_dft_2d
   #define FFTW_PLAN_3D fftwf_plan_dft_3d
   #define FFTW_PLAN_MANY_DFT fftwf_plan_many_dft
+  #define FFTW_PLAN_MANY_R2C fftwf_plan_many_dft_r2c
+  #define FFTW_PLAN_MANY_C2R fftwf_plan_many_dft_c2r
+  #define FFTW_PLAN_GURU64_DFT fftwf_plan_guru64_dft
+  #define FFTW_PLAN_GURU64_R2C fftwf_plan_guru64_dft_r2c
+  #define FFTW_PLAN_GURU64_C2R fftwf_plan_guru64_dft_c2r
   #define FFTW_EX fftwf_execute
+  #define FFTW_EX_DFT fftwf_execute_dft
+  #define FFTW_EX_R2C fftwf_execute_dft_r2c
+  #define FFTW_EX_C2R fftwf_execute_dft_c2r
   #define FFTW_DE fftwf_destroy_plan
   #define FFTW_FR fftwf_free
   #define FFTW_FORGET_WISDOM fftwf_forget_wisdom
+  #define FFTW_IMPORT_WIS fftwf_import_wisdom_from_filename
+  #define FFTW_EXPORT_WIS fftwf_export_wisdom_to_filename
   #define FFTW_CLEANUP fftwf_cleanup
   #define FFTW_CLEANUP_THREADS fftwf_cleanup_threads
   #ifdef FFTW_PLAN_SAFE
@@ -32,6 +43,7 @@
 #else
   typedef fftw_complex FFTW_CPX;           // double-prec has fftw_*
   typedef fftw_plan FFTW_PLAN;
+  typedef fftw_iodim64 FFTW_IODIM64;
   #define FFTW_INIT fftw_init_threads
   #define FFTW_PLAN_TH fftw_plan_with_nthreads
   #define FFTW_ALLOC_RE fftw_alloc_real
@@ -40,10 +52,20 @@
   #define FFTW_PLAN_2D fftw_plan_dft_2d
   #define FFTW_PLAN_3D fftw_plan_dft_3d
   #define FFTW_PLAN_MANY_DFT fftw_plan_many_dft
+  #define FFTW_PLAN_MANY_R2C fftw_plan_many_dft_r2c
+  #define FFTW_PLAN_MANY_C2R fftw_plan_many_dft_c2r
+  #define FFTW_PLAN_GURU64_DFT fftw_plan_guru64_dft
+  #define FFTW_PLAN_GURU64_R2C fftw_plan_guru64_dft_r2c
+  #define FFTW_PLAN_GURU64_C2R fftw_plan_guru64_dft_c2r
   #define FFTW_EX fftw_execute
+  #define FFTW_EX_DFT fftw_execute_dft
+  #define FFTW_EX_R2C fftw_execute_dft_r2c
+  #define FFTW_EX_C2R fftw_execute_dft_c2r
   #define FFTW_DE fftw_destroy_plan
   #define FFTW_FR fftw_free
   #define FFTW_FORGET_WISDOM fftw_forget_wisdom
+  #define FFTW_IMPORT_WIS fftw_import_wisdom_from_filename
+  #define FFTW_EXPORT_WIS fftw_export_wisdom_to_filename
   #define FFTW_CLEANUP fftw_cleanup
   #define FFTW_CLEANUP_THREADS fftw_cleanup_threads
   #ifdef FFTW_PLAN_SAFE
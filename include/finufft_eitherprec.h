@@ -14,14 +14,27 @@
 // Here just what's needed to describe the headers for what finufft provides
 #include <dataTypes.h>
 #include <nufft_opts.h>
+#include <finufft_stats.h>
 #include <finufft_plan_eitherprec.h>
 
 // clear the macros so we can define w/o warnings...
 #undef FINUFFT_DEFAULT_OPTS
 #undef FINUFFT_MAKEPLAN
 #undef FINUFFT_SETPTS
+#undef FINUFFT_UPDATEPTS
+#undef FINUFFT_INTERP_MATRIX
 #undef FINUFFT_EXECUTE
+#undef FINUFFT_EXECUTE_REALIN
+#undef FINUFFT_EXECUTE_REALOUT
+#undef FINUFFT_EXECUTE_ADJOINT
+#undef FINUFFT_EXECUTE_NORMAL
+#undef FINUFFT_EXECUTE_MANY
+#undef FINUFFT_GET_STATS
 #undef FINUFFT_DESTROY
+#undef FINUFFT_IMPORT_WISDOM
+#undef FINUFFT_EXPORT_WISDOM
+#undef FINUFFT_IMPORT_TUNING
+#undef FINUFFT_EXPORT_TUNING
 #undef FINUFFT1D1
 #undef FINUFFT1D1MANY
 #undef FINUFFT1D2
@@ -45,8 +58,20 @@
 #define FINUFFT_DEFAULT_OPTS finufftf_default_opts
 #define FINUFFT_MAKEPLAN finufftf_makeplan
 #define FINUFFT_SETPTS finufftf_setpts
+#define FINUFFT_UPDATEPTS finufftf_updatepts
+#define FINUFFT_INTERP_MATRIX finufftf_interp_matrix
 #define FINUFFT_EXECUTE finufftf_execute
+#define FINUFFT_EXECUTE_REALIN finufftf_execute_realin
+#define FINUFFT_EXECUTE_REALOUT finufftf_execute_realout
+#define FINUFFT_EXECUTE_ADJOINT finufftf_execute_adjoint
+#define FINUFFT_EXECUTE_NORMAL finufftf_execute_normal
+#define FINUFFT_EXECUTE_MANY finufftf_execute_many
+#define FINUFFT_GET_STATS finufftf_get_stats
 #define FINUFFT_DESTROY finufftf_destroy
+#define FINUFFT_IMPORT_WISDOM finufftf_import_wisdom
+#define FINUFFT_EXPORT_WISDOM finufftf_export_wisdom
+#define FINUFFT_IMPORT_TUNING finufftf_import_tuning
+#define FINUFFT_EXPORT_TUNING finufftf_export_tuning
 #define FINUFFT1D1 finufftf1d1
 #define FINUFFT1D1MANY finufftf1d1many
 #define FINUFFT1D2 finufftf1d2
@@ -69,8 +94,20 @@
 #define FINUFFT_DEFAULT_OPTS finufft_default_opts
 #define FINUFFT_MAKEPLAN finufft_makeplan
 #define FINUFFT_SETPTS finufft_setpts
+#define FINUFFT_UPDATEPTS finufft_updatepts
+#define FINUFFT_INTERP_MATRIX finufft_interp_matrix
 #define FINUFFT_EXECUTE finufft_execute
+#define FINUFFT_EXECUTE_REALIN finufft_execute_realin
+#define FINUFFT_EXECUTE_REALOUT finufft_execute_realout
+#define FINUFFT_EXECUTE_ADJOINT finufft_execute_adjoint
+#define FINUFFT_EXECUTE_NORMAL finufft_execute_normal
+#define FINUFFT_EXECUTE_MANY finufft_execute_many
+#define FINUFFT_GET_STATS finufft_get_stats
 #define FINUFFT_DESTROY finufft_destroy
+#define FINUFFT_IMPORT_WISDOM finufft_import_wisdom
+#define FINUFFT_EXPORT_WISDOM finufft_export_wisdom
+#define FINUFFT_IMPORT_TUNING finufft_import_tuning
+#define FINUFFT_EXPORT_TUNING finufft_export_tuning
 #define FINUFFT1D1 finufft1d1
 #define FINUFFT1D1MANY finufft1d1many
 #define FINUFFT1D2 finufft1d2
@@ -104,8 +141,20 @@ extern "C"
 void FINUFFT_DEFAULT_OPTS(nufft_opts *o);
 int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag, int n_transf, FLT tol, FINUFFT_PLAN* plan, nufft_opts* o);
 int FINUFFT_SETPTS(FINUFFT_PLAN plan , BIGINT M, FLT *xj, FLT *yj, FLT *zj, BIGINT N, FLT *s, FLT *t, FLT *u); 
+int FINUFFT_UPDATEPTS(FINUFFT_PLAN plan, BIGINT n, BIGINT *ind, FLT *x, FLT *y, FLT *z);
+int FINUFFT_INTERP_MATRIX(FINUFFT_PLAN plan, BIGINT* nf, BIGINT* nnzrow, BIGINT* cols, FLT* vals);
 int FINUFFT_EXECUTE(FINUFFT_PLAN plan, CPX* weights, CPX* result);
+int FINUFFT_EXECUTE_REALIN(FINUFFT_PLAN plan, FLT* in, CPX* out);
+int FINUFFT_EXECUTE_REALOUT(FINUFFT_PLAN plan, CPX* in, FLT* out);
+int FINUFFT_EXECUTE_ADJOINT(FINUFFT_PLAN plan, CPX* weights, CPX* result);
+int FINUFFT_EXECUTE_NORMAL(FINUFFT_PLAN plan, CPX* in, CPX* out, FLT* w);
+int FINUFFT_EXECUTE_MANY(int nplans, FINUFFT_PLAN* plans, CPX** cj, CPX** fk, int nthreads);
+int FINUFFT_GET_STATS(FINUFFT_PLAN plan, finufft_stats* stats);
 int FINUFFT_DESTROY(FINUFFT_PLAN plan);
+int FINUFFT_IMPORT_WISDOM(const char* filename);
+int FINUFFT_EXPORT_WISDOM(const char* filename);
+int FINUFFT_IMPORT_TUNING(const char* filename);
+int FINUFFT_EXPORT_TUNING(const char* filename);
 
 
 // ----------------- the 18 simple interfaces -------------------------------
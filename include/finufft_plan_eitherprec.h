@@ -14,6 +14,8 @@
 #include <fftw_defs.h>
 #include <nufft_opts.h>
 #include <spread_opts.h>
+#include <finufft_stats.h>
+#include <thread_arenas.h>
 
 #ifndef __cplusplus
 #include <stdbool.h>     // for bools in C
@@ -21,15 +23,18 @@
 
 // clear macros so can refine
 #undef TYPE3PARAMS
+#undef FFTPLAN
 #undef FINUFFT_PLAN
 #undef FINUFFT_PLAN_S
 #ifdef SINGLE
 #define FINUFFT_PLAN_S finufftf_plan_s
 #define TYPE3PARAMS type3Paramsf
+#define FFTPLAN fftPlanf
 #define FINUFFT_PLAN finufftf_plan
 #else
 #define FINUFFT_PLAN_S finufft_plan_s
 #define TYPE3PARAMS type3Params
+#define FFTPLAN fftPlan
 #define FINUFFT_PLAN finufft_plan
 #endif
 
@@ -44,14 +49,24 @@ typedef struct {
   FLT X3,C3,D3,h3,gam3;  // z
 } TYPE3PARAMS;
 
+// an FFT of a batch of fine grids (t1,2): one FFTW plan, or if pruned (see
+// opts.fft_prune) those of its 1D passes along each dim, each on the part of
+// the grids it needs, run in turn:
+#define MAX_FFT_PARTS 7   // (3D: 4 z-passes, 2 y-passes and an x-pass)
+typedef struct {
+  int n;                          // number of FFTW plans, 0 if not planned
+  FFTW_PLAN plan[MAX_FFT_PARTS];
+  BIGINT off[MAX_FFT_PARTS];      // where each acts, in FFTW_CPXs into fwBatch
+} FFTPLAN;
+
 
 typedef struct FINUFFT_PLAN_S {  // the main plan struct; note C-compatible struct
   
   int type;        // transform type (Rokhlin naming): 1,2 or 3
   int dim;         // overall dimension: 1,2 or 3
   int ntrans;      // how many transforms to do at once (vector or "many" mode)
-  int nj;          // number of NU pts in type 1,2 (for type 3, num input x pts)
-  int nk;          // number of NU freq pts (type 3 only)
+  BIGINT nj;       // number of NU pts in type 1,2 (for type 3, num input x pts)
+  BIGINT nk;       // number of NU freq pts (type 3 only)
   FLT tol;         // relative user tolerance
   int batchSize;   // # strength vectors to group together for FFTW, etc
   int nbatch;      // how many batches done to cover all ntrans vectors
@@ -65,6 +80,8 @@ typedef struct FINUFFT_PLAN_S {  // the main plan struct; note C-compatible stru
   BIGINT nf2;      // " y
   BIGINT nf3;      // " z
   BIGINT nf;       // total # fine grid points (product of the above three)
+  BIGINT nfw;      // # complex entries per fine grid in fwBatch: nf, or in
+                   // real mode (nf1/2+1)*nf2*nf3 (half-spectrum, or real grid)
   
   int fftSign;     // sign in exponential for NUFFT defn, guaranteed to be +-1
 
@@ -74,12 +91,23 @@ typedef struct FINUFFT_PLAN_S {  // the main plan struct; note C-compatible stru
   
   FFTW_CPX* fwBatch;    // (batches of) fine grid(s) for FFTW to plan & act on.
                         // Usually the largest working array
+  FFTW_CPX* fwBatch2;   // (t1,2, if pipelined) second fwBatch, else NULL
   
   BIGINT *sortIndices;  // precomputed NU pt permutation, speeds spread/interp
   bool didSort;         // whether binsorting used (false: identity perm used)
+  BIGINT *sortPos;      // (t1,2) inverse of sortIndices, & start of each bin
+  BIGINT *binStart;     // in it; built by the first updatepts, else NULL
+  thread_arenas* spreadScratch;  // spreader's reusable per-thread workspace,
+  int nSpreadScratch;            // one set per batch thread (spread_thread=2)
 
   FLT *X, *Y, *Z;  // for t1,2: ptr to user-supplied NU pts (no new allocs).
                    // for t3: allocated as "primed" (scaled) src pts x'_j, etc
+  FLT *Xs, *Ys, *Zs;  // if opts.spread_precompute_coords: X,Y,Z folded and
+                      // in sorted order (one aligned alloc at Xs), else NULL
+  FLT *kerTab;  // if opts.spread_kernel_table_mb (and fits): dim*nspread
+                // kernel values of each NU pt, in sorted order, else NULL
+  BIGINT *interpCols;  // if opts.spread_interp_matrix_mb (and fits): the
+  FLT *interpVals;     // interpolation matrix, rows in sorted order, else NULL
 
   // type 3 specific
   FLT *S, *T, *U;  // pointers to user's target NU pts arrays (no new allocs)
@@ -91,9 +119,17 @@ typedef struct FINUFFT_PLAN_S {  // the main plan struct; note C-compatible stru
   FINUFFT_PLAN innerT2plan;   // ptr used for type 2 in step 2 of type 3
   
   // other internal structs; each is C-compatible of course
-  FFTW_PLAN fftwPlan;
+  FFTPLAN fftwPlan;
+  FFTPLAN fftwPlanAdj;    // opposite-sign FFT for the adjoint (t1,2), or none
+  FFTPLAN fftwPlanPipe;   // (t1,2, if pipelined) fftwPlan with the pipeline's
+                          // FFT threads, run on fwBatch or fwBatch2, or none
+  int nthrPipe;           // (if pipelined) threads of its FFT stage
+  FFTPLAN fftwPlanLast, fftwPlanAdjLast, fftwPlanPipeLast;  // the above
+                          // for the last batch if smaller (ntrans % batchSize
+                          // transforms, on the first ones of fwBatch), or none
   nufft_opts opts;     // this and spopts could be made ptrs
   spread_opts spopts;
+  finufft_stats stats; // timings and statistics, see finufft_get_stats
   
 } FINUFFT_PLAN_S;
 
@@ -0,0 +1,43 @@
+#ifndef STATS_H
+#define STATS_H
+
+// ------------- Struct of FINUFFT plan timings and statistics ----------------
+// Deliberately a plain C struct, without special types, so that it is the
+// same for both precisions. Filled in by makeplan, setpts and execute (also
+// when opts.debug=0), and copied out by finufft_get_stats.
+// Sync with python/finufft/_finufft.py:FinufftStats when you change this.
+
+typedef struct finufft_stats{ // all times in seconds
+  // the last makeplan...
+  double t_makeplan;      // total
+  double t_kernel;        // (type 1,2) Fourier series of the spreading kernel
+  double t_alloc;         // (type 1,2) allocation of the fine grids fwBatch
+  double t_fftwplan;      // (type 1,2) FFTW planning
+
+  // the last setpts...
+  double t_setpts;        // total
+  double t_sort;          // bin-sort of the NU pts
+  double t_t3prep;        // (type 3) rescaling, allocation, phase & deconv factors
+  double t_t3inner;       // (type 3) plan and setpts of the inner type 2
+
+  // the last execute (or execute_adjoint, execute_normal)...
+  double t_execute;       // total
+  double t_spreadinterp;  // spreading and/or interpolation
+  double t_fft;           // FFTs (type 3: those of the inner type 2)
+  double t_deconv;        // deconvolve (amplify) & shuffle (type 3: and phase)
+  double t_prephase;      // (type 3) pre-phasing of the strengths
+  double t_inner;         // (type 3) total of the inner type 2 executes
+  int nbatch;             // number of batches done
+  int pipelined;          // (type 1,2) whether they were pipelined, so that
+                          // the above stage times overlap (opts.pipeline)
+
+  // cumulative and plan-wide...
+  long long nexecute;     // executes since makeplan
+  double t_executetotal;  // their total time
+  int nthreads;           // threads used
+  int batchsize;          // transforms per batch
+  int didsort;            // whether the last setpts sorted the NU pts
+  long long bytes;        // bytes of working arrays held by the plan
+} finufft_stats;
+
+#endif  // STATS_H
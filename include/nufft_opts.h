@@ -30,6 +30,26 @@ typedef struct nufft_opts{    // defaults see finufft.cpp:finufft_default_opts()
   int maxbatchsize;       // (vectorized ntr>1 only): max transform batch, 0 auto
   int spread_nthr_atomic; // if >=0, threads above which spreader OMP critical goes atomic
   int spread_max_sp_size; // if >0, overrides spreader (dir=1) max subproblem size
+  int realmode;           // (type 1,2 only): 0 complex, 1 real (Hermitian) mode:
+                          // real strengths (t1) or real part output (t2)
+  int spread_precompute_coords; // 0 fold NU pts at each execute, 1 store them
+                          // folded & sorted at setpts (M*dim more FLTs)
+  int spread_kernel_table_mb; // if >0, store the kernel values of the NU pts
+                          // at setpts, if they fit in this many MB, else 0 no
+  int spread_interp_matrix_mb; // (type 1,2 only): if >0, store the sparse
+                          // interpolation matrix at setpts, if it fits in this
+                          // many MB, and interpolate with it; else 0 no
+  int spread_partition;   // 0: spread subgrids added under OMP critical or
+                          // atomic, 1: lock-free in non-overlapping grid tiles
+  int spread_bin_tune;    // sort bin sizes & threads: 0 fixed, 1 chosen from
+                          // cache sizes, w & dim, 2 timed at the first
+                          // setpts of each size, then reused (also from file)
+  int pipeline;           // (type 1,2, ntrans>batch only): 0 batches in turn,
+                          // 1 overlap the spread/interp of one batch with the
+                          // FFT of the next, in two fine grid workspaces
+  int fft_prune;          // (type 1,2, dim>1, not realmode): 0 full FFTs of
+                          // the fine grid, 1 skip its lines that are all zero
+                          // (type 2 input) or not kept (type 1 output)
   // sphinx tag (don't remove): @opts_end
 } nufft_opts;
 
@@ -18,11 +18,23 @@ typedef struct spread_opts {  // see spreadinterp:setup_spreader for defaults.
                           // (this helps SIMD for kerevalmeth=0, eg on i7).
   int nthreads;           // # threads for spreadinterp (0: use max avail)
   int sort_threads;       // # threads for sort (0: auto-choice up to nthreads)
+  double bin_size_x;      // box size of the bins of the sort, in U grid pts,
+  double bin_size_y;      // in each dim (only affects speed)
+  double bin_size_z;
   int max_subproblem_size; // # pts per t1 subprob; sets extra RAM per thread
   int flags;              // binary flags for timing only (may give wrong ans
                           // if changed from 0!). See spreadinterp.h
   int debug;              // 0: silent, 1: small text output, 2: verbose
   int atomic_threshold;   // num threads before switching spreadSorted to using atomic ops
+  int partition;          // 1: spreadSorted adds subgrids lock-free, in phases
+                          // of non-overlapping grid tiles (if sorted, nthr>1)
+  int realdata;           // 0: NU data complex, 1: real NU strengths (dir=1;
+                          // imag parts taken as 0), read without copying
+  int realgrid;           // 1: real uniform grid and real NU data (dir=1,2),
+                          // one FLT per entry, for the real (Hermitian) mode
+  int presorted;          // 1: kx,ky,kz passed to spreadinterpSorted are
+                          // already folded & rescaled, in sorted order, ie
+                          // kx[i] is for NU pt sort_indices[i] (foldCoords)
   double upsampfac;       // sigma, upsampling factor
   // ES kernel specific consts used in fast eval, depend on precision FLT...
   FLT ES_beta;
@@ -7,6 +7,7 @@
 
 #include <dataTypes.h>
 #include <spread_opts.h>
+#include <thread_arenas.h>
 
 /* Bitwise debugging timing flag (TF) definitions; see spread_opts.flags.
     This is an unobtrusive way to determine the time contributions of the
@@ -31,15 +32,40 @@ int spreadcheck(BIGINT N1, BIGINT N2, BIGINT N3,
                  BIGINT M, FLT *kx, FLT *ky, FLT *kz, spread_opts opts);
 int indexSort(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3, BIGINT M, 
                FLT *kx, FLT *ky, FLT *kz, spread_opts opts);
+BIGINT* indexSortBins(BIGINT* sort_pos, BIGINT* sort_indices, BIGINT N1,
+                      BIGINT N2, BIGINT N3, BIGINT M, FLT *kx, FLT *ky,
+                      FLT *kz, spread_opts opts);
+BIGINT indexSortUpdate(BIGINT* sort_indices, BIGINT* sort_pos,
+                       BIGINT* bin_start, BIGINT N1, BIGINT N2, BIGINT N3,
+                       BIGINT M, FLT *kx, FLT *ky, FLT *kz, BIGINT n,
+                       BIGINT* ind, FLT *x, FLT *y, FLT *z, spread_opts opts,
+                       FLT *fx, FLT *fy, FLT *fz, FLT *ktab,
+                       BIGINT *mcols, FLT *mvals);
+void foldCoords(FLT *fx, FLT *fy, FLT *fz, BIGINT* dst, BIGINT* src,
+                BIGINT n, BIGINT N1, BIGINT N2, BIGINT N3, FLT *kx, FLT *ky,
+                FLT *kz, spread_opts opts);
+void kernelTable(FLT *ktab, BIGINT* dst, BIGINT* src, BIGINT n, BIGINT N1,
+                 BIGINT N2, BIGINT N3, FLT *kx, FLT *ky, FLT *kz,
+                 spread_opts opts);
+void interpMatrix(BIGINT *cols, FLT *vals, BIGINT* dst, BIGINT* src, BIGINT n,
+                  BIGINT N1, BIGINT N2, BIGINT N3, FLT *kx, FLT *ky, FLT *kz,
+                  spread_opts opts);
+void interpCSR(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3,
+               FLT *data_uniform, BIGINT M, BIGINT *cols, FLT *vals,
+               FLT *data_nonuniform, spread_opts opts);
+void zeroGrid(FLT *data, BIGINT n, int nthr);
 int interpSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3, 
 		      FLT *data_uniform,BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-		 FLT *data_nonuniform, spread_opts opts, int did_sort);
+		 FLT *data_nonuniform, spread_opts opts, int did_sort,
+                 FLT *ktab);
 int spreadSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3, 
 		      FLT *data_uniform,BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-		 FLT *data_nonuniform, spread_opts opts, int did_sort);
+		 FLT *data_nonuniform, spread_opts opts, int did_sort,
+                 thread_arenas* scratch, FLT *ktab);
 int spreadinterpSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3, 
 		      FLT *data_uniform,BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-		      FLT *data_nonuniform, spread_opts opts, int did_sort);
+		      FLT *data_nonuniform, spread_opts opts, int did_sort,
+                      thread_arenas* scratch, FLT *ktab);
 FLT evaluate_kernel(FLT x,const spread_opts &opts);
 FLT evaluate_kernel_noexp(FLT x,const spread_opts &opts);
 int setup_spreader(spread_opts &opts,FLT eps,double upsampfac,int kerevalmeth, int debug, int showwarn, int dim);
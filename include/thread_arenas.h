@@ -0,0 +1,27 @@
+#ifndef THREAD_ARENAS_H
+#define THREAD_ARENAS_H
+
+#include <stddef.h>
+
+// ------------- Per-thread reusable scratch memory ("arenas") ---------------
+// A set of n slots, each a 64-byte-aligned block that only ever grows, so that
+// a hot loop run repeatedly (eg spreadSorted, once per execute and batch) does
+// no heap allocation once the slots are big enough. Slots are meant to be
+// grown (hence first touched) by the thread using them, keeping the memory
+// local to it on NUMA machines. The struct is plain C, to live in a plan.
+// Implemented in utils_precindep.cpp.
+
+typedef struct thread_arenas {
+  int n;          // number of slots
+  size_t* cap;    // bytes usable in each slot
+  char** raw;     // each slot as malloc'ed (NULL if not yet used)
+  char** buf;     // each slot's aligned start in raw
+} thread_arenas;
+
+void arenas_init(thread_arenas* a);
+int arenas_resize(thread_arenas* a, int n);
+void* arena_get(thread_arenas* a, int i, size_t bytes);
+size_t arenas_bytes(const thread_arenas* a);
+void arenas_free(thread_arenas* a);
+
+#endif  // THREAD_ARENAS_H
@@ -22,6 +22,12 @@ class CNTime {
 // openmp helpers
 int get_num_threads_parallel_block();
 
+// CPU cache sizes in bytes
+void get_cache_sizes(BIGINT *l1, BIGINT *l2);
+
+// per-thread scratch arenas
+#include "thread_arenas.h"
+
 // thread-safe rand number generator for Windows platform
 #ifdef _WIN32
 #include <random>
@@ -0,0 +1,175 @@
+#include <spreadinterp.h>
+#include <defs.h>
+#include <utils.h>
+#include <utils_precindep.h>
+
+#include <vector>
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#ifndef _WIN32
+#include <sys/resource.h>
+#endif
+
+static double peak_rss_mb()
+// peak resident memory of this process so far, in MB (0 if not known)
+{
+#ifdef _WIN32
+  return 0.0;
+#else
+  struct rusage r;
+  getrusage(RUSAGE_SELF,&r);
+#ifdef __APPLE__
+  return r.ru_maxrss/1e6;        // (in bytes)
+#else
+  return r.ru_maxrss/1e3;        // (in kB)
+#endif
+#endif
+}
+
+void usage()
+{
+  printf("usage: binsorttestnd dims [M N [reps [debug]]]\n\twhere dims=1,2 or 3\n\tM=# nonuniform pts\n\tN=# uniform pts\n\treps=# repeats of each timing (best is shown)\n\tdebug=0 (less text out), 1 (stage timings of the sort)\n\nexample: ./binsorttestnd 3 1e7 1e6 3\n");
+}
+
+int main(int argc, char* argv[])
+/* Microbenchmark of the bin sort of NU pts done by the spreader (indexSort,
+ * which calls bin_sort), in 1D, 2D, or 3D, with the default bin sizes.
+ * It times the sort with 1, 2, 4,... up to all available threads, and with
+ * the automatic choice of threads, and checks that the result is the same
+ * in all cases, and is a permutation ordering the pts by bin, stably. It
+ * also reports the peak memory the sorts add to that of the pts and of the
+ * sort_indices arrays, ie their working arrays.
+ * Try M >> N (dense) and M << N (sparse) regimes. See usage() for usage.
+ *
+ * Example: binsorttestnd 3 1e7 1e6
+ *
+ * Compilation: see ../makefile (target binsorttest).
+ */
+{
+  int d = 3;            // Cmd line args & their defaults:  default #dims
+  double w;
+  BIGINT M = 1e6;       // default # NU pts
+  BIGINT roughNg = 1e6; // default # U pts
+  int reps = 3;         // default
+  int debug = 0;        // default
+
+  if (argc<2 || argc==3 || argc>6) {
+    usage(); return (argc>1);
+  }
+  sscanf(argv[1],"%d",&d);
+  if (d<1 || d>3) {
+    printf("d must be 1, 2 or 3!\n"); usage(); return 1;
+  }
+  if (argc>2) {
+    sscanf(argv[2],"%lf",&w); M = (BIGINT)w;       // to read "1e6" right!
+    if (M<1) {
+      printf("M (# NU pts) must be positive!\n"); usage(); return 1;
+    }
+    sscanf(argv[3],"%lf",&w); roughNg = (BIGINT)w;
+    if (roughNg<1) {
+      printf("N (# U pts) must be positive!\n"); usage(); return 1;
+    }
+  }
+  if (argc>4) {
+    sscanf(argv[4],"%d",&reps);
+    if (reps<1) {
+      printf("reps must be positive!\n"); usage(); return 1;
+    }
+  }
+  if (argc>5) {
+    sscanf(argv[5],"%d",&debug);
+    if ((debug<0) || (debug>1)) {
+      printf("debug must be 0 or 1!\n"); usage(); return 1;
+    }
+  }
+
+  BIGINT N = (BIGINT)round(pow(roughNg,1.0/d));     // Fourier grid size per dim
+  BIGINT Ng = (BIGINT)pow(N,d);                     // actual total grid points
+  BIGINT N2 = (d>=2) ? N : 1, N3 = (d==3) ? N : 1;  // the y and z grid sizes
+  std::vector<FLT> kx(M),ky(1),kz(1);
+  if (d>1) ky.resize(M);                           // only alloc needed coords
+  if (d>2) kz.resize(M);
+
+  spread_opts opts;
+  int ier_set = setup_spreader(opts,(FLT)1e-6,2.0,1,0,1,d);
+  if (ier_set>1) {       // exit gracefully if can't set up.
+    printf("error when setting up spreader (ier_set=%d)!\n",ier_set);
+    return ier_set;
+  }
+  opts.pirange = 0;      // below has NU pts on [0,N) in each dim
+  opts.sort = 1;         // always sort
+  opts.spread_direction = 1;
+  opts.debug = debug;
+  BIGINT nb1 = N/opts.bin_size_x+1, nb2 = (d>1) ? N2/opts.bin_size_y+1 : 1;
+  BIGINT nbins = nb1*nb2*((d>2) ? (BIGINT)(N3/opts.bin_size_z+1) : 1);
+
+  printf("making random data...\n");
+#pragma omp parallel
+  {
+    unsigned int se=MY_OMP_GET_THREAD_NUM();  // needed for parallel random #s
+#pragma omp for schedule(dynamic,1000000)
+    for (BIGINT i=0; i<M; ++i) {
+      kx[i]=rand01r(&se)*N;
+      if (d>1) ky[i]=rand01r(&se)*N;      // only fill needed coords
+      if (d>2) kz[i]=rand01r(&se)*N;
+    }
+  }
+  printf("bin sort %dD, %.3g U pts, %.3g bins, %.3g NU pts (%.3g per bin):\n",
+         d,(double)Ng,(double)nbins,(double)M,(double)M/nbins);
+
+  std::vector<BIGINT> ref(M), ind(M);
+  int maxnthr = MY_OMP_GET_MAX_THREADS();
+  std::vector<int> nthrs;
+  for (int n=1; n<maxnthr; n*=2)
+    nthrs.push_back(n);
+  nthrs.push_back(maxnthr);
+  nthrs.push_back(0);                       // 0: indexSort's auto choice
+  CNTime timer;
+  double rss0 = peak_rss_mb();
+  for (size_t k=0; k<nthrs.size(); ++k) {
+    opts.sort_threads = nthrs[k];
+    double t = INFINITY;
+    for (int r=0; r<reps; ++r) {
+      timer.start();
+      indexSort(ind.data(), N, N2, N3, M, kx.data(), ky.data(), kz.data(), opts);
+      t = std::min(t, timer.elapsedsec());
+    }
+    if (nthrs[k])
+      printf("    %2d threads:  %.3g s \t%.3g pts/s\n",nthrs[k],t,M/t);
+    else
+      printf("    auto:        %.3g s \t%.3g pts/s\n",t,M/t);
+    if (k==0)
+      ref = ind;
+    else if (ind!=ref) {
+      printf("    result differs from that with 1 thread!\n");
+      return 1;
+    }
+  }
+
+  printf("    peak memory of the sorts: %.3g MB (sort_indices: %.3g MB)\n",
+         peak_rss_mb()-rss0,M*sizeof(BIGINT)/1e6);
+
+  // check ref is a permutation, sorted by bin, stably...
+  std::vector<char> seen(M,0);
+  BIGINT prevbin = -1, previ = -1;
+  for (BIGINT j=0; j<M; ++j) {
+    BIGINT i = ref[j];
+    if (i<0 || i>=M || seen[i]) {
+      printf("    not a permutation at %lld!\n",(long long)j);
+      return 1;
+    }
+    seen[i] = 1;
+    BIGINT i1 = kx[i]/opts.bin_size_x, i2 = 0, i3 = 0;
+    if (d>1) i2 = ky[i]/opts.bin_size_y;
+    if (d>2) i3 = kz[i]/opts.bin_size_z;
+    BIGINT bin = i1+nb1*(i2+nb2*i3);
+    if (bin<prevbin || (bin==prevbin && i<previ)) {
+      printf("    not sorted (stably) by bin at %lld!\n",(long long)j);
+      return 1;
+    }
+    prevbin = bin; previ = i;
+  }
+  printf("    sorted by bin, stably, and the same for all threads\n");
+  return 0;
+}
@@ -10,7 +10,7 @@
 
 void usage()
 {
-  printf("usage: spreadtestnd dims [M N [tol [sort [flags [debug [kerpad [kerevalmeth [upsampfac]]]]]]]]\n\twhere dims=1,2 or 3\n\tM=# nonuniform pts\n\tN=# uniform pts\n\ttol=requested accuracy\n\tsort=0 (don't sort NU pts), 1 (do), or 2 (maybe sort; default)\n\tflags: expert timing flags, 0 is default (see spreadinterp.h)\n\tdebug=0 (less text out), 1 (more), 2 (lots)\n\tkerpad=0 (no pad to mult of 4), 1 (do, for kerevalmeth=0 only)\n\tkerevalmeth=0 (direct), 1 (Horner ppval)\n\tupsampfac>1; 2 or 1.25 for Horner\n\nexample: ./spreadtestnd 1 1e6 1e6 1e-6 2 0 1\n");
+  printf("usage: spreadtestnd dims [M N [tol [sort [flags [debug [kerpad [kerevalmeth [upsampfac [partition]]]]]]]]]\n\twhere dims=1,2 or 3\n\tM=# nonuniform pts\n\tN=# uniform pts\n\ttol=requested accuracy\n\tsort=0 (don't sort NU pts), 1 (do), or 2 (maybe sort; default)\n\tflags: expert timing flags, 0 is default (see spreadinterp.h)\n\tdebug=0 (less text out), 1 (more), 2 (lots)\n\tkerpad=0 (no pad to mult of 4), 1 (do, for kerevalmeth=0 only)\n\tkerevalmeth=0 (direct), 1 (Horner ppval)\n\tupsampfac>1; 2 or 1.25 for Horner\n\tpartition=0 (critical/atomic subgrid adds; default), 1 (lock-free grid tiles)\n\nexample: ./spreadtestnd 1 1e6 1e6 1e-6 2 0 1\n");
 }
 
 int main(int argc, char* argv[])
@@ -27,7 +27,7 @@ int main(int argc, char* argv[])
  * Magland; expanded by Barnett 1/14/17. Better cmd line args 3/13/17
  * indep setting N 3/27/17. parallel rand() & sort flag 3/28/17
  * timing_flags 6/14/17. debug control 2/8/18. sort=2 opt 3/5/18, pad 4/24/18.
- * ier=1 warning not error, upsampfac 6/14/20.
+ * ier=1 warning not error, upsampfac 6/14/20. partition arg.
  */
 {
   int d = 3;            // Cmd line args & their defaults:  default #dims
@@ -40,8 +40,9 @@ int main(int argc, char* argv[])
   int kerpad = 0;       // default
   int kerevalmeth = 1;  // default: Horner
   FLT upsampfac = 2.0;  // standard
+  int partition = 0;    // default
   
-  if (argc<2 || argc==3 || argc>11) {
+  if (argc<2 || argc==3 || argc>12) {
     usage(); return (argc>1);
   }
   sscanf(argv[1],"%d",&d);
@@ -91,6 +92,12 @@ int main(int argc, char* argv[])
       printf("upsampfac must be >1.0!\n"); usage(); return 1;
     }
   }
+  if (argc>11) {
+    sscanf(argv[11],"%d",&partition);
+    if ((partition<0) || (partition>1)) {
+      printf("partition must be 0 or 1!\n"); usage(); return 1;
+    }
+  }
 
   int dodir1 = true;                        // control if dir=1 tested at all
   BIGINT N = (BIGINT)round(pow(roughNg,1.0/d));     // Fourier grid size per dim
@@ -117,6 +124,7 @@ int main(int argc, char* argv[])
   opts.upsampfac = upsampfac;
   opts.nthreads = 0;  // max # threads used, or 0 to use what's avail
   opts.sort_threads = 0;
+  opts.partition = partition;
   //opts.max_subproblem_size = 1e5;
   FLT maxerr, ansmod;
   
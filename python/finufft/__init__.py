@@ -8,11 +8,20 @@ saving FFTW plans, sorting the nonuniform points, and so on.
 
 # that was the docstring for the package finufft.
 
-__all__ = ["nufft1d1","nufft1d2","nufft1d3","nufft2d1","nufft2d2","nufft2d3","nufft3d1","nufft3d2","nufft3d3","Plan"]
+__all__ = ["nufft1d1","nufft1d2","nufft1d3","nufft2d1","nufft2d2","nufft2d3","nufft3d1","nufft3d2","nufft3d3","Plan","Operator","ToeplitzNormal","execute_many",
+           "nufft1d1r","nufft1d2r","nufft2d1r","nufft2d2r","nufft3d1r","nufft3d2r",
+           "set_plan_cache","plan_cache_info","clear_plan_cache",
+           "load_wisdom","save_wisdom","set_wisdom_dir","get_wisdom_dir",
+           "load_tuning","save_tuning"]
 # etc..
 
 # let's just get guru and nufft1d1 working first...
-from finufft._interfaces import Plan
+from finufft._interfaces import Plan,execute_many
+from finufft._operator import Operator,ToeplitzNormal
 from finufft._interfaces import nufft1d1,nufft1d2,nufft1d3
 from finufft._interfaces import nufft2d1,nufft2d2,nufft2d3
 from finufft._interfaces import nufft3d1,nufft3d2,nufft3d3
+from finufft._interfaces import nufft1d1r,nufft1d2r,nufft2d1r,nufft2d2r,nufft3d1r,nufft3d2r
+from finufft._plancache import set_plan_cache,plan_cache_info,clear_plan_cache
+from finufft._wisdom import load_wisdom,save_wisdom,set_wisdom_dir,get_wisdom_dir
+from finufft._wisdom import load_tuning,save_tuning
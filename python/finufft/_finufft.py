@@ -33,6 +33,9 @@ c_double_p = ctypes.POINTER(c_double)
 c_longlong_p = ctypes.POINTER(c_longlong)
 
 # TODO: See if there is a way to improve this so it is less hacky.
+# Note: the library must be loaded as a CDLL (never PyDLL), since ctypes then
+#   releases the GIL for the duration of every call into it, which lets other
+#   Python threads run during transforms (see Plan.execute_async).
 lib = None
 # Try to load a local library directly.
 try:
@@ -77,7 +80,43 @@ NufftOpts._fields_ = [('modeord', c_int),
                       ('spread_thread', c_int),
                       ('maxbatchsize', c_int),
                       ('spread_nthr_atomic', c_int),
-                      ('spread_max_sp_size', c_int)]
+                      ('spread_max_sp_size', c_int),
+                      ('realmode', c_int),
+                      ('spread_precompute_coords', c_int),
+                      ('spread_kernel_table_mb', c_int),
+                      ('spread_interp_matrix_mb', c_int),
+                      ('spread_partition', c_int),
+                      ('spread_bin_tune', c_int),
+                      ('pipeline', c_int),
+                      ('fft_prune', c_int)]
+
+
+class FinufftStats(ctypes.Structure):
+    pass
+
+
+FinufftStats._fields_ = [('t_makeplan', c_double),
+                         ('t_kernel', c_double),
+                         ('t_alloc', c_double),
+                         ('t_fftwplan', c_double),
+                         ('t_setpts', c_double),
+                         ('t_sort', c_double),
+                         ('t_t3prep', c_double),
+                         ('t_t3inner', c_double),
+                         ('t_execute', c_double),
+                         ('t_spreadinterp', c_double),
+                         ('t_fft', c_double),
+                         ('t_deconv', c_double),
+                         ('t_prephase', c_double),
+                         ('t_inner', c_double),
+                         ('nbatch', c_int),
+                         ('pipelined', c_int),
+                         ('nexecute', c_longlong),
+                         ('t_executetotal', c_double),
+                         ('nthreads', c_int),
+                         ('batchsize', c_int),
+                         ('didsort', c_int),
+                         ('bytes', c_longlong)]
 
 
 FinufftPlan = c_void_p
@@ -87,6 +126,7 @@ FinufftPlan_p = ctypes.POINTER(FinufftPlan)
 FinufftPlanf_p = ctypes.POINTER(FinufftPlanf)
 
 NufftOpts_p = ctypes.POINTER(NufftOpts)
+FinufftStats_p = ctypes.POINTER(FinufftStats)
 
 _default_opts = lib.finufft_default_opts
 _default_opts.argtypes = [NufftOpts_p]
@@ -116,6 +156,22 @@ _setptsf.argtypes = [
     ctypes.c_longlong, ndpointer(c_float), ndpointer(c_float), ndpointer(c_float)]
 _setptsf.restype = c_int
 
+_updatepts = lib.finufft_updatepts
+_updatepts.argtypes = [c_void_p, c_longlong, c_void_p, c_void_p, c_void_p, c_void_p]
+_updatepts.restype = c_int
+
+_updateptsf = lib.finufftf_updatepts
+_updateptsf.argtypes = [c_void_p, c_longlong, c_void_p, c_void_p, c_void_p, c_void_p]
+_updateptsf.restype = c_int
+
+_interp_matrix = lib.finufft_interp_matrix
+_interp_matrix.argtypes = [c_void_p, c_void_p, c_void_p, c_void_p, c_void_p]
+_interp_matrix.restype = c_int
+
+_interp_matrixf = lib.finufftf_interp_matrix
+_interp_matrixf.argtypes = [c_void_p, c_void_p, c_void_p, c_void_p, c_void_p]
+_interp_matrixf.restype = c_int
+
 _execute = lib.finufft_execute
 _execute.argtypes = [c_void_p, c_void_p, c_void_p]
 _execute.restype = c_int
@@ -124,6 +180,54 @@ _executef = lib.finufftf_execute
 _executef.argtypes = [c_void_p, c_void_p, c_void_p]
 _executef.restype = c_int
 
+_execute_realin = lib.finufft_execute_realin
+_execute_realin.argtypes = [c_void_p, c_void_p, c_void_p]
+_execute_realin.restype = c_int
+
+_execute_realinf = lib.finufftf_execute_realin
+_execute_realinf.argtypes = [c_void_p, c_void_p, c_void_p]
+_execute_realinf.restype = c_int
+
+_execute_realout = lib.finufft_execute_realout
+_execute_realout.argtypes = [c_void_p, c_void_p, c_void_p]
+_execute_realout.restype = c_int
+
+_execute_realoutf = lib.finufftf_execute_realout
+_execute_realoutf.argtypes = [c_void_p, c_void_p, c_void_p]
+_execute_realoutf.restype = c_int
+
+_execute_adjoint = lib.finufft_execute_adjoint
+_execute_adjoint.argtypes = [c_void_p, c_void_p, c_void_p]
+_execute_adjoint.restype = c_int
+
+_execute_adjointf = lib.finufftf_execute_adjoint
+_execute_adjointf.argtypes = [c_void_p, c_void_p, c_void_p]
+_execute_adjointf.restype = c_int
+
+_execute_normal = lib.finufft_execute_normal
+_execute_normal.argtypes = [c_void_p, c_void_p, c_void_p, c_void_p]
+_execute_normal.restype = c_int
+
+_execute_normalf = lib.finufftf_execute_normal
+_execute_normalf.argtypes = [c_void_p, c_void_p, c_void_p, c_void_p]
+_execute_normalf.restype = c_int
+
+_execute_many = lib.finufft_execute_many
+_execute_many.argtypes = [c_int, c_void_p, c_void_p, c_void_p, c_int]
+_execute_many.restype = c_int
+
+_execute_manyf = lib.finufftf_execute_many
+_execute_manyf.argtypes = [c_int, c_void_p, c_void_p, c_void_p, c_int]
+_execute_manyf.restype = c_int
+
+_get_stats = lib.finufft_get_stats
+_get_stats.argtypes = [c_void_p, FinufftStats_p]
+_get_stats.restype = c_int
+
+_get_statsf = lib.finufftf_get_stats
+_get_statsf.argtypes = [c_void_p, FinufftStats_p]
+_get_statsf.restype = c_int
+
 _destroy = lib.finufft_destroy
 _destroy.argtypes = [c_void_p]
 _destroy.restype = c_int
@@ -131,3 +235,48 @@ _destroy.restype = c_int
 _destroyf = lib.finufftf_destroy
 _destroyf.argtypes = [c_void_p]
 _destroyf.restype = c_int
+
+_import_wisdom = lib.finufft_import_wisdom
+_import_wisdom.argtypes = [ctypes.c_char_p]
+_import_wisdom.restype = c_int
+
+_import_wisdomf = lib.finufftf_import_wisdom
+_import_wisdomf.argtypes = [ctypes.c_char_p]
+_import_wisdomf.restype = c_int
+
+_export_wisdom = lib.finufft_export_wisdom
+_export_wisdom.argtypes = [ctypes.c_char_p]
+_export_wisdom.restype = c_int
+
+_export_wisdomf = lib.finufftf_export_wisdom
+_export_wisdomf.argtypes = [ctypes.c_char_p]
+_export_wisdomf.restype = c_int
+
+_import_tuning = lib.finufft_import_tuning
+_import_tuning.argtypes = [ctypes.c_char_p]
+_import_tuning.restype = c_int
+
+_import_tuningf = lib.finufftf_import_tuning
+_import_tuningf.argtypes = [ctypes.c_char_p]
+_import_tuningf.restype = c_int
+
+_export_tuning = lib.finufft_export_tuning
+_export_tuning.argtypes = [ctypes.c_char_p]
+_export_tuning.restype = c_int
+
+_export_tuningf = lib.finufftf_export_tuning
+_export_tuningf.argtypes = [ctypes.c_char_p]
+_export_tuningf.restype = c_int
+
+# the threads a plan with opts.nthreads=0 uses (MY_OMP_GET_MAX_THREADS of the
+# library, from the OpenMP runtime it links, or 1 if built without OpenMP)
+try:
+    _omp_get_max_threads = lib.omp_get_max_threads
+    _omp_get_max_threads.argtypes = []
+    _omp_get_max_threads.restype = c_int
+except AttributeError:
+    _omp_get_max_threads = None
+
+
+def _max_threads():
+    return _omp_get_max_threads() if _omp_get_max_threads else 1
@@ -10,14 +10,45 @@
 
 
 import numpy as np
+import os
+import functools
+import threading
 import warnings
 import numbers
 
+from concurrent.futures import ThreadPoolExecutor
+
 from ctypes import byref
 from ctypes import c_longlong
 from ctypes import c_void_p
 
 import finufft._finufft as _finufft
+import finufft._plancache as _plancache
+import finufft._wisdom as _wisdom
+
+### managed executor for Plan.execute_async
+_executor = None
+_executor_lock = threading.Lock()
+
+def _default_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # each transform is already multithreaded (OpenMP), so a few
+            # workers suffice to overlap transforms with the caller's work
+            _executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                           thread_name_prefix='finufft')
+        return _executor
+
+
+def _locked(method):
+    # run a Plan method holding the plan's lock
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 ### Plan class definition
 class Plan:
@@ -81,6 +112,18 @@ class Plan:
         eps             (float, optional): precision requested (>1e-16).
         isign           (int, optional): if non-negative, uses positive sign
                         exponential, otherwise negative sign.
+        real            (bool, optional): if ``True`` (types 1 and 2 only),
+                        use the real (Hermitian) mode, with real fine grids
+                        and real-to-complex FFTs, taking about half the
+                        memory and FFT time: a type 1 plan then takes real
+                        strengths, and a type 2 plan returns the real part
+                        of the transform, as a real array.
+        strict          (bool, optional): if ``True``, ``setpts`` and
+                        ``execute`` raise instead of silently copying
+                        inputs that are not C-contiguous or not of the
+                        plan's precision (and ``execute`` an ``out`` that is
+                        not C-contiguous). Copies otherwise made are counted
+                        in the attributes ``n_copies`` and ``bytes_copied``.
         **kwargs        (optional): for more options, see :ref:`opts`.
     """
     def __init__(self,nufft_type,n_modes_or_dim,n_trans=1,eps=1e-6,isign=None,**kwargs):
@@ -91,10 +134,16 @@ class Plan:
             else:
                 isign = 1
 
+        # python-side option: refuse to copy inputs (see execute)
+        strict = kwargs.pop('strict', False)
+        real = kwargs.pop('real', False)
+
         # set opts and check precision type
         opts = _finufft.NufftOpts()
         _finufft._default_opts(opts)
         is_single = setkwopts(opts,**kwargs)
+        if real:
+            opts.realmode = 1
 
         # construct plan based on precision type and eps default value
         plan = c_void_p(None)
@@ -118,17 +167,44 @@ class Plan:
         if is_single:
             self._makeplan = _finufft._makeplanf
             self._setpts = _finufft._setptsf
+            self._updatepts = _finufft._updateptsf
+            self._interp_matrix = _finufft._interp_matrixf
             self._execute = _finufft._executef
+            self._execute_realin = _finufft._execute_realinf
+            self._execute_realout = _finufft._execute_realoutf
+            self._execute_adjoint = _finufft._execute_adjointf
+            self._execute_normal = _finufft._execute_normalf
+            self._get_stats = _finufft._get_statsf
             self._destroy = _finufft._destroyf
         else:
             self._makeplan = _finufft._makeplan
             self._setpts = _finufft._setpts
+            self._updatepts = _finufft._updatepts
+            self._interp_matrix = _finufft._interp_matrix
             self._execute = _finufft._execute
+            self._execute_realin = _finufft._execute_realin
+            self._execute_realout = _finufft._execute_realout
+            self._execute_adjoint = _finufft._execute_adjoint
+            self._execute_normal = _finufft._execute_normal
+            self._get_stats = _finufft._get_stats
             self._destroy = _finufft._destroy
 
+        # automatic FFTW wisdom file, if a wisdom directory is set
+        wisdom_path = None
+        have_wisdom = False
+        if nufft_type!=3:
+            wisdom_path = _wisdom.auto_wisdom_path(npmodes.ravel(), n_trans, eps,
+                                                   is_single, opts)
+            have_wisdom = wisdom_path is not None and os.path.exists(wisdom_path)
+            if have_wisdom:
+                _wisdom.load_wisdom(wisdom_path, 'single' if is_single else 'double')
+
         ier = self._makeplan(nufft_type, dim, n_modes, isign, n_trans, eps,
                              byref(plan), opts)
 
+        if ier <= 1 and wisdom_path is not None and not have_wisdom:
+            _wisdom.save_wisdom(wisdom_path, 'single' if is_single else 'double')
+
         # check error
         if ier != 0:
             err_handler(ier)
@@ -136,15 +212,27 @@ class Plan:
         # set C++ side plan as inner_plan
         self.inner_plan = plan
 
+        # the C++ plan (its fine-grid workspace) may be used by only one thread
+        # at a time; this serializes setpts/execute calls from several threads
+        self._lock = threading.RLock()
+
         # set properties
         self.type = nufft_type
         self.dim = dim
         self.n_modes = n_modes
         self.n_trans = n_trans
         self.is_single = is_single
+        self.real = bool(opts.realmode)
+
+        # copy telemetry: arrays copied (to C-contiguous, of the plan's
+        # precision) by setpts and execute, and their total size in bytes
+        self.strict = strict
+        self.n_copies = 0
+        self.bytes_copied = 0
 
 
     ### setpts
+    @_locked
     def setpts(self,x=None,y=None,z=None,s=None,t=None,u=None):
         r"""
         Set the nonuniform points
@@ -174,20 +262,20 @@ class Plan:
         """
         if self.is_single:
             # array sanity check
-            self._xj = _rchkf(x)
-            self._yj = _rchkf(y)
-            self._zj = _rchkf(z)
-            self._s = _rchkf(s)
-            self._t = _rchkf(t)
-            self._u = _rchkf(u)
+            self._xj = _rchkf(x, self)
+            self._yj = _rchkf(y, self)
+            self._zj = _rchkf(z, self)
+            self._s = _rchkf(s, self)
+            self._t = _rchkf(t, self)
+            self._u = _rchkf(u, self)
         else:
             # array sanity check
-            self._xj = _rchk(x)
-            self._yj = _rchk(y)
-            self._zj = _rchk(z)
-            self._s = _rchk(s)
-            self._t = _rchk(t)
-            self._u = _rchk(u)
+            self._xj = _rchk(x, self)
+            self._yj = _rchk(y, self)
+            self._zj = _rchk(z, self)
+            self._s = _rchk(s, self)
+            self._t = _rchk(t, self)
+            self._u = _rchk(u, self)
 
         # valid sizes
         dim = self.dim
@@ -208,8 +296,118 @@ class Plan:
             err_handler(ier)
 
 
+    @_locked
+    def update_pts(self,indices,x,y=None,z=None):
+        r"""
+        Move some of the nonuniform points
+
+        For type-1 and type-2 plans, sets the coordinates of the points of
+        the given indices (among the ``M`` points of the last ``setpts``) to
+        new values, leaving the others unchanged. Only the moved points are
+        checked and re-binned, so the cost scales with their number rather
+        than with ``M`` (apart from a one-time ``O(M)`` setup on the first
+        call after ``setpts``), which suits points that move a few at a time,
+        e.g. in time-stepping simulations. The new coordinates are written
+        into the coordinate arrays held by the plan, which are those passed
+        to ``setpts`` unless they had to be copied.
+
+        Args:
+            indices (int[n]): indices of the points to move, in ``[0,M)``.
+            x       (float[n]): new first coordinates of these points.
+            y       (float[n], optional): new second coordinates.
+            z       (float[n], optional): new third coordinates.
+        """
+        if self.type == 3:
+            raise RuntimeError('FINUFFT update_pts is only for type 1 and 2 plans')
+        if getattr(self, '_xj', None) is None:
+            raise RuntimeError('FINUFFT update_pts needs setpts to be called first')
+        chk = _rchkf if self.is_single else _rchk
+        ind = np.ascontiguousarray(indices, dtype=np.int64).ravel()
+        coords = [chk(c, self) for c in (x, y, z)[:self.dim]]
+        if any(c is None or c.size != ind.size for c in coords):
+            raise RuntimeError('FINUFFT update_pts needs ' + str(self.dim)
+                               + ' coordinate arrays of the same size as indices')
+        # (library's x is the fastest axis, ie our last coordinate)
+        ptrs = [c.ctypes.data_as(c_void_p) for c in coords[::-1]]
+        ptrs += [None] * (3 - self.dim)
+        ier = self._updatepts(self.inner_plan, ind.size,
+                              ind.ctypes.data_as(c_void_p), *ptrs)
+
+        if ier != 0:
+            err_handler(ier)
+
+
+    def _interp_sizes(self):
+        nf = np.zeros(3, dtype=np.int64)
+        nnzrow = c_longlong(0)
+        ier = self._interp_matrix(self.inner_plan, nf.ctypes.data_as(c_void_p),
+                                  byref(nnzrow), None, None)
+        if ier != 0:
+            err_handler(ier)
+        return tuple(int(n) for n in nf[:self.dim][::-1]), nnzrow.value
+
+
+    @property
+    def fine_grid_shape(self):
+        r"""
+        Shape of the (upsampled) fine grid of a type-1 or type-2 plan
+
+        In the same axis order as ``n_modes``; see ``interp_matrix``.
+        """
+        if self.type == 3:
+            raise RuntimeError('FINUFFT fine_grid_shape is only for type 1 and 2 plans')
+        with self._lock:
+            return self._interp_sizes()[0]
+
+
+    @_locked
+    def interp_matrix(self):
+        r"""
+        Sparse interpolation matrix of the nonuniform points
+
+        For type-1 and type-2 plans, returns the matrix ``A`` of the
+        spreading and interpolation step for the points of the last
+        ``setpts`` (or ``update_pts``): the type-2 transform interpolates
+        its values as ``c = A @ u.ravel()`` from the fine grid ``u``, of
+        shape ``fine_grid_shape``, obtained by FFT of the zero-padded and
+        deconvolved modes, and the type-1 transform spreads to the fine grid
+        as ``u.ravel() = A.T @ c``. Each row holds the ``w**dim`` tensor
+        product kernel values (``w`` the kernel width) at the fine grid points
+        near one nonuniform point, as used by the library. This can be
+        stored, and applied with sparse (batched) products. Requires
+        ``scipy``.
+
+        The plan can also use this matrix itself to interpolate, see the
+        ``spread_interp_matrix_mb`` option.
+
+        Returns:
+            scipy.sparse.csr_matrix: real matrix of shape ``(M, prod(fine_grid_shape))``,
+            with rows in the order of the points.
+        """
+        import scipy.sparse
+        if self.type == 3:
+            raise RuntimeError('FINUFFT interp_matrix is only for type 1 and 2 plans')
+        if getattr(self, '_xj', None) is None:
+            raise RuntimeError('FINUFFT interp_matrix needs setpts to be called first')
+        shape, nnzrow = self._interp_sizes()
+        nnz = self.nj * nnzrow
+        cols = np.empty(nnz, dtype=np.int64)
+        vals = np.empty(nnz, dtype=np.float32 if self.is_single else np.float64)
+        nf = np.zeros(3, dtype=np.int64)
+        ier = self._interp_matrix(self.inner_plan, nf.ctypes.data_as(c_void_p),
+                                  byref(c_longlong(0)),
+                                  cols.ctypes.data_as(c_void_p),
+                                  vals.ctypes.data_as(c_void_p))
+        if ier != 0:
+            err_handler(ier)
+        indptr = np.arange(self.nj + 1, dtype=np.int64) * nnzrow
+        return scipy.sparse.csr_matrix((vals, cols, indptr),
+                                       shape=(self.nj, int(np.prod(shape))))
+
+
     ### execute
-    def execute(self,data,out=None):
+    @_locked
+    def execute(self,data,out=None,reuse=False):
         r"""
         Execute the plan
 
@@ -221,81 +419,305 @@ class Plan:
 
         Args:
             data    (complex[M], complex[n_transf, M], complex[n_modes], or complex[n_transf, n_modes]): The input source strengths
-                    (type 1 and 3) or source modes (type 2).
+                    (type 1 and 3) or source modes (type 2). Real arrays
+                    (of the plan's precision) are read as such, without a
+                    complex copy. Other non-C-contiguous or mismatched
+                    inputs are copied, which is counted in
+                    ``bytes_copied`` and ``n_copies``, or raises if the
+                    plan was created with ``strict=True``.
             out     (complex[n_modes], complex[n_transf, n_modes], complex[M], or complex[n_transf, M], optional): The array where the
-                    output is stored. Must be of the right size.
+                    output is stored. Must be of the right size. It may be
+                    strided or Fortran-ordered, in which case the transform
+                    is computed in a buffer owned by the plan and copied
+                    into ``out`` once.
+            reuse   (bool, optional): if ``True`` and ``out`` is not given,
+                    return the plan's own (64-byte aligned) output buffer
+                    rather than a new array, so that repeated executions
+                    allocate nothing. Its contents are overwritten by the
+                    next execution of the plan.
 
         Returns:
             complex[n_modes], complex[n_transf, n_modes], complex[M], or complex[n_transf, M]: The output array of the transform(s).
         """
-        if self.is_single:
-            _data = _cchkf(data)
-            _out = _cchkf(out)
+        return self._exec(data, out, reuse, 0)
+
+
+    ### execute_adjoint
+    @_locked
+    def execute_adjoint(self,data,out=None,reuse=False):
+        r"""
+        Execute the adjoint of the plan
+
+        For a type-1 or type-2 plan, performs the adjoint transform, that is,
+        the other type with the opposite sign, on the same nonuniform points.
+        It reuses the plan's sorted points, kernel Fourier series and fine-grid
+        workspace, so no second plan (nor ``setpts``) is needed. The input of
+        the adjoint of a type-1 plan is an array of modes, its output a set of
+        strengths at the nonuniform points; vice versa for a type-2 plan.
+
+        Args:
+            data    (complex array): the input modes (type 1) or strengths
+                    (type 2), of the shape of the output of ``execute``.
+            out     (complex array, optional): as for ``execute``.
+            reuse   (bool, optional): as for ``execute``.
+
+        Returns:
+            complex array: the output of the adjoint transform(s), of the
+            shape of the input of ``execute``.
+        """
+        return self._exec(data, out, reuse, 1)
+
+
+    ### execute_normal
+    @_locked
+    def execute_normal(self,data,weights=None,out=None,reuse=False):
+        r"""
+        Apply the normal operator of the plan
+
+        For a type-1 or type-2 plan with transform ``A``, computes
+        ``A^H W A data``, where ``W`` is the diagonal matrix of the optional
+        real ``weights`` (for example density compensation at the
+        nonuniform points of a type-2 plan). Each batch of vectors goes
+        through the transform and its adjoint in a single library call,
+        sharing the fine-grid workspace, so that the intermediate result is
+        never stored for all ``n_trans`` vectors.
+
+        Args:
+            data    (complex array): input of the shape of the input of
+                    ``execute``.
+            weights (float[M] or float[n_modes], optional): real weights of
+                    the intermediate result (for a type-2 plan at the ``M``
+                    nonuniform points, for a type-1 plan at the modes).
+            out     (complex array, optional): as for ``execute``.
+            reuse   (bool, optional): as for ``execute``.
+
+        Returns:
+            complex array: the result, of the shape of ``data``.
+        """
+        return self._exec(data, out, reuse, 2, weights)
+
+
+    def _exec(self, data, out, reuse, op, weights=None):
+        # the work of execute (op=0), execute_adjoint (1), execute_normal (2)
+        _data, _out, weights, realin, realout = self._prep(data, out, reuse, op, weights)
+        tp = self.type
+
+        # call execute based on type and precision type
+        _pdata = _data.ctypes.data_as(c_void_p)
+        _pout = _out.ctypes.data_as(c_void_p)
+        if op==2:
+            ier = self._execute_normal(self.inner_plan, _pdata, _pout,
+                    None if weights is None else weights.ctypes.data_as(c_void_p))
+        elif op==1:
+            if tp==1:
+                ier = self._execute_adjoint(self.inner_plan, _pout, _pdata)
+            else:
+                ier = self._execute_adjoint(self.inner_plan, _pdata, _pout)
+        elif realout:
+            ier = self._execute_realout(self.inner_plan, _pdata, _pout)
+        elif realin:
+            ier = self._execute_realin(self.inner_plan, _pdata, _pout)
+        elif tp==1 or tp==3:
+            ier = self._execute(self.inner_plan, _pdata, _pout)
+        elif tp==2:
+            ier = self._execute(self.inner_plan, _pout, _pdata)
         else:
-            _data = _cchk(data)
-            _out = _cchk(out)
+            ier = 10
+
+        # check error
+        if ier != 0:
+            err_handler(ier)
+
+        return _finish(_out, out)
 
+
+    def _prep(self, data, out, reuse, op, weights=None, many=False):
+        # checks and converts the input data (and weights), and chooses the
+        # array _out the library writes to. Real input is only passed as such
+        # by execute (op=0), and by execute_many (many=True) in real mode
         tp = self.type
+        if op and tp==3:
+            raise RuntimeError('FINUFFT adjoint and normal operator only for type 1 and 2 plans')
+
+        # real input is passed as such, rather than as a complex copy
+        realin = op==0 and isinstance(data, np.ndarray) and data.dtype.kind == 'f'
+        realin = realin and (self.real or not many)
+        realout = op==0 and self.real and tp==2
+        if op==0 and self.real and tp==1 and not realin:
+            raise RuntimeError('FINUFFT real mode type 1 needs real strengths')
+        if realout:
+            realin = False
+        if self.is_single:
+            _data = _rchkf(data, self) if realin else _cchkf(data, self)
+            pdtype = np.float32 if realout else np.complex64
+        else:
+            _data = _rchk(data, self) if realin else _cchk(data, self)
+            pdtype = np.float64 if realout else np.complex128
+
         n_trans = self.n_trans
         nj = self.nj
         nk = self.nk
         dim = self.dim
-
+        ms = mt = mu = None
         if tp==1 or tp==2:
             ms = self.n_modes[0]
             mt = self.n_modes[1]
             mu = self.n_modes[2]
 
+        # whether the input, and the output, are modes (else strengths, or
+        # type 3 target values); the adjoint swaps those of execute
+        inmodes = (tp==1) if op==1 else (tp==2)
+        outmodes = (tp==1) if op==0 else (tp==2)
+
         # input shape and size check
-        if tp==2:
-            valid_fshape(data.shape,n_trans,dim,ms,mt,mu,None,2)
+        if inmodes:
+            valid_fshape(data.shape,n_trans,dim,ms,mt,mu,None,tp)
         else:
             valid_cshape(data.shape,nj,n_trans)
 
         # out shape and size check
         if out is not None:
-            if tp==1:
-                valid_fshape(out.shape,n_trans,dim,ms,mt,mu,None,1)
-            if tp==2:
+            if outmodes or tp==3:
+                valid_fshape(out.shape,n_trans,dim,ms,mt,mu,nk,tp)
+            else:
                 valid_cshape(out.shape,nj,n_trans)
-            if tp==3:
-                valid_fshape(out.shape,n_trans,dim,None,None,None,nk,3)
 
-        # allocate out if None
+        # output shape (singleton dimensions squeezed)
+        if outmodes:
+            oshape = (n_trans, mu, mt, ms)
+        elif tp==3:
+            oshape = (n_trans, nk)
+        else:
+            oshape = (n_trans, nj)
+        oshape = tuple(n for n in oshape if n != 1)
+
+        if weights is not None:
+            wsize = nj if tp==2 else self.n_modes[0]*self.n_modes[1]*self.n_modes[2]
+            if np.size(weights) != wsize:
+                raise RuntimeError('FINUFFT weights must have size M for type 2, or n_modes for type 1')
+            chk = _rchkf if self.is_single else _rchk
+            weights = chk(np.asarray(weights).ravel(), self)
+
+        # choose where the library writes the output (it writes every entry,
+        # so no zeroing needed): out itself if possible, else the plan buffer
         if out is None:
-            if self.is_single:
-                pdtype=np.complex64
+            if reuse:
+                _out = self._output_buffer(oshape, pdtype)
             else:
-                pdtype=np.complex128
-            if tp==1:
-                _out = np.squeeze(np.zeros([n_trans, mu, mt, ms], dtype=pdtype, order='C'))
-            if tp==2:
-                _out = np.squeeze(np.zeros([n_trans, nj], dtype=pdtype, order='C'))
-            if tp==3:
-                _out = np.squeeze(np.zeros([n_trans, nk], dtype=pdtype, order='C'))
-
-        # call execute based on type and precision type
-        if tp==1 or tp==3:
-            ier = self._execute(self.inner_plan,
-                                _data.ctypes.data_as(c_void_p),
-                                _out.ctypes.data_as(c_void_p))
-        elif tp==2:
-            ier = self._execute(self.inner_plan,
-                                _out.ctypes.data_as(c_void_p),
-                                _data.ctypes.data_as(c_void_p))
+                _out = np.empty(oshape, dtype=pdtype)
         else:
-            ier = 10
+            if out.dtype != pdtype:
+                raise RuntimeError('FINUFFT data type must be ' + np.dtype(pdtype).name
+                                   + ' for ' + ('single' if self.is_single else 'double')
+                                   + ' precision, data may have mixed precision types')
+            if out.flags.c_contiguous:
+                _out = out
+            elif self.strict:
+                raise RuntimeError('FINUFFT strict mode: out is not C-contiguous')
+            else:
+                _out = self._output_buffer(oshape, pdtype)
+                self.bytes_copied += _out.nbytes
+                self.n_copies += 1
 
-        # check error
-        if ier != 0:
-            err_handler(ier)
+        return _data, _out, weights, realin, realout
 
-        # return out
-        if out is None:
-            return _out
-        else:
-            _copy(_out,out)
-            return out
+
+    def _stats(self):
+        stats = _finufft.FinufftStats()
+        self._get_stats(self.inner_plan, byref(stats))
+        return stats
+
+
+    @property
+    def last_timings(self):
+        r"""
+        Timings (in seconds) of the phases of plan creation, of the last
+        ``setpts`` and of the last execution (``execute``,
+        ``execute_adjoint`` or ``execute_normal``), recorded by the library
+
+        A dict with keys ``makeplan`` (total), ``kernel`` (Fourier series of
+        the spreading kernel), ``alloc`` (fine grids), ``fftw_plan``,
+        ``setpts`` (total), ``sort``, ``t3_prep`` (type 3 rescaling and
+        phase factors), ``t3_inner_plan`` (type 3 inner type-2 plan and
+        points), ``execute`` (total), ``spread_interp``, ``fft``,
+        ``deconvolve``, ``prephase`` (type 3) and ``inner_type2`` (type 3,
+        total of the inner type-2 transforms). Phases that do not apply are
+        zero.
+        """
+        with self._lock:
+            s = self._stats()
+        return {'makeplan': s.t_makeplan, 'kernel': s.t_kernel,
+                'alloc': s.t_alloc, 'fftw_plan': s.t_fftwplan,
+                'setpts': s.t_setpts, 'sort': s.t_sort,
+                't3_prep': s.t_t3prep, 't3_inner_plan': s.t_t3inner,
+                'execute': s.t_execute, 'spread_interp': s.t_spreadinterp,
+                'fft': s.t_fft, 'deconvolve': s.t_deconv,
+                'prephase': s.t_prephase, 'inner_type2': s.t_inner}
+
+
+    @property
+    def stats(self):
+        r"""
+        Statistics of the plan recorded by the library
+
+        A dict with keys ``nthreads`` (threads used), ``batch_size``
+        (transforms per batch), ``n_batches`` (batches done by the last
+        execution), ``pipelined`` (whether they were pipelined, see the
+        ``pipeline`` option, so that their phase timings overlap),
+        ``did_sort`` (whether the last ``setpts`` sorted the points),
+        ``n_executes`` and ``execute_total`` (number and total time
+        of executions so far), and ``bytes_allocated`` (working arrays held
+        by the plan).
+        """
+        with self._lock:
+            s = self._stats()
+        return {'nthreads': s.nthreads, 'batch_size': s.batchsize,
+                'n_batches': s.nbatch, 'pipelined': bool(s.pipelined),
+                'did_sort': bool(s.didsort),
+                'n_executes': s.nexecute, 'execute_total': s.t_executetotal,
+                'bytes_allocated': s.bytes}
+
+
+    def _output_buffer(self, shape, dtype):
+        # the plan-owned aligned output buffer, (re)allocated only if the
+        # output shape changed (type 2 after setpts with a new number of pts)
+        buf = getattr(self, '_outbuf', None)
+        if buf is None or buf.shape != shape:
+            buf = _aligned_empty(shape, dtype)
+            self._outbuf = buf
+        return buf
+
+
+    ### execute_async
+    def execute_async(self,data,out=None,executor=None):
+        r"""
+        Execute the plan in a background thread
+
+        Same as ``execute``, but returns at once with a
+        ``concurrent.futures.Future`` whose result is the output array. The
+        transform runs in a worker thread of a managed pool (or of
+        ``executor``) and, since the library calls release the GIL, the
+        calling thread is free to do other work meanwhile. In ``asyncio``
+        code, use ``await asyncio.wrap_future(plan.execute_async(c))``.
+
+        The future keeps references to the plan, ``data`` and ``out`` until
+        the transform completes, so they stay valid even if the caller drops
+        them, but they must not be modified in the meantime. Transforms (and
+        ``setpts``) submitted to the same plan run one at a time, in the
+        order they acquire the plan.
+
+        Args:
+            data    (complex array): as for ``execute``.
+            out     (complex array, optional): as for ``execute``.
+            executor (concurrent.futures.Executor, optional): executor to
+                    run the transform in, instead of the managed thread pool.
+
+        Returns:
+            concurrent.futures.Future: future of the output array.
+        """
+        if executor is None:
+            executor = _default_executor()
+        return executor.submit(self.execute, data, out)
 
 
     def __del__(self):
@@ -304,50 +726,155 @@ class Plan:
 ### End of Plan class definition
 
 
+### execute many plans concurrently
+def execute_many(plans,inputs,outs=None,nthreads=0):
+    r"""
+    Execute several plans concurrently, one plan per thread
+
+    Many small unrelated transforms (for example with different points but
+    the same sizes) are dominated by per-call overhead and do not use
+    several threads well one at a time. This executes a list of distinct
+    plans, each with its points already set, in a single library call that
+    schedules them across ``nthreads`` threads, one plan per thread at a
+    time. For best throughput the plans should be created with
+    ``nthreads=1``.
+
+    Example:
+    ::
+        plans = [finufft.Plan(1, (32, 32), nthreads=1) for _ in range(P)]
+        for plan, (x, y) in zip(plans, points):
+            plan.setpts(x, y)
+        fs = finufft.execute_many(plans, strengths)
+
+    Args:
+        plans       (list of Plan): distinct plans of the same precision.
+        inputs      (list of arrays): the input of each plan, as for
+                    ``Plan.execute``.
+        outs        (list of arrays or None, optional): the output arrays,
+                    as for ``Plan.execute`` (a list entry may be ``None``).
+        nthreads    (int, optional): number of threads; 0 means all
+                    available.
+
+    Returns:
+        list of arrays: the output of each plan.
+    """
+    plans = list(plans)
+    inputs = list(inputs)
+    outs = [None] * len(plans) if outs is None else list(outs)
+    if len(inputs) != len(plans) or len(outs) != len(plans):
+        raise RuntimeError('FINUFFT execute_many needs one input (and out) per plan')
+    if len(set(id(plan) for plan in plans)) != len(plans):
+        raise RuntimeError('FINUFFT execute_many plans must be distinct')
+    if len(set(plan.is_single for plan in plans)) > 1:
+        raise RuntimeError('FINUFFT execute_many plans must have the same precision')
+    if not plans:
+        return []
+
+    # lock the plans (in a fixed order, to avoid deadlock with other calls)
+    locked = []
+    try:
+        for plan in sorted(plans, key=id):
+            plan._lock.acquire()
+            locked.append(plan)
+        prepped = [plan._prep(data, out, False, 0, many=True)
+                   for plan, data, out in zip(plans, inputs, outs)]
+        cj = (c_void_p * len(plans))()
+        fk = (c_void_p * len(plans))()
+        for i, (plan, (_data, _out, _, _, _)) in enumerate(zip(plans, prepped)):
+            if plan.type == 2:
+                cj[i], fk[i] = _out.ctypes.data, _data.ctypes.data
+            else:
+                cj[i], fk[i] = _data.ctypes.data, _out.ctypes.data
+        inner = (c_void_p * len(plans))(*[plan.inner_plan.value for plan in plans])
+        fun = _finufft._execute_manyf if plans[0].is_single else _finufft._execute_many
+        ier = fun(len(plans), inner, cj, fk, nthreads)
+    finally:
+        for plan in locked:
+            plan._lock.release()
+
+    if ier != 0:
+        err_handler(ier)
+    return [_finish(p[1], out) for p, out in zip(prepped, outs)]
+
+
 
 ### David Stein's functions for checking input and output variables
-def _rchk(x):
+def _rchk(x, plan=None):
     """
     Check if array x is of the appropriate type
     (float64, C-contiguous in memory)
-    If not, produce a copy
+    If not, produce a copy (counted in plan's telemetry, refused if strict)
     """
     if x is not None and x.dtype is not np.dtype('float64'):
         raise RuntimeError('FINUFFT data type must be float64 for double precision, data may have mixed precision types')
-    return np.array(x, dtype=np.float64, order='C', copy=False)
-def _cchk(x):
+    return _contig(x, np.float64, plan)
+def _cchk(x, plan=None):
     """
     Check if array x is of the appropriate type
     (complex128, C-contiguous in memory)
-    If not, produce a copy
+    If not, produce a copy (counted in plan's telemetry, refused if strict)
     """
     if x is not None and (x.dtype is not np.dtype('complex128') and x.dtype is not np.dtype('float64')):
         raise RuntimeError('FINUFFT data type must be complex128 for double precision, data may have mixed precision types')
-    return np.array(x, dtype=np.complex128, order='C', copy=False)
-def _rchkf(x):
+    return _contig(x, np.complex128, plan)
+def _rchkf(x, plan=None):
     """
     Check if array x is of the appropriate type
     (float64, C-contiguous in memory)
-    If not, produce a copy
+    If not, produce a copy (counted in plan's telemetry, refused if strict)
     """
     if x is not None and x.dtype is not np.dtype('float32'):
         raise RuntimeError('FINUFFT data type must be float32 for single precision, data may have mixed precision types')
-    return np.array(x, dtype=np.float32, order='C', copy=False)
-def _cchkf(x):
+    return _contig(x, np.float32, plan)
+def _cchkf(x, plan=None):
     """
     Check if array x is of the appropriate type
     (complex128, C-contiguous in memory)
-    If not, produce a copy
+    If not, produce a copy (counted in plan's telemetry, refused if strict)
     """
     if x is not None and (x.dtype is not np.dtype('complex64') and x.dtype is not np.dtype('float32')):
         raise RuntimeError('FINUFFT data type must be complex64 for single precision, data may have mixed precision types')
-    return np.array(x, dtype=np.complex64, order='C', copy=False)
+    return _contig(x, np.complex64, plan)
+def _contig(x, dtype, plan):
+    """
+    x as a C-contiguous array of dtype, copied only if needed; a copy is
+    added to plan.bytes_copied and plan.n_copies, or raises if plan.strict
+    """
+    if x is None or (x.dtype == dtype and x.flags.c_contiguous):
+        return np.array(x, dtype=dtype, order='C', copy=False)
+    if plan is not None and plan.strict:
+        raise RuntimeError('FINUFFT strict mode: ' + x.dtype.name
+                           + (' C-contiguous' if x.flags.c_contiguous else ' non-C-contiguous')
+                           + ' array would be copied to C-contiguous ' + np.dtype(dtype).name)
+    _x = np.array(x, dtype=dtype, order='C')
+    if plan is not None:
+        plan.bytes_copied += _x.nbytes
+        plan.n_copies += 1
+    return _x
+def _aligned_empty(shape, dtype, alignment=64):
+    """
+    Uninitialized C-contiguous array whose data is aligned to alignment bytes
+    (as FFTW's own allocations), for SIMD-friendly reuse by the library
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = (-raw.ctypes.data) % alignment
+    return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+def _finish(_out, out):
+    """
+    Return the output of an execution: _out, copied into out if given
+    """
+    if out is None:
+        return _out
+    _copy(_out, out)
+    return out
 def _copy(_x, x):
     """
-    Copy _x to x, only if the underlying data of _x differs from that of x
+    Copy _x to x, only if _x is not x itself
     """
-    if _x.data != x.data:
-        x[:] = _x
+    if _x is not x:
+        x[...] = _x
 
 
 ### error handler
@@ -364,7 +891,12 @@ def err_handler(ier):
         9: 'FINUFFT number of transforms ntrans invalid',
         10: 'FINUFFT transform type invalid',
         11: 'FINUFFT general malloc failure',
-        12: 'FINUFFT number of dimensions dim invalid'
+        12: 'FINUFFT number of dimensions dim invalid',
+        13: 'FINUFFT spread_thread option invalid',
+        14: 'FINUFFT FFTW wisdom file could not be read or written',
+        15: 'FINUFFT real mode only for types 1 and 2, with real type 1 input, and no adjoint',
+        16: 'FINUFFT update_pts index out of range',
+        17: 'FINUFFT bin tuning file could not be read or written'
     }
     err_msg = switcher.get(ier,'Unknown error')
 
@@ -521,8 +1053,8 @@ def setkwopts(opt,**kwargs):
 
 ### destroy
 def destroy(plan):
-    if plan is None:
-        return
+    if plan is None or getattr(plan, 'inner_plan', None) is None:
+        return      # also if the Plan constructor failed before makeplan
 
     ier = plan._destroy(plan.inner_plan)
 
@@ -565,11 +1097,17 @@ def invoke_guru(dim,tp,x,y,z,c,s,t,u,f,isign,eps,n_modes,**kwargs):
     else:
         n_trans = valid_ntr(x,c)
 
-    #plan
-    if tp==3:
-        plan = Plan(tp,dim,n_trans,eps,isign,**dict(kwargs,dtype=pdtype))
-    else:
-        plan = Plan(tp,n_modes,n_trans,eps,isign,**dict(kwargs,dtype=pdtype))
+    #plan, possibly taken from the plan cache (types 1 and 2 only)
+    cachekey = None
+    plan = None
+    if tp!=3 and _plancache._cache.enabled():
+        cachekey = _plancache.plan_key(tp,n_modes,n_trans,eps,isign,pdtype,kwargs)
+        plan = _plancache._cache.checkout(cachekey)
+    if plan is None:
+        if tp==3:
+            plan = Plan(tp,dim,n_trans,eps,isign,**dict(kwargs,dtype=pdtype))
+        else:
+            plan = Plan(tp,n_modes,n_trans,eps,isign,**dict(kwargs,dtype=pdtype))
 
     #setpts
     plan.setpts(x,y,z,s,t,u)
@@ -580,6 +1118,12 @@ def invoke_guru(dim,tp,x,y,z,c,s,t,u,f,isign,eps,n_modes,**kwargs):
     else:
         out = plan.execute(f,c)
 
+    #return plan to the cache, without keeping the user's points alive
+    if cachekey is not None:
+        plan._xj = plan._yj = plan._zj = None
+        nbytes = _plancache.plan_nbytes(n_modes,n_trans,plan.is_single,kwargs)
+        _plancache._cache.checkin(cachekey,plan,nbytes)
+
     return out
 
 
@@ -859,6 +1403,66 @@ def nufft3d3(x,y,z,c,s,t,u,out=None,eps=1e-6,isign=1,**kwargs):
     return invoke_guru(3,3,x,y,z,c,s,t,u,out,isign,eps,None,**kwargs)
 
 
+### real (Hermitian) mode
+def nufft1d1r(x,c,n_modes=None,out=None,eps=1e-6,isign=1,**kwargs):
+    return invoke_guru(1,1,x,None,None,c,None,None,None,out,isign,eps,n_modes,real=True,**kwargs)
+
+
+def nufft1d2r(x,f,out=None,eps=1e-6,isign=-1,**kwargs):
+    return invoke_guru(1,2,x,None,None,out,None,None,None,f,isign,eps,None,real=True,**kwargs)
+
+
+def nufft2d1r(x,y,c,n_modes=None,out=None,eps=1e-6,isign=1,**kwargs):
+    return invoke_guru(2,1,x,y,None,c,None,None,None,out,isign,eps,n_modes,real=True,**kwargs)
+
+
+def nufft2d2r(x,y,f,out=None,eps=1e-6,isign=-1,**kwargs):
+    return invoke_guru(2,2,x,y,None,out,None,None,None,f,isign,eps,None,real=True,**kwargs)
+
+
+def nufft3d1r(x,y,z,c,n_modes=None,out=None,eps=1e-6,isign=1,**kwargs):
+    return invoke_guru(3,1,x,y,z,c,None,None,None,out,isign,eps,n_modes,real=True,**kwargs)
+
+
+def nufft3d2r(x,y,z,f,out=None,eps=1e-6,isign=-1,**kwargs):
+    return invoke_guru(3,2,x,y,z,out,None,None,None,f,isign,eps,None,real=True,**kwargs)
+
+
+def _set_nufft_real_doc(f, dim, tp):
+    pts = ', '.join(('x', 'y', 'z')[:dim])
+    if tp == 1:
+        doc = """{dim}D type-1 NUFFT of real strengths (real mode)
+
+    Same as ``nufft{dim}d1``, except that the strengths ``c`` (float[M] or
+    float[ntransf, M]) are real. The transform then uses a real fine grid and
+    real-to-complex FFTs, taking about half the memory and FFT time. The
+    output is the full complex (Hermitian-symmetric) array of Fourier modes.
+
+    Example:
+
+    ::
+
+      c = np.random.standard_normal(size=M)
+      f = finufft.nufft{dim}d1r({pts}, c, n_modes)
+    """
+    else:
+        doc = """{dim}D type-2 NUFFT with real output (real mode)
+
+    Same as ``nufft{dim}d2``, except that only the real part of the result is
+    computed, and returned as a real array (float[M] or float[ntransf, M]),
+    using a real fine grid and complex-to-real FFTs, taking about half the
+    memory and FFT time. This is the full result if ``f`` is Hermitian
+    symmetric (``f[-k] = conj(f[k])``), as for Fourier modes of real data.
+
+    Example:
+
+    ::
+
+      c = finufft.nufft{dim}d2r({pts}, f)
+    """
+    f.__doc__ = doc.format(dim=dim, pts=pts)
+
+
 _set_nufft_doc(nufft1d1, 1, 1, 'python/examples/simple1d1.py, python/examples/simpleopts1d1.py')
 _set_nufft_doc(nufft1d2, 1, 2)
 _set_nufft_doc(nufft1d3, 1, 3)
@@ -868,3 +1472,9 @@ _set_nufft_doc(nufft2d3, 2, 3)
 _set_nufft_doc(nufft3d1, 3, 1)
 _set_nufft_doc(nufft3d2, 3, 2)
 _set_nufft_doc(nufft3d3, 3, 3)
+_set_nufft_real_doc(nufft1d1r, 1, 1)
+_set_nufft_real_doc(nufft1d2r, 1, 2)
+_set_nufft_real_doc(nufft2d1r, 2, 1)
+_set_nufft_real_doc(nufft2d2r, 2, 2)
+_set_nufft_real_doc(nufft3d1r, 3, 1)
+_set_nufft_real_doc(nufft3d2r, 3, 2)
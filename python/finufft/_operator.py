@@ -0,0 +1,302 @@
+# Adjoint pair of NUFFTs as a linear operator, for iterative solvers.
+#
+# CG or LSQR reconstructions alternate a type 2 transform (modes to nonuniform
+# points) and its adjoint, the type 1 transform of opposite sign, on the same
+# points. Operator holds a single type 2 Plan and applies the adjoint through
+# Plan.execute_adjoint, so that both directions (and the fused normal
+# operator) share the sorted points, kernel Fourier series and fine-grid
+# workspace, and setpts is done once. ToeplitzNormal instead applies the
+# normal operator with FFTs only, from a precomputed kernel.
+
+
+import numpy as np
+
+from finufft._interfaces import Plan
+
+
+class Operator:
+    r"""
+    The type-2 NUFFT as a linear operator, with its type-1 adjoint
+
+    The forward operator ``A`` maps Fourier modes ``f`` (of shape
+    ``n_modes``) to the values ``c`` at ``M`` nonuniform points of the
+    type-2 NUFFT with sign ``isign``, and its adjoint ``A^H`` is the type-1
+    NUFFT with the opposite sign. Both are applied by one underlying
+    ``Plan``, which sorts the points once and shares its fine-grid workspace
+    between the two directions; ``normal`` applies ``A^H W A`` in a single
+    library call per batch.
+
+    The object has the ``shape``, ``dtype``, ``matvec``, ``rmatvec``,
+    ``matmat`` and ``rmatmat`` members of a
+    ``scipy.sparse.linalg.LinearOperator``, acting on flattened mode
+    vectors of length ``N = prod(n_modes)``, so that
+    ``scipy.sparse.linalg.aslinearoperator(op)`` wraps it for solvers such
+    as ``lsqr`` (and ``aslinearoperator(op.normal_operator())`` for ``cg``).
+
+    Example:
+    ::
+        op = finufft.Operator((64, 64), x, y, eps=1e-9)
+        c = op.forward(f)           # type 2
+        g = op.adjoint(c)           # type 1, opposite sign
+        h = op.normal(f, weights)   # A^H diag(weights) A f
+
+    Args:
+        n_modes     (int or tuple of ints): number of modes in each dimension
+                    (for example, ``(50, 100)``).
+        x           (float[M]): first coordinate of the nonuniform points.
+        y           (float[M], optional): second coordinate.
+        z           (float[M], optional): third coordinate.
+        n_trans     (int, optional): number of vectors transformed by each
+                    library call; ``matmat`` groups its columns by this.
+        eps         (float, optional): precision requested (>1e-16).
+        isign       (int, optional): sign of the forward (type-2) transform.
+        **kwargs    (optional): further options of ``Plan``, see :ref:`opts`.
+    """
+    def __init__(self,n_modes,x,y=None,z=None,n_trans=1,eps=1e-6,isign=-1,**kwargs):
+        if kwargs.get('real'):
+            raise RuntimeError('FINUFFT Operator does not support real mode')
+        self.plan = Plan(2, n_modes, n_trans, eps, isign, **kwargs)
+        self.n_modes = tuple(int(n) for n in np.atleast_1d(n_modes))
+        self.n_trans = n_trans
+        self.dtype = np.dtype(np.complex64 if self.plan.is_single else np.complex128)
+        self.setpts(x, y, z)
+
+    def setpts(self,x,y=None,z=None):
+        r"""
+        Set new nonuniform points (of any number ``M``)
+        """
+        self.plan.setpts(x, y, z)
+        self.shape = (self.plan.nj, int(np.prod(self.n_modes)))
+
+    def forward(self,f,out=None):
+        r"""
+        Apply ``A``, the type-2 NUFFT, to modes ``f`` (as ``Plan.execute``)
+        """
+        return self.plan.execute(f, out)
+
+    def adjoint(self,c,out=None):
+        r"""
+        Apply ``A^H``, the type-1 NUFFT of opposite sign, to strengths ``c``
+        """
+        return self.plan.execute_adjoint(c, out)
+
+    def normal(self,f,weights=None,out=None):
+        r"""
+        Apply ``A^H W A`` to modes ``f``, ``W`` the diagonal of the optional
+        real ``weights`` at the ``M`` points (see ``Plan.execute_normal``)
+        """
+        return self.plan.execute_normal(f, weights, out)
+
+    ### LinearOperator interface, on flattened mode vectors
+    def matvec(self,v):
+        r"""
+        ``A v`` for a mode vector ``v`` of length ``N``, or of shape (N, 1)
+        """
+        return self._apply(self.plan.execute, v, self.n_modes, self.shape[0])
+
+    def rmatvec(self,v):
+        r"""
+        ``A^H v`` for a vector ``v`` of length ``M``, or of shape (M, 1)
+        """
+        return self._apply(self.plan.execute_adjoint, v, (self.shape[0],),
+                           self.shape[1])
+
+    def matmat(self,V):
+        r"""
+        ``A V`` for a matrix ``V`` of shape (N, K)
+        """
+        return self._applymat(self.plan.execute, V, self.n_modes, self.shape[0])
+
+    def rmatmat(self,V):
+        r"""
+        ``A^H V`` for a matrix ``V`` of shape (M, K)
+        """
+        return self._applymat(self.plan.execute_adjoint, V, (self.shape[0],),
+                              self.shape[1])
+
+    def normal_operator(self,weights=None):
+        r"""
+        ``A^H W A`` as an object with the ``LinearOperator`` members
+        ``shape``, ``dtype``, ``matvec``, ``rmatvec``, ``matmat`` and
+        ``rmatmat`` (it is self-adjoint), acting on vectors of length ``N``
+        """
+        return _NormalOperator(self, weights)
+
+    @property
+    def H(self):
+        r"""
+        The adjoint, as an object with the ``LinearOperator`` members
+        """
+        return _AdjointOperator(self)
+
+    def __matmul__(self,v):
+        v = np.asarray(v)
+        return self.matvec(v) if v.ndim == 1 else self.matmat(v)
+
+    def dot(self,v):
+        return self @ v
+
+    def _apply(self,fun,v,inshape,outsize):
+        # one vector through fun (a single transform, padded to n_trans)
+        v = np.asarray(v, dtype=self.dtype)
+        if v.size != int(np.prod(inshape)):
+            raise RuntimeError('FINUFFT Operator vector has the wrong size')
+        out = self._applymat(fun, v.reshape(-1, 1), inshape, outsize)
+        return out.ravel() if v.ndim == 1 else out
+
+    def _applymat(self,fun,V,inshape,outsize):
+        # columns of V through fun, in groups of n_trans (the last one
+        # zero-padded), each group a single batched transform
+        V = np.asarray(V, dtype=self.dtype)
+        if V.ndim != 2 or V.shape[0] != int(np.prod(inshape)):
+            raise RuntimeError('FINUFFT Operator matrix has the wrong shape')
+        K = V.shape[1]
+        ntr = self.n_trans
+        out = np.empty((outsize, K), dtype=self.dtype)
+        for k in range(0, K, ntr):
+            block = np.zeros((ntr,) + tuple(inshape), dtype=self.dtype)
+            nk = min(ntr, K - k)
+            block[:nk] = V[:, k:k+nk].T.reshape((nk,) + tuple(inshape))
+            if ntr == 1:
+                block = block[0]
+            res = fun(block)
+            out[:, k:k+nk] = res.reshape(ntr, outsize)[:nk].T
+        return out
+
+
+class _AdjointOperator:
+    # A^H of an Operator, with the LinearOperator members
+    def __init__(self,op):
+        self.op = op
+        self.shape = (op.shape[1], op.shape[0])
+        self.dtype = op.dtype
+        self.matvec, self.rmatvec = op.rmatvec, op.matvec
+        self.matmat, self.rmatmat = op.rmatmat, op.matmat
+
+    @property
+    def H(self):
+        return self.op
+
+
+class _NormalOperator:
+    # A^H W A of an Operator, with the LinearOperator members
+    def __init__(self,op,weights):
+        self.op = op
+        self.weights = weights
+        self.shape = (op.shape[1], op.shape[1])
+        self.dtype = op.dtype
+
+    def _fun(self,f):
+        return self.op.plan.execute_normal(f, self.weights)
+
+    def matvec(self,v):
+        return self.op._apply(self._fun, v, self.op.n_modes, self.shape[0])
+
+    def matmat(self,V):
+        return self.op._applymat(self._fun, V, self.op.n_modes, self.shape[0])
+
+    rmatvec = matvec
+    rmatmat = matmat
+
+    @property
+    def H(self):
+        return self
+
+
+class ToeplitzNormal:
+    r"""
+    Fast normal operator ``A^H W A`` of the type-2 NUFFT by Toeplitz embedding
+
+    For ``A`` the type-2 NUFFT with sign ``isign`` at fixed points (as in
+    ``Operator``) and ``W`` the diagonal of real ``weights``,
+    ``(A^H W A f)_k = sum_l T(k-l) f_l`` with the kernel
+    ``T(m) = sum_j w_j exp(-i isign m.x_j)``. The kernel is computed once, by
+    a type-1 ``Plan`` with twice the number of modes in each dimension, and
+    its circulant embedding is Fourier transformed. Each application is then
+    a zero-padded FFT, a pointwise product with the (real) kernel transform,
+    and an inverse FFT, on a grid twice the size of ``n_modes`` in each
+    dimension, with no spreading or interpolation. This pays off when
+    ``A^H W A`` is applied many times, as in CG iterations; the result
+    agrees with ``Operator.normal`` to about the tolerance ``eps``.
+
+    It has the ``LinearOperator`` members ``shape``, ``dtype``, ``matvec``,
+    ``rmatvec``, ``matmat`` and ``rmatmat``, acting on flattened mode vectors.
+
+    Args:
+        n_modes     (int or tuple of ints): number of modes in each dimension.
+        x           (float[M]): first coordinate of the nonuniform points.
+        y           (float[M], optional): second coordinate.
+        z           (float[M], optional): third coordinate.
+        weights     (float[M], optional): real weights at the points (for
+                    example density compensation); all ones if omitted.
+        eps         (float, optional): precision requested (>1e-16).
+        isign       (int, optional): sign of the forward (type-2) transform.
+        **kwargs    (optional): further options of the type-1 ``Plan`` that
+                    computes the kernel, see :ref:`opts` (``modeord`` must
+                    be 0).
+    """
+    def __init__(self,n_modes,x,y=None,z=None,weights=None,eps=1e-6,isign=-1,**kwargs):
+        if kwargs.get('modeord', 0) != 0 or kwargs.get('real'):
+            raise RuntimeError('FINUFFT ToeplitzNormal needs modeord=0 and no real mode')
+        self.n_modes = tuple(int(n) for n in np.atleast_1d(n_modes))
+        dim = len(self.n_modes)
+        kwargs['modeord'] = 1       # kernel directly in circulant (FFT) order
+        plan = Plan(1, tuple(2 * n for n in self.n_modes), 1, eps,
+                    -1 if isign >= 0 else 1, **kwargs)
+        plan.setpts(x, y, z)
+        rdtype = np.float32 if plan.is_single else np.float64
+        if weights is None:
+            weights = np.ones(plan.nj, dtype=rdtype)
+        T = plan.execute(np.asarray(weights, dtype=rdtype))
+        # entries with an index -n (of the 2n) never couple modes; zeroing
+        # them makes T Hermitian, so its transform is real
+        for a in range(dim):
+            idx = [slice(None)] * dim
+            idx[a] = self.n_modes[a]
+            T[tuple(idx)] = 0
+        self._axes = tuple(range(-dim, 0))
+        self.kernel_hat = np.fft.fftn(T, axes=self._axes).real.astype(rdtype)
+        self.dtype = np.dtype(np.complex64 if plan.is_single else np.complex128)
+        N = int(np.prod(self.n_modes))
+        self.shape = (N, N)
+        self._buf = None
+
+    def apply(self,f):
+        r"""
+        Apply ``A^H W A`` to modes ``f`` of shape ``n_modes``, or of shape
+        (K, *n_modes) for K vectors at once
+        """
+        f = np.asarray(f)
+        dim = len(self.n_modes)
+        if f.shape[f.ndim-dim:] != self.n_modes:
+            raise RuntimeError('FINUFFT ToeplitzNormal f.shape is not consistent with n_modes')
+        # zero-padded grid, reused between calls of the same batch shape
+        bshape = f.shape[:f.ndim-dim] + tuple(2 * n for n in self.n_modes)
+        if self._buf is None or self._buf.shape != bshape:
+            self._buf = np.zeros(bshape, dtype=self.dtype)
+        else:
+            self._buf.fill(0)
+        inner = (Ellipsis,) + tuple(slice(0, n) for n in self.n_modes)
+        self._buf[inner] = f
+        F = np.fft.fftn(self._buf, axes=self._axes)
+        F *= self.kernel_hat
+        return np.fft.ifftn(F, axes=self._axes)[inner].astype(self.dtype)
+
+    def matvec(self,v):
+        v = np.asarray(v)
+        out = self.apply(v.reshape(self.n_modes)).reshape(-1)
+        return out if v.ndim == 1 else out.reshape(-1, 1)
+
+    def matmat(self,V):
+        V = np.asarray(V)
+        if V.ndim != 2 or V.shape[0] != self.shape[1]:
+            raise RuntimeError('FINUFFT ToeplitzNormal matrix has the wrong shape')
+        out = self.apply(V.T.reshape((V.shape[1],) + self.n_modes))
+        return out.reshape(V.shape[1], -1).T
+
+    rmatvec = matvec
+    rmatmat = matmat
+
+    @property
+    def H(self):
+        return self
@@ -0,0 +1,172 @@
+# Opt-in LRU cache of type 1 and 2 plans used by the simple interfaces.
+#
+# The simple nufft* functions build, use and destroy a Plan on every call,
+# which for small problems is dominated by FFTW planning and allocation of the
+# fine grid. When the cache is enabled (it is off by default) invoke_guru
+# instead checks a plan out of the cache by its planning parameters, sets the
+# new nonuniform points, executes, and checks the plan back in.
+#
+# A plan is removed from the cache while it is checked out, so that two threads
+# calling a simple interface with the same parameters never share a plan (they
+# would race on its fine-grid workspace); the second one just builds its own.
+
+
+import collections
+import threading
+
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['hits', 'misses', 'evictions',
+                                    'maxsize', 'max_bytes',
+                                    'currsize', 'currbytes'])
+
+
+class _PlanCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plans = collections.OrderedDict()     # key -> (plan, nbytes)
+        self.maxsize = 0
+        self.max_bytes = None
+        self.currbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize, max_bytes):
+        with self._lock:
+            self.maxsize = maxsize
+            self.max_bytes = max_bytes
+            evicted = self._evict()
+        del evicted             # destroy evicted plans outside the lock
+
+    def clear(self):
+        with self._lock:
+            evicted = list(self._plans.values())
+            self._plans.clear()
+            self.currbytes = 0
+            self.hits = self.misses = self.evictions = 0
+        del evicted
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self.maxsize, self.max_bytes,
+                             len(self._plans), self.currbytes)
+
+    def enabled(self):
+        return self.maxsize > 0
+
+    def checkout(self, key):
+        """Remove and return the plan stored under key, or None on a miss."""
+        with self._lock:
+            entry = self._plans.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.currbytes -= entry[1]
+            return entry[0]
+
+    def checkin(self, key, plan, nbytes):
+        """Store plan as most recently used, evicting as needed."""
+        evicted = []
+        with self._lock:
+            if self.maxsize <= 0 or (self.max_bytes is not None
+                                     and nbytes > self.max_bytes):
+                return          # cache disabled meanwhile, or plan too big
+            old = self._plans.pop(key, None)
+            if old is not None:
+                # another thread checked in an identical plan first
+                self.currbytes -= old[1]
+                evicted.append(old)
+                self.evictions += 1
+            self._plans[key] = (plan, nbytes)
+            self.currbytes += nbytes
+            evicted += self._evict()
+        del evicted
+
+    def _evict(self):
+        # caller holds the lock; returns the evicted entries so that the
+        # (possibly slow) plan destruction happens after it is released
+        evicted = []
+        while self._plans and (len(self._plans) > self.maxsize or
+                               (self.max_bytes is not None and
+                                self.currbytes > self.max_bytes)):
+            key, entry = self._plans.popitem(last=False)
+            self.currbytes -= entry[1]
+            self.evictions += 1
+            evicted.append(entry)
+        return evicted
+
+
+_cache = _PlanCache()
+
+
+def plan_key(tp, n_modes, n_trans, eps, isign, dtype, kwargs):
+    """Hashable key of everything fixed at plan creation."""
+    return (tp, tuple(int(m) for m in n_modes), int(n_trans), float(eps),
+            int(isign), dtype, tuple(sorted(kwargs.items())))
+
+
+def plan_nbytes(n_modes, n_trans, is_single, kwargs):
+    """Estimate of the memory held by a type 1 or 2 plan (its fine grids)."""
+    sigma = kwargs.get('upsampfac', 0) or 2.0
+    batch = n_trans
+    maxbatchsize = kwargs.get('maxbatchsize', 0)
+    if maxbatchsize > 0:
+        batch = min(batch, maxbatchsize)
+    itemsize = 8 if is_single else 16
+    if kwargs.get('real') or kwargs.get('realmode'):
+        itemsize //= 2          # real fine grids
+    nf = 1.0
+    for m in n_modes:
+        nf *= max(sigma * m, 2)
+    return int(nf * batch * itemsize)
+
+
+### Public functions
+def set_plan_cache(maxsize=16, max_bytes=None):
+    r"""
+    Enable (or resize) the plan cache of the simple interfaces
+
+    When enabled, the type 1 and 2 ``nufft*`` functions keep the plans they
+    create in a least-recently-used cache keyed by transform type, number of
+    modes, number of transforms, tolerance, sign, precision and options, and
+    reuse them (only setting the new nonuniform points) on later calls with the
+    same parameters. This saves FFTW planning and fine-grid allocation, which
+    dominate the cost of repeated small transforms. Type 3 transforms are not
+    cached since their planning depends on the nonuniform points.
+
+    Args:
+        maxsize     (int, optional): maximum number of cached plans. Zero
+                    disables the cache and frees all cached plans.
+        max_bytes   (int, optional): bound on the total (estimated) memory of
+                    the fine-grid workspaces of the cached plans; ``None``
+                    means no bound.
+    """
+    if maxsize < 0:
+        raise RuntimeError('FINUFFT plan cache maxsize must be non-negative')
+    if max_bytes is not None and max_bytes < 0:
+        raise RuntimeError('FINUFFT plan cache max_bytes must be non-negative')
+    _cache.configure(int(maxsize), max_bytes)
+
+
+def plan_cache_info():
+    r"""
+    Report statistics of the plan cache
+
+    Returns:
+        CacheInfo: named tuple with fields ``hits``, ``misses``,
+        ``evictions``, ``maxsize``, ``max_bytes``, ``currsize`` (number of
+        cached plans) and ``currbytes`` (their estimated memory).
+    """
+    return _cache.info()
+
+
+def clear_plan_cache():
+    r"""
+    Destroy all cached plans and reset the statistics of the plan cache
+
+    The cache size limits set by ``set_plan_cache`` are kept.
+    """
+    _cache.clear()
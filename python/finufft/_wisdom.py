@@ -0,0 +1,171 @@
+# FFTW wisdom (saved FFT plans) import/export, and the automatic per-plan
+# wisdom files used by Plan when a wisdom directory is set. Also the same for
+# FINUFFT's own timed choices of the sort bins (opts spread_bin_tune=2).
+#
+# With opts fftw=FFTW_MEASURE (or PATIENT) most of the plan creation time goes
+# into FFTW trying out algorithms, and this is repeated by every new process.
+# FFTW can store what it learnt ("wisdom") in a file; importing it before
+# planning the same sizes makes MEASURE-quality planning nearly free.
+
+
+import os
+import tempfile
+import threading
+
+import finufft._finufft as _finufft
+
+
+FFTW_ESTIMATE = 64      # from fftw3.h; no measuring, hence nothing to save
+
+_wisdom_dir = None
+_lock = threading.Lock()
+
+
+def _funcs(dtype, what='wisdom'):
+    if dtype in ('double', 'float64', 'complex128'):
+        return getattr(_finufft, '_import_' + what), \
+            getattr(_finufft, '_export_' + what)
+    elif dtype in ('single', 'float32', 'complex64'):
+        return getattr(_finufft, '_import_' + what + 'f'), \
+            getattr(_finufft, '_export_' + what + 'f')
+    raise RuntimeError('FINUFFT dtype(precision type) must be single or double')
+
+
+def _encode(path):
+    return os.fsencode(os.path.abspath(path))
+
+
+def _save(exp, path, what):
+    path = os.path.abspath(path)
+    # write to a temporary file and rename, so that concurrent processes
+    # never read a partially written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        with _lock:
+            ier = exp(os.fsencode(tmp))
+        if ier != 0:
+            raise RuntimeError('FINUFFT could not save %s to %s' % (what, path))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+### Public functions
+def load_wisdom(path, dtype='double'):
+    r"""
+    Load FFTW wisdom from a file
+
+    The wisdom (FFT plans measured by a previous process, see
+    ``save_wisdom``) is added to what FFTW already knows, so that plans
+    created afterwards with ``fftw=FFTW_MEASURE`` for the same fine grid
+    sizes, batch size and number of threads are obtained without measuring.
+
+    Args:
+        path    (str): the wisdom file.
+        dtype   (str, optional): precision of the wisdom, ``'double'`` or
+                ``'single'`` (FFTW keeps them separately).
+    """
+    imp, _ = _funcs(dtype)
+    with _lock:
+        ier = imp(_encode(path))
+    if ier != 0:
+        raise RuntimeError('FINUFFT could not load FFTW wisdom from ' + str(path))
+
+
+def save_wisdom(path, dtype='double'):
+    r"""
+    Save all FFTW wisdom accumulated by this process to a file
+
+    Args:
+        path    (str): the wisdom file (overwritten).
+        dtype   (str, optional): precision of the wisdom, ``'double'`` or
+                ``'single'``.
+    """
+    _, exp = _funcs(dtype)
+    _save(exp, path, 'FFTW wisdom')
+
+
+def load_tuning(path, dtype='double'):
+    r"""
+    Load timed choices of the sort bins from a file
+
+    Plans created with ``spread_bin_tune=2`` time a few sizes of the bins
+    used to sort the nonuniform points at their first ``setpts`` for each
+    combination of fine grid size, number of points (to within a factor of
+    two), kernel width, number of threads and transform direction, and keep
+    the fastest for later plans of this process. Loading a file saved by
+    ``save_tuning`` lets a new process skip that timing.
+
+    Args:
+        path    (str): the tuning file.
+        dtype   (str, optional): precision of the tuning, ``'double'`` or
+                ``'single'`` (they are kept separately).
+    """
+    imp, _ = _funcs(dtype, 'tuning')
+    with _lock:
+        ier = imp(_encode(path))
+    if ier != 0:
+        raise RuntimeError('FINUFFT could not load bin tuning from ' + str(path))
+
+
+def save_tuning(path, dtype='double'):
+    r"""
+    Save the choices of the sort bins timed so far by this process to a file
+
+    Args:
+        path    (str): the tuning file (overwritten).
+        dtype   (str, optional): precision of the tuning, ``'double'`` or
+                ``'single'``.
+    """
+    _, exp = _funcs(dtype, 'tuning')
+    _save(exp, path, 'bin tuning')
+
+
+def set_wisdom_dir(path):
+    r"""
+    Set a directory for automatic FFTW wisdom files, or ``None`` to disable
+
+    When set, each type 1 or 2 ``Plan`` created with an FFTW planning mode
+    other than ``FFTW_ESTIMATE`` (through the ``fftw`` option) looks for a
+    wisdom file named after its precision, number of modes, tolerance,
+    upsampling factor, batch size and number of threads. If found, it is
+    loaded before planning, which then costs almost nothing; otherwise the
+    wisdom is saved there after planning. This lets frequently restarted
+    worker processes get measured FFT plans at the cost of estimated ones.
+
+    Args:
+        path    (str or None): directory for the wisdom files (created if
+                needed).
+    """
+    global _wisdom_dir
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+        path = os.path.abspath(path)
+    _wisdom_dir = path
+
+
+def get_wisdom_dir():
+    r"""
+    Return the directory set by ``set_wisdom_dir`` (or ``None``)
+    """
+    return _wisdom_dir
+
+
+### Automatic wisdom files for Plan
+def auto_wisdom_path(n_modes, n_trans, eps, is_single, opts):
+    """Wisdom file for a type 1 or 2 plan, or None if not applicable."""
+    if _wisdom_dir is None or opts.fftw & FFTW_ESTIMATE:
+        return None
+    # the fine grid sizes are determined by the modes, eps and upsampfac
+    # and the batch size by n_trans, maxbatchsize and the number of threads,
+    # which the name has as the plan resolves it (nthreads=0: OMP's maximum,
+    # which may differ between processes), as FFTW's plans depend on it
+    nthreads = opts.nthreads or _finufft._max_threads()
+    name = 'finufft-%s-%s-eps%.3g-sigma%g-n%d-b%d-t%d-f%d%s%s.wisdom' % (
+        'single' if is_single else 'double',
+        'x'.join(str(int(m)) for m in n_modes), eps, opts.upsampfac,
+        n_trans, opts.maxbatchsize, nthreads, opts.fftw,
+        '-real' if opts.realmode else '', '-prune' if opts.fft_prune else '')
+    return os.path.join(_wisdom_dir, name)
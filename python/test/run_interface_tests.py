@@ -0,0 +1,746 @@
+# Pass-fail checks of the python-only interface features (plan cache, etc),
+# complementing the accuracy tests in accuracy_speed_tests.py.
+# Usage: python run_interface_tests.py     (prints and exits nonzero on failure)
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import finufft
+
+
+def _relerr(a, b):
+    return np.linalg.norm(a - b) / np.linalg.norm(b)
+
+
+def test_plan_cache():
+    rng = np.random.default_rng(0)
+    M, N = 1000, (20, 30)
+    x = rng.uniform(-np.pi, np.pi, M)
+    y = rng.uniform(-np.pi, np.pi, M)
+    c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+
+    finufft.set_plan_cache(0)
+    ref = finufft.nufft2d1(x, y, c, N, eps=1e-9)
+
+    finufft.set_plan_cache(2)
+    finufft.clear_plan_cache()
+    f1 = finufft.nufft2d1(x, y, c, N, eps=1e-9)
+    f2 = finufft.nufft2d1(x[::-1].copy(), y[::-1].copy(), c[::-1].copy(), N, eps=1e-9)
+    info = finufft.plan_cache_info()
+    assert info.misses == 1 and info.hits == 1 and info.currsize == 1
+    assert _relerr(f1, ref) < 1e-12 and _relerr(f2, ref) < 1e-8
+
+    # two more distinct keys evict the least recently used plan
+    finufft.nufft2d1(x, y, c, N, eps=1e-6)
+    finufft.nufft2d2(x, y, ref, eps=1e-9)
+    info = finufft.plan_cache_info()
+    assert info.evictions == 1 and info.currsize == 2
+
+    # memory bound
+    finufft.set_plan_cache(8, max_bytes=1)
+    assert finufft.plan_cache_info().currsize == 0
+    finufft.nufft2d1(x, y, c, N, eps=1e-9)
+    assert finufft.plan_cache_info().currsize == 0
+
+    finufft.set_plan_cache(0)
+
+
+def test_wisdom():
+    import os, tempfile
+    d = tempfile.mkdtemp()
+    finufft.set_wisdom_dir(d)
+    try:
+        finufft.Plan(1, (30, 40), fftw=0)      # FFTW_MEASURE
+        files = os.listdir(d)
+        assert len(files) == 1
+        finufft.Plan(1, (30, 40), fftw=0)      # loads the wisdom file
+        finufft.Plan(1, (30, 40))              # FFTW_ESTIMATE: no file
+        assert os.listdir(d) == files
+        # named after the threads nthreads=0 resolves to, not 0
+        nthr = finufft._finufft._max_threads()
+        assert '-t%d-' % nthr in files[0]
+        finufft.Plan(1, (30, 40), fftw=0, nthreads=nthr)
+        assert os.listdir(d) == files
+        finufft.Plan(1, (30, 40), fftw=0, nthreads=nthr + 1)
+        assert len(os.listdir(d)) == 2
+        path = os.path.join(d, 'single.wisdom')
+        finufft.save_wisdom(path, dtype='single')
+        finufft.load_wisdom(path, dtype='single')
+        try:
+            finufft.load_wisdom(os.path.join(d, 'missing.wisdom'))
+            assert False
+        except RuntimeError:
+            pass
+    finally:
+        finufft.set_wisdom_dir(None)
+
+
+
+def test_execute_async():
+    import asyncio
+    import threading
+    import time
+    rng = np.random.default_rng(1)
+    M, N = 200000, (200, 200)
+    x = rng.uniform(-np.pi, np.pi, M)
+    y = rng.uniform(-np.pi, np.pi, M)
+    c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+    plan = finufft.Plan(1, N, eps=1e-9)
+    plan.setpts(x, y)
+    ref = plan.execute(c)
+
+    # the GIL is released: a Python thread keeps running during transforms
+    ticks = [0]
+    done = threading.Event()
+    def ticker():
+        while not done.is_set():
+            ticks[0] += 1
+            time.sleep(0.0005)
+    th = threading.Thread(target=ticker)
+    th.start()
+    futs = [plan.execute_async(c) for _ in range(4)]
+    t0 = ticks[0]
+    res = [fut.result() for fut in futs]
+    done.set()
+    th.join()
+    assert ticks[0] > t0
+    assert all(_relerr(f, ref) < 1e-14 for f in res)
+
+    async def main():
+        return await asyncio.wrap_future(plan.execute_async(c))
+    assert _relerr(asyncio.run(main()), ref) < 1e-14
+
+
+
+def test_output_buffers():
+    rng = np.random.default_rng(2)
+    M, N, K = 5000, (30, 40), 2
+    x = rng.uniform(-np.pi, np.pi, M)
+    y = rng.uniform(-np.pi, np.pi, M)
+    c = rng.standard_normal((K, M)) + 1j * rng.standard_normal((K, M))
+    plan = finufft.Plan(1, N, n_trans=K, eps=1e-9)
+    plan.setpts(x, y)
+    ref = plan.execute(c)
+
+    # reused plan-owned buffer
+    f1 = plan.execute(c, reuse=True)
+    f2 = plan.execute(c, reuse=True)
+    assert f1 is f2 and f1.ctypes.data % 64 == 0
+    assert _relerr(f1, ref) < 1e-15
+
+    # Fortran-ordered and strided outputs
+    out = np.zeros((K,) + N, dtype=np.complex128, order='F')
+    assert plan.execute(c, out=out) is out and _relerr(out, ref) < 1e-15
+    big = np.zeros((K, 2 * N[0], N[1]), dtype=np.complex128)
+    out = big[:, ::2, :]
+    plan.execute(c, out=out)
+    assert _relerr(out, ref) < 1e-15 and not big[:, 1::2, :].any()
+
+
+def test_copies():
+    rng = np.random.default_rng(3)
+    M, N, K = 3000, (24, 32), 2
+    x = rng.uniform(-np.pi, np.pi, M)
+    y = rng.uniform(-np.pi, np.pi, M)
+    c = rng.standard_normal((K, M))
+    fk = rng.standard_normal((K,) + N)
+    for dtype, tol in ((np.float64, 1e-13), (np.float32, 1e-5)):
+        xs, ys = x.astype(dtype), y.astype(dtype)
+        for tp, data in ((1, c.astype(dtype)), (2, fk.astype(dtype))):
+            datac = data.astype(np.result_type(dtype, 1j))
+            plan = finufft.Plan(tp, N, n_trans=K, eps=1e-6, strict=True,
+                                dtype='single' if dtype == np.float32 else 'double')
+            plan.setpts(xs, ys)
+            # real input read natively, without any copy
+            assert _relerr(plan.execute(data), plan.execute(datac)) < tol
+            assert plan.n_copies == 0 and plan.bytes_copied == 0
+            try:
+                plan.setpts(xs[::-1], ys)
+                assert False
+            except RuntimeError:
+                pass
+            plan.strict = False
+            plan.setpts(xs[::-1], ys)
+            assert plan.n_copies == 1 and plan.bytes_copied == xs.nbytes
+
+    # type 3, also through the simple interface
+    s = rng.uniform(-10, 10, 50)
+    f = finufft.nufft1d3(x, c[0], s, eps=1e-12)
+    assert _relerr(f, finufft.nufft1d3(x, c[0] + 0j, s, eps=1e-12)) < 1e-14
+
+
+def test_real_mode():
+    rng = np.random.default_rng(4)
+    M, K = 4000, 2
+    for N in ((31,), (24, 17), (10, 13, 8)):
+        pts = [rng.uniform(-np.pi, np.pi, M) for _ in N]
+        c = rng.standard_normal((K, M))
+        f = rng.standard_normal((K,) + N) + 1j * rng.standard_normal((K,) + N)
+        for isign in (1, -1):
+            for modeord in (0, 1):
+                kw = dict(n_trans=K, eps=1e-9, isign=isign, modeord=modeord)
+                plan = finufft.Plan(1, N, **kw)
+                plan.setpts(*pts)
+                ref = plan.execute(c)
+                plan = finufft.Plan(1, N, real=True, **kw)
+                plan.setpts(*pts)
+                assert _relerr(plan.execute(c), ref) < 1e-13
+                plan = finufft.Plan(2, N, **kw)
+                plan.setpts(*pts)
+                ref = plan.execute(f).real
+                plan = finufft.Plan(2, N, real=True, **kw)
+                plan.setpts(*pts)
+                out = plan.execute(f)
+                assert out.dtype == np.float64 and _relerr(out, ref) < 1e-13
+
+    # simple interfaces, single precision
+    x, y = (rng.uniform(-np.pi, np.pi, M).astype(np.float32) for _ in range(2))
+    c = rng.standard_normal(M).astype(np.float32)
+    ref = finufft.nufft2d1(x, y, c, (20, 30), eps=1e-5)
+    assert _relerr(finufft.nufft2d1r(x, y, c, (20, 30), eps=1e-5), ref) < 1e-5
+    ref = finufft.nufft2d2(x, y, ref, eps=1e-5)
+    out = finufft.nufft2d2r(x, y, finufft.nufft2d1(x, y, c, (20, 30), eps=1e-5), eps=1e-5)
+    assert out.dtype == np.float32 and _relerr(out, ref.real) < 1e-5
+
+    for tp, data in ((1, c + 0j), (3, c)):
+        try:
+            plan = finufft.Plan(tp, (20,) if tp == 1 else 1, real=True, dtype='single')
+            plan.setpts(x)
+            plan.execute(data)
+            assert False
+        except RuntimeError:
+            pass
+
+
+def test_operator():
+    rng = np.random.default_rng(5)
+    M, N, K = 3000, (20, 24), 3
+    x = rng.uniform(-np.pi, np.pi, M)
+    y = rng.uniform(-np.pi, np.pi, M)
+    w = rng.uniform(0, 1, M)
+    f = rng.standard_normal((K,) + N) + 1j * rng.standard_normal((K,) + N)
+    c = rng.standard_normal((K, M)) + 1j * rng.standard_normal((K, M))
+    op = finufft.Operator(N, x, y, n_trans=K, eps=1e-12, isign=1)
+    t1 = finufft.Plan(1, N, n_trans=K, eps=1e-12, isign=-1)
+    t1.setpts(x, y)
+    Af = op.forward(f)
+    assert _relerr(op.adjoint(c), t1.execute(c)) < 1e-14
+    assert _relerr(op.normal(f, w), t1.execute(w * Af)) < 1e-14
+    # <c, A f> = <A^H c, f>
+    assert abs(np.vdot(c, Af) - np.vdot(op.adjoint(c), f)) < 1e-11 * abs(np.vdot(c, Af))
+
+    # LinearOperator members, columns grouped by n_trans (last group padded)
+    assert op.shape == (M, N[0] * N[1])
+    V = rng.standard_normal((op.shape[1], 4)) + 0j
+    AV = op.matmat(V)
+    assert _relerr(AV[:, 3], op.matvec(V[:, 3])) < 1e-15
+    assert _relerr(op.rmatmat(AV)[:, 1], op.H.matvec(AV[:, 1])) < 1e-15
+    nop = op.normal_operator(w)
+    assert _relerr(nop.matvec(V[:, 0]), op.rmatvec(w * op.matvec(V[:, 0]))) < 1e-13
+
+    # type 1 plan: adjoint is type 2, normal operator on strengths
+    t2 = finufft.Plan(2, N, n_trans=K, eps=1e-12, isign=1)
+    t2.setpts(x, y)
+    assert _relerr(t1.execute_adjoint(f), t2.execute(f)) < 1e-14
+    assert _relerr(t1.execute_normal(c), t2.execute(t1.execute(c))) < 1e-14
+
+
+def test_toeplitz_normal():
+    rng = np.random.default_rng(6)
+    M = 4000
+    for N in ((41,), (20, 31), (8, 10, 12)):
+        pts = [rng.uniform(-np.pi, np.pi, M) for _ in N]
+        w = rng.uniform(0, 1, M)
+        f = rng.standard_normal((2,) + N) + 1j * rng.standard_normal((2,) + N)
+        for isign in (1, -1):
+            op = finufft.Operator(N, *pts, n_trans=2, eps=1e-12, isign=isign)
+            tn = finufft.ToeplitzNormal(N, *pts, weights=w, eps=1e-12, isign=isign)
+            assert _relerr(tn.apply(f), op.normal(f, w)) < 1e-10
+            v = f[0].ravel()
+            assert _relerr(tn.matvec(v), tn.matmat(np.stack([v, v], 1))[:, 1]) < 1e-15
+
+
+def test_execute_many():
+    rng = np.random.default_rng(7)
+    M, N = 500, (24, 20)
+    plans, inputs = [], []
+    for i in range(30):
+        tp = i % 3 + 1
+        real = i % 5 == 0 and tp != 3
+        x, y = rng.uniform(-np.pi, np.pi, (2, M))
+        plan = finufft.Plan(tp, N if tp != 3 else 2, eps=1e-9, nthreads=1, real=real)
+        if tp == 3:
+            plan.setpts(x, y, None, *rng.uniform(-20, 20, (2, 50)))
+        else:
+            plan.setpts(x, y)
+        shape = N if tp == 2 else M
+        data = rng.standard_normal(shape)
+        plans.append(plan)
+        inputs.append(data if real else data + 1j * rng.standard_normal(shape))
+    refs = [plan.execute(data) for plan, data in zip(plans, inputs)]
+    outs = [None] * len(plans)
+    outs[1] = np.empty(M, dtype=np.complex128)
+    res = finufft.execute_many(plans, inputs, outs, nthreads=2)
+    assert res[1] is outs[1]
+    assert all(_relerr(a, b) < 1e-15 for a, b in zip(res, refs))
+    try:
+        finufft.execute_many(plans[:2] * 2, inputs[:2] * 2)
+        assert False
+    except RuntimeError:
+        pass
+
+
+def test_stats():
+    rng = np.random.default_rng(8)
+    M, N, K = 20000, (40, 50), 3
+    x, y = rng.uniform(-np.pi, np.pi, (2, M))
+    c = rng.standard_normal((K, M)) + 1j * rng.standard_normal((K, M))
+    plan = finufft.Plan(1, N, n_trans=K, eps=1e-9, maxbatchsize=2)
+    assert plan.stats['n_executes'] == 0 and plan.stats['batch_size'] == 2
+    plan.setpts(x, y)
+    plan.execute(c)
+    plan.execute_adjoint(plan.execute(c))
+    t, s = plan.last_timings, plan.stats
+    assert t['makeplan'] > 0 and t['setpts'] >= t['sort'] > 0
+    assert t['execute'] >= t['spread_interp'] + t['fft'] + t['deconvolve'] - 1e-6
+    assert t['prephase'] == 0 and t['inner_type2'] == 0
+    assert s['n_executes'] == 3 and s['n_batches'] == 2 and s['execute_total'] >= t['execute']
+    assert s['bytes_allocated'] >= 16 * 2 * 80 * 100      # fine grids
+
+    plan = finufft.Plan(3, 2, eps=1e-9)
+    plan.setpts(x, y, None, *rng.uniform(-50, 50, (2, 500)))
+    plan.execute(c[0])
+    t = plan.last_timings
+    assert t['t3_prep'] > 0 and t['inner_type2'] > 0 and t['fft'] > 0
+
+
+def test_update_pts():
+    rng = np.random.default_rng(9)
+    M, N = 5000, (30, 40, 20)
+    for tp in (1, 2):
+        for dim in (1, 2, 3):
+            pts = rng.uniform(-np.pi, np.pi, (dim, M))
+            plan = finufft.Plan(tp, N[:dim], eps=1e-12)
+            plan.setpts(*pts.copy())
+            ref = finufft.Plan(tp, N[:dim], eps=1e-12)
+            data = (rng.standard_normal(M) if tp == 1 else
+                    rng.standard_normal(N[:dim])) + 0j
+            for n in (1, 40, 40, 3000):     # the last one re-sorts in full
+                ind = rng.integers(0, M, n)
+                pts[:, ind] = rng.uniform(-np.pi, np.pi, (dim, n))
+                plan.update_pts(ind, *pts[:, ind])
+                ref.setpts(*pts.copy())
+                assert np.allclose(plan.execute(data), ref.execute(data),
+                                   rtol=0, atol=1e-9)
+
+    plan = finufft.Plan(1, (10,))
+    plan.setpts(np.zeros(3))
+    for bad in ([3], [-1]):
+        try:
+            plan.update_pts(np.array(bad), np.zeros(1))
+            assert False
+        except RuntimeError:
+            pass
+
+
+def test_spread_scratch():
+    # the spreader's per-thread workspace is kept by the plan: executes after
+    # the first one allocate nothing more, and all batch layouts agree (up to
+    # rounding, since with threads the order of adding subgrids may vary)
+    rng = np.random.default_rng(10)
+    M, N, K = 50000, (60, 70), 3
+    x, y = rng.uniform(-np.pi, np.pi, (2, M))
+    c = rng.standard_normal((K, M)) + 1j * rng.standard_normal((K, M))
+    ref = None
+    for spread_thread in (1, 2):
+        for maxbatchsize in (1, 3):
+            plan = finufft.Plan(1, N, n_trans=K, eps=1e-9, maxbatchsize=maxbatchsize,
+                                spread_thread=spread_thread)
+            plan.setpts(x, y)
+            f = plan.execute(c)
+            nbytes = plan.stats['bytes_allocated']
+            if ref is None:
+                ref = f
+            atol = 1e-12 * np.abs(ref).max()
+            for _ in range(3):
+                assert np.allclose(plan.execute(c), f, rtol=0, atol=atol)
+            assert plan.stats['bytes_allocated'] == nbytes
+            assert np.allclose(f, ref, rtol=0, atol=atol)
+
+
+def test_spread_alloc_error():
+    # a failed allocation of the spreader's scratch (forced here, in a child
+    # process, by capping its address space just before the first spread,
+    # which grows the scratch to a whole-grid subgrid as the points are
+    # unsorted) is raised by each kind of execute, not a partial result. Two
+    # OMP threads, all started before the cap (so that it only hits the
+    # spread), and one malloc arena (else threads' arenas have spare room)
+    code = """if 1:
+        import resource
+        import numpy as np
+        import finufft
+        rng = np.random.default_rng(0)
+        warm = finufft.Plan(1, (20, 20), nthreads=2)    # start OMP threads
+        warm.setpts(*rng.uniform(-np.pi, np.pi, (2, 100)))
+        warm.execute(np.ones(100, complex))
+        M, N = 20000, (500, 500)
+        x, y = rng.uniform(-np.pi, np.pi, (2, M))
+        c = np.ones((2, M), complex)
+        f = np.ones((2,) + N, complex)
+        opts = dict(eps=1e-6, nthreads=1, spread_sort=0)
+        cases = [(1, 'execute', c[0], f[0]), (2, 'execute_adjoint', c[0], f[0]),
+                 (2, 'execute_normal', f[0], f[0].copy()),
+                 (1, 'pipeline', c, f), (3, 'execute', c[0], c[0].copy()),
+                 (1, 'execute_many', c[0], f[0])]
+        for tp, how, data, out in cases:
+            kw = dict(opts, n_trans=2, maxbatchsize=1, pipeline=1,
+                      nthreads=2) if how == 'pipeline' else opts
+            plan = finufft.Plan(tp, N if tp < 3 else 2, **kw)
+            plan.setpts(x, y, **({} if tp < 3 else dict(s=x * 250, t=y * 250)))
+            with open('/proc/self/status') as st:
+                vm = [l for l in st if l.startswith('VmSize')]
+            lim = int(vm[0].split()[1]) * 1024 + (4 << 20)
+            resource.setrlimit(resource.RLIMIT_AS, (lim, resource.RLIM_INFINITY))
+            try:
+                if how == 'execute_many':
+                    finufft.execute_many([plan], [data], [out])
+                else:
+                    getattr(plan, how if how != 'pipeline' else 'execute')(
+                        data, out=out)
+                print(how, 'returned')
+            except RuntimeError as e:
+                print(how, 'raised', e)
+            resource.setrlimit(resource.RLIMIT_AS,
+                               (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+        """
+    if not os.path.exists('/proc/self/status'):    # (Linux only)
+        return
+    res = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                         text=True, env=dict(os.environ, OMP_NUM_THREADS='2',
+                                  MALLOC_ARENA_MAX='1'))
+    assert res.returncode == 0, res.stderr
+    lines = res.stdout.splitlines()
+    assert len(lines) == 6, res.stdout
+    for line in lines:
+        assert 'raised FINUFFT spreader malloc error' in line, line
+
+
+def _check_same_spread(seed, opts_a, opts_b):
+    # types 1, 2 and 3 in 1D to 3D (and for types 1, 2 the adjoint, and an
+    # execute after update_pts) give the same answers with the spreader
+    # options opts_a and opts_b: bit for bit with one thread (subgrids added
+    # in a fixed order), up to rounding with several
+    rng = np.random.default_rng(seed)
+    M, N = 20000, (40, 30, 20)
+    for dim in (1, 2, 3):
+        x = rng.uniform(-3 * np.pi, 3 * np.pi, (dim, M))
+        c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+        f = rng.standard_normal(N[:dim]) + 1j * rng.standard_normal(N[:dim])
+        s = dict(zip('stu', rng.uniform(-40, 40, (dim, 500))))
+        ind = rng.integers(0, M, 100)
+        new = rng.uniform(-np.pi, np.pi, (dim, 100))
+        for tp, data in ((1, c), (2, f), (3, c)):
+            for nthr in (1, 4):
+                outs = []
+                for opts in (opts_a, opts_b):
+                    plan = finufft.Plan(tp, N[:dim] if tp < 3 else dim,
+                                        eps=1e-9, nthreads=nthr, **opts)
+                    pts = x.copy()       # (update_pts writes into them)
+                    plan.setpts(*pts, **(s if tp == 3 else {}))
+                    outs.append(plan.execute(data))
+                    if tp < 3:
+                        outs.append(plan.execute_adjoint(f if tp == 1 else c))
+                        plan.update_pts(ind, *new)
+                        outs.append(plan.execute(data))
+                # (type 3's deconvolve amplifies rounding by up to ~1/eps)
+                tol = 0 if nthr == 1 else 1e-12 if tp < 3 else 1e-7
+                half = len(outs) // 2
+                for a, b in zip(outs[:half], outs[half:]):
+                    assert np.allclose(a, b, rtol=0, atol=tol * np.abs(a).max())
+
+
+def test_precompute_coords():
+    # points stored folded and sorted give the same answers
+    _check_same_spread(11, dict(spread_precompute_coords=0),
+                       dict(spread_precompute_coords=1))
+
+
+def test_kernel_table():
+    # stored kernel values give the same answers as evaluating the kernel,
+    # also after update_pts; a table over the cap is not made
+    for kw in (dict(spread_kerevalmeth=0), dict(spread_precompute_coords=1)):
+        _check_same_spread(12, dict(kw, spread_kernel_table_mb=0),
+                           dict(kw, spread_kernel_table_mb=100))
+    rng = np.random.default_rng(12)
+    M, N = 20000, (40, 30, 20)
+    x = rng.uniform(-3 * np.pi, 3 * np.pi, (3, M))
+    plan = finufft.Plan(1, N, eps=1e-9)
+    plan.setpts(*x)
+    nbytes = plan.stats['bytes_allocated']
+    plan = finufft.Plan(1, N, eps=1e-9, spread_kernel_table_mb=1)
+    plan.setpts(*x)                 # table of 3*w*M doubles is about 5 MB
+    assert plan.stats['bytes_allocated'] == nbytes
+    plan = finufft.Plan(1, N, eps=1e-9, spread_kernel_table_mb=10)
+    plan.setpts(*x)
+    extra = plan.stats['bytes_allocated'] - nbytes
+    assert extra > 0 and extra % (8 * 3 * M) == 0
+
+
+def test_interp_matrix():
+    # the exported matrix has w**dim entries per row, at fine grid pts near
+    # its point; interpolating with the stored matrix matches the spreader
+    rng = np.random.default_rng(13)
+    M, N = 5000, (40, 30, 20)
+    for dim in (1, 2, 3):
+        x = rng.uniform(-3 * np.pi, 3 * np.pi, (dim, M))
+        c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+        f = rng.standard_normal(N[:dim]) + 1j * rng.standard_normal(N[:dim])
+        ind = rng.integers(0, M, 100)
+        new = rng.uniform(-np.pi, np.pi, (dim, 100))
+        plan = finufft.Plan(2, N[:dim], eps=1e-9)
+        plan.setpts(*x)
+        A = plan.interp_matrix()
+        nf = plan.fine_grid_shape
+        w = round((A.nnz / M) ** (1 / dim))
+        assert A.shape == (M, np.prod(nf)) and A.nnz == M * w ** dim
+        row = np.unravel_index(A[0].indices, nf)
+        for d in range(dim):
+            g = np.mod(x[d, 0] + np.pi, 2 * np.pi) * nf[d] / (2 * np.pi)
+            dist = np.abs(np.mod(row[d] - g + nf[d] / 2, nf[d]) - nf[d] / 2)
+            assert dist.max() <= w / 2
+        for tp in (1, 2):
+            outs = []
+            for mb in (0, 1000):
+                plan = finufft.Plan(tp, N[:dim], eps=1e-9,
+                                    spread_interp_matrix_mb=mb)
+                pts = x.copy()
+                plan.setpts(*pts)
+                outs.append(plan.execute(c if tp == 1 else f))
+                outs.append(plan.execute_adjoint(f if tp == 1 else c))
+                plan.update_pts(ind, *new)
+                outs.append(plan.execute(c if tp == 1 else f))
+            half = len(outs) // 2
+            for a, b in zip(outs[:half], outs[half:]):
+                assert np.allclose(a, b, rtol=1e-13, atol=1e-13 * abs(a).max())
+
+
+def test_spread_partition():
+    # lock-free tiled spreading agrees with the default up to rounding
+    # (only exercises the tiles when more than one thread is available)
+    rng = np.random.default_rng(16)
+    M, N = 50000, (64, 48, 32)
+    for dim in (1, 2, 3):
+        x = rng.uniform(-3 * np.pi, 3 * np.pi, (dim, M))
+        c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+        for kw in (dict(), dict(spread_precompute_coords=1),
+                   dict(spread_kernel_table_mb=100)):
+            outs = []
+            for part in (0, 1):
+                plan = finufft.Plan(1, N[:dim], eps=1e-9,
+                                    spread_partition=part, spread_thread=1,
+                                    **kw)
+                plan.setpts(*x)
+                outs.append(plan.execute(c))
+            assert np.allclose(outs[0], outs[1], rtol=0,
+                               atol=1e-12 * np.abs(outs[0]).max())
+
+
+def test_bin_tune():
+    # tuned sort bins only change the order of summation, also after
+    # update_pts; timed choices are saved and loaded per precision
+    import os, tempfile
+    rng = np.random.default_rng(17)
+    M, N = 20000, (200, 60, 40)
+    for dim in (1, 2, 3):
+        x = rng.uniform(-3 * np.pi, 3 * np.pi, (dim, M))
+        c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+        f = rng.standard_normal(N[:dim]) + 1j * rng.standard_normal(N[:dim])
+        ind = rng.integers(0, M, 100)
+        new = rng.uniform(-np.pi, np.pi, (dim, 100))
+        for tp, data in ((1, c), (2, f)):
+            outs = []
+            for mode in (0, 1, 2):
+                plan = finufft.Plan(tp, N[:dim], eps=1e-9,
+                                    spread_bin_tune=mode)
+                plan.setpts(*x.copy())
+                out = [plan.execute(data)]
+                plan.update_pts(ind, *new)
+                out.append(plan.execute(data))
+                outs.append(out)
+            for out in outs[1:]:
+                for a, b in zip(outs[0], out):
+                    assert np.allclose(a, b, rtol=0,
+                                       atol=1e-12 * np.abs(a).max())
+    d = tempfile.mkdtemp()
+    path = os.path.join(d, 'double.tuning')
+    finufft.save_tuning(path)
+    with open(path) as fid:
+        lines = fid.read().splitlines()
+    assert lines[0].startswith('# finufft bin tuning (double)')
+    assert len(lines) == 1 + 6      # one per dim and direction
+    finufft.load_tuning(path)
+    for bad in ('single', 'missing'):
+        try:
+            finufft.load_tuning(path if bad == 'single' else
+                                os.path.join(d, bad), dtype='single')
+            assert False
+        except RuntimeError:
+            pass
+
+
+def test_low_density():
+    # few pts on a big grid are spread straight to it (by slabs, one per
+    # thread, also if thinner than the kernel), unsorted: accurate, for any
+    # number of threads; the same pts are still sorted for interpolation
+    rng = np.random.default_rng(19)
+    M = 40
+    for N in ((100000,), (500, 400), (90, 80, 70)):
+        dim = len(N)
+        x = rng.uniform(-3 * np.pi, 3 * np.pi, (dim, M))
+        c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+        for kw in (dict(), dict(spread_kerevalmeth=0),
+                   dict(spread_kernel_table_mb=10),
+                   dict(spread_precompute_coords=1)):
+            outs = []
+            for nthr in (1, 3, 40):
+                plan = finufft.Plan(1, N, eps=1e-9, nthreads=nthr, **kw)
+                plan.setpts(*x)
+                assert not plan.stats['did_sort']
+                outs.append(plan.execute(c))
+            for out in outs[1:]:
+                assert np.allclose(outs[0], out, rtol=0,
+                                   atol=1e-10 * np.abs(outs[0]).max())
+            k = [rng.integers(-n // 2, (n + 1) // 2, 10) for n in N]
+            ex = np.exp(1j * sum(kk[:, None] * xx for kk, xx in zip(k, x))) @ c
+            f = outs[0][tuple(kk + n // 2 for kk, n in zip(k, N))]
+            assert np.abs(f - ex).max() < 1e-8 * np.abs(c).sum()
+        if dim > 1:                      # (1D interpolation is not sorted)
+            plan = finufft.Plan(2, N, eps=1e-9)
+            plan.setpts(*x)
+            assert plan.stats['did_sort']
+
+
+def test_pipeline():
+    # pipelined batches (two workspaces, a helper thread for the FFTs) give
+    # the batches in turn, complex and real, types 1 and 2
+    rng = np.random.default_rng(21)
+    M, K = 300, 5
+    for N in ((40,), (24, 20), (12, 10, 8)):
+        dim = len(N)
+        x = rng.uniform(-np.pi, np.pi, (dim, M))
+        c = rng.standard_normal((K, M)) + 1j * rng.standard_normal((K, M))
+        f = rng.standard_normal((K,) + N) + 1j * rng.standard_normal((K,) + N)
+        for real in (False, True):
+            for tp, data in ((1, c.real if real else c), (2, f)):
+                outs = []
+                for pipeline in (0, 1):
+                    plan = finufft.Plan(tp, N, n_trans=K, eps=1e-9, nthreads=4,
+                                        maxbatchsize=2, pipeline=pipeline,
+                                        real=real)
+                    plan.setpts(*x)
+                    outs.append(plan.execute(data))
+                    assert plan.stats['pipelined'] == bool(pipeline)
+                    assert plan.stats['n_batches'] == 3
+                assert np.allclose(outs[0], outs[1], rtol=0,
+                                   atol=1e-10 * np.abs(outs[0]).max())
+
+
+def test_last_batch():
+    # a smaller last batch (its own FFTW plans) gives the transforms done
+    # one at a time: types 1, 2, 3, adjoint and pipelined
+    rng = np.random.default_rng(22)
+    M, K, N = 200, 5, (24, 20)
+    x = rng.uniform(-np.pi, np.pi, (2, M))
+    st = rng.uniform(-30, 30, (2, 150))
+    c = rng.standard_normal((K, M)) + 1j * rng.standard_normal((K, M))
+    f = rng.standard_normal((K,) + N) + 1j * rng.standard_normal((K,) + N)
+    for tp, data in ((1, c), (2, f), (3, c)):
+        kw = dict(eps=1e-9, nthreads=1)
+        one = finufft.Plan(tp, N if tp < 3 else 2, **kw)
+        one.setpts(*x, *(() if tp < 3 else (None, *st)))
+        for mb, pipe in ((2, 0), (3, 0), (2, 1)):
+            plan = finufft.Plan(tp, N if tp < 3 else 2, n_trans=K, maxbatchsize=mb,
+                                pipeline=pipe, **dict(kw, nthreads=2 if pipe else 1))
+            plan.setpts(*x, *(() if tp < 3 else (None, *st)))
+            out = plan.execute(data)
+            for k in range(K):
+                ref = one.execute(data[k])
+                assert _relerr(out[k], ref) < 1e-10
+            if tp < 3:
+                adj = plan.execute_adjoint(f if tp == 1 else c)
+                for k in range(K):
+                    ref = one.execute_adjoint((f if tp == 1 else c)[k])
+                    assert _relerr(adj[k], ref) < 1e-10
+
+
+def test_fft_prune():
+    # pruned FFTs (skipping zero lines of the type 2 input, unkept lines of
+    # the type 1 output) give the full ones, incl. 1 mode in some dims
+    rng = np.random.default_rng(23)
+    M, K = 300, 3
+    for N in ((21, 16), (1, 9), (12, 9, 7), (1, 1, 5), (8, 1, 2)):
+        dim = len(N)
+        x = rng.uniform(-np.pi, np.pi, (dim, M))
+        c = rng.standard_normal((K, M)) + 1j * rng.standard_normal((K, M))
+        f = rng.standard_normal((K,) + N) + 1j * rng.standard_normal((K,) + N)
+        for tp, data in ((1, c), (2, f)):
+            for kw in (dict(modeord=1), dict(nthreads=2, pipeline=1)):
+                outs, adjs = [], []
+                for prune in (0, 1):
+                    plan = finufft.Plan(tp, N, n_trans=K, eps=1e-10,
+                                        maxbatchsize=2, fft_prune=prune,
+                                        **dict(dict(nthreads=1), **kw))
+                    plan.setpts(*x)
+                    outs.append(plan.execute(data))
+                    if 'pipeline' not in kw:
+                        adjs.append(plan.execute_adjoint(f if tp == 1 else c))
+                assert _relerr(outs[1], outs[0]) < 1e-13
+                if adjs:
+                    assert _relerr(adjs[1], adjs[0]) < 1e-13
+        st = rng.uniform(-20, 20, (dim, 100))
+        outs = []
+        for prune in (0, 1):
+            plan = finufft.Plan(3, dim, n_trans=K, eps=1e-10, fft_prune=prune,
+                                nthreads=1)
+            plan.setpts(*x, *([None] * (3 - dim)), *st)
+            outs.append(plan.execute(c))
+        assert _relerr(outs[1], outs[0]) < 1e-13
+
+
+def test_deconvolve_threads():
+    # the deconvolve is shared by the threads by x-lines (split in 1D): the
+    # same as with one thread, complex and real, both mode orderings (up to
+    # the rounding of FFTW's threads, ~1e-12 for the long 1D FFT)
+    rng = np.random.default_rng(24)
+    M = 200
+    for N in ((20001,), (64, 33), (20, 17, 12)):
+        dim = len(N)
+        x = rng.uniform(-np.pi, np.pi, (dim, M))
+        c = rng.standard_normal(M) + 1j * rng.standard_normal(M)
+        f = rng.standard_normal(N) + 1j * rng.standard_normal(N)
+        for real in (False, True):
+            for tp, data in ((1, c.real if real else c), (2, f)):
+                for modeord in (0, 1):
+                    outs = []
+                    for nthr in (1, 5):
+                        plan = finufft.Plan(tp, N, eps=1e-9, nthreads=nthr,
+                                            modeord=modeord, real=real)
+                        plan.setpts(*x)
+                        outs.append(plan.execute(data))
+                    assert _relerr(outs[1], outs[0]) < 1e-11
+
+
+if __name__ == '__main__':
+    import sys
+    fails = 0
+    for name, fun in sorted(globals().items()):
+        if name.startswith('test_') and callable(fun):
+            try:
+                fun()
+                print(name, 'passed')
+            except Exception as e:
+                fails += 1
+                print(name, 'FAILED:', repr(e))
+    sys.exit(fails)
@@ -13,7 +13,11 @@
 #include <math.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <vector>
+#include <map>
+#include <array>
+#include <thread>
 extern "C" {
   #include "../contrib/legendre_rule_fast.h"
 }
@@ -124,6 +128,7 @@ int setup_spreader_for_nufft(spread_opts &spopts, FLT eps, nufft_opts opts, int
     spopts.atomic_threshold = opts.spread_nthr_atomic;
   if (opts.spread_max_sp_size>0)      // overrides
     spopts.max_subproblem_size = opts.spread_max_sp_size;
+  spopts.partition = opts.spread_partition;
   return ier;
 } 
 
@@ -264,12 +269,37 @@ void onedim_nuft_kernel(BIGINT nk, FLT *k, FLT *phihat, spread_opts opts)
   }
 }  
 
-void deconvolveshuffle1d(int dir,FLT prefac,FLT* ker, BIGINT ms,
-			 FLT *fk, BIGINT nf1, FFTW_CPX* fw, int modeord)
+static bool gridfreq(BIGINT j, BIGINT n, BIGINT m, BIGINT* k)
+// Whether index j of a fine grid of size n, along a dim with m modes, holds
+// one of them, of frequency *k (so j=k if k>=0, else n+k), else zero padding.
+{
+  BIGINT kmin = -m/2, kmax = (m-1)/2;    // inclusive range of k indices
+  if (m==0) return false;
+  if (j<=kmax) { *k = j; return true; }
+  if (j>=n+kmin) { *k = j-n; return true; }
+  return false;
+}
+
+static BIGINT modefreq(BIGINT q, BIGINT m, int modeord)
+// Frequency of the q'th of m modes, in the mode ordering modeord.
+{
+  BIGINT kmin = -m/2, kmax = (m-1)/2;
+  if (modeord==1)
+    return q<=kmax ? q : q-m;
+  return q+kmin;
+}
+
+static void deconvolveshuffleline(int dir, FLT prefac, FLT* ker, BIGINT ms,
+                                  FLT *fk, BIGINT nf1, FFTW_CPX* fw,
+                                  int modeord, int realfk, BIGINT lo, BIGINT hi)
 /*
   if dir==1: copies fw to fk with amplification by prefac/ker
   if dir==2: copies fk to fw (and zero pads rest of it), same amplification.
 
+  Only part of this x-line is done, so that threads can share it: if dir==1
+  the modes lo<=q<hi, numbering them q=0,..,ms-1 in FFT order (the
+  nonnegative then the negative freqs), if dir==2 the entries lo<=j<hi of fw.
+
   modeord=0: use CMCL-compatible mode ordering in fk (from -N/2 up to N/2-1)
           1: use FFT-style (from 0 to N/2-1, then -N/2 up to -1).
 
@@ -277,94 +307,82 @@ void deconvolveshuffle1d(int dir,FLT prefac,FLT* ker, BIGINT ms,
   fw is a FFTW style complex array, ie FLT [nf1][2], essentially FLTs
        alternating re,im parts.
   ker is real-valued FLT array of length nf1/2+1.
+  realfk=1 (only for dir==2): fk is instead a size-ms real FLT array, read
+       as complex with zero imaginary parts.
 
-  Single thread only, but shouldn't matter since mostly data movement.
-
-  It has been tested that the repeated floating division in this inner loop
-  only contributes at the <3% level in 3D relative to the fftw cost (8 threads).
-  This could be removed by passing in an inverse kernel and doing mults.
-
-  todo: rewrite w/ C++-complex I/O, check complex divide not slower than
-        real divide, or is there a way to force a real divide?
+  Each loop runs over a range of plain FLT indices, and the re,im parts of an
+  entry share their factor, so the compiler vectorizes them.
 
   Barnett 1/25/17. Fixed ms=0 case 3/14/17. modeord flag & clean 10/25/17
 */
 {
   BIGINT kmin = -ms/2, kmax = (ms-1)/2;    // inclusive range of k indices
   if (ms==0) kmax=-1;           // fixes zero-pad for trivial no-mode case
-  // set up pp & pn as ptrs to start of pos(ie nonneg) & neg chunks of fk array
-  BIGINT pp = -2*kmin, pn = 0;       // CMCL mode-ordering case (2* since cmplx)
-  if (modeord==1) { pp = 0; pn = 2*(kmax+1); }   // or, instead, FFT ordering
-  if (dir==1) {    // read fw, write out to fk...
-    for (BIGINT k=0;k<=kmax;++k) {                    // non-neg freqs k
-      fk[pp++] = prefac * fw[k][0] / ker[k];          // re
-      fk[pp++] = prefac * fw[k][1] / ker[k];          // im
+  // pp & pn are the fk indices of freqs 0 and kmin...
+  BIGINT pp = -kmin, pn = 0;               // CMCL mode-ordering case
+  if (modeord==1) { pp = 0; pn = kmax+1; } // or, instead, FFT ordering
+  FLT *w = (FLT*)fw;
+  BIGINT a0, a1, b0, b1;    // fw indices of the nonneg & neg freqs to do
+  if (dir==1) {             // (from the range of modes q)
+    a0 = max(lo,(BIGINT)0); a1 = min(hi,kmax+1);
+    b0 = nf1-ms+max(lo,kmax+1); b1 = nf1-ms+min(hi,ms);
+  } else {
+    a0 = max(lo,(BIGINT)0); a1 = min(hi,kmax+1);
+    b0 = max(lo,nf1+kmin); b1 = min(hi,nf1);
+    BIGINT z0 = max(lo,kmax+1), z1 = min(hi,nf1+kmin);
+    for (BIGINT i=2*z0; i<2*z1; ++i)        // zero pad precisely where needed
+      w[i] = 0.0;
+  }
+  BIGINT g = pn - kmin - nf1;   // so the neg freq at fw index j is fk's g+j
+  if (realfk) {                      // read real fk (dir=2), 1 FLT per mode
+    FLT *f = fk + pp;
+    for (BIGINT j=a0;j<a1;++j) {                      // non-neg freqs k=j
+      w[2*j] = prefac * f[j] / ker[j];
+      w[2*j+1] = 0.0;
+    }
+    for (BIGINT j=b0;j<b1;++j) {                      // neg freqs k=j-nf1
+      w[2*j] = prefac * fk[g+j] / ker[nf1-j];
+      w[2*j+1] = 0.0;
     }
-    for (BIGINT k=kmin;k<0;++k) {                     // neg freqs k
-      fk[pn++] = prefac * fw[nf1+k][0] / ker[-k];     // re
-      fk[pn++] = prefac * fw[nf1+k][1] / ker[-k];     // im
+  } else if (dir==1) {    // read fw, write out to fk...
+    FLT *f = fk + 2*pp;
+    for (BIGINT j=a0;j<a1;++j) {                      // non-neg freqs k
+      f[2*j] = prefac * w[2*j] / ker[j];              // re
+      f[2*j+1] = prefac * w[2*j+1] / ker[j];          // im
     }
-  } else {    // read fk, write out to fw w/ zero padding...
-    for (BIGINT k=kmax+1; k<nf1+kmin; ++k) {  // zero pad precisely where needed
-      fw[k][0] = fw[k][1] = 0.0; }
-    for (BIGINT k=0;k<=kmax;++k) {                    // non-neg freqs k
-      fw[k][0] = prefac * fk[pp++] / ker[k];          // re
-      fw[k][1] = prefac * fk[pp++] / ker[k];          // im
+    for (BIGINT j=b0;j<b1;++j) {                      // neg freqs k
+      fk[2*(g+j)] = prefac * w[2*j] / ker[nf1-j];     // re
+      fk[2*(g+j)+1] = prefac * w[2*j+1] / ker[nf1-j]; // im
     }
-    for (BIGINT k=kmin;k<0;++k) {                     // neg freqs k
-      fw[nf1+k][0] = prefac * fk[pn++] / ker[-k];     // re
-      fw[nf1+k][1] = prefac * fk[pn++] / ker[-k];     // im
+  } else {    // read fk, write out to fw...
+    FLT *f = fk + 2*pp;
+    for (BIGINT j=a0;j<a1;++j) {                      // non-neg freqs k
+      w[2*j] = prefac * f[2*j] / ker[j];              // re
+      w[2*j+1] = prefac * f[2*j+1] / ker[j];          // im
+    }
+    for (BIGINT j=b0;j<b1;++j) {                      // neg freqs k
+      w[2*j] = prefac * fk[2*(g+j)] / ker[nf1-j];     // re
+      w[2*j+1] = prefac * fk[2*(g+j)+1] / ker[nf1-j]; // im
     }
   }
 }
 
-void deconvolveshuffle2d(int dir,FLT prefac,FLT *ker1, FLT *ker2,
-			 BIGINT ms, BIGINT mt,
-			 FLT *fk, BIGINT nf1, BIGINT nf2, FFTW_CPX* fw,
-			 int modeord)
+static void deconvolveshuffle(int dir, FLT prefac, FLT *ker1, FLT *ker2,
+                              FLT *ker3, BIGINT ms, BIGINT mt, BIGINT mu,
+                              FLT *fk, BIGINT nf1, BIGINT nf2, BIGINT nf3,
+                              FFTW_CPX* fw, int modeord, int realfk,
+                              BIGINT l2, BIGINT l3, BIGINT lo, BIGINT hi)
 /*
-  2D version of deconvolveshuffle1d, calls it on each x-line using 1/ker2 fac.
-
-  if dir==1: copies fw to fk with amplification by prefac/(ker1(k1)*ker2(k2)).
-  if dir==2: copies fk to fw (and zero pads rest of it), same amplification.
-
-  modeord=0: use CMCL-compatible mode ordering in fk (each dim increasing)
-          1: use FFT-style (pos then negative, on each dim)
+  Part lo..hi (see deconvolveshuffleline) of one x-line of the deconvolve and
+  shuffle between the modes fk and the fine grid fw, in any dim:
 
-  fk is complex array stored as 2*ms*mt FLTs alternating re,im parts, with
-    ms looped over fast and mt slow.
-  fw is a FFTW style complex array, ie FLT [nf1*nf2][2], essentially FLTs
-       alternating re,im parts; again nf1 is fast and nf2 slow.
-  ker1, ker2 are real-valued FLT arrays of lengths nf1/2+1, nf2/2+1
-       respectively.
+  if dir==1: copies fw to fk with ampl by prefac/(ker1(k1)*ker2(k2)*ker3(k3)),
+    for the x-line of fk of the l2'th y-mode and l3'th z-mode.
+  if dir==2: copies fk to fw (and zero pads rest of it), same amplification,
+    for the x-line (l2,l3) of fw.
 
-  Barnett 2/1/17, Fixed mt=0 case 3/14/17. modeord 10/25/17
-*/
-{
-  BIGINT k2min = -mt/2, k2max = (mt-1)/2;    // inclusive range of k2 indices
-  if (mt==0) k2max=-1;           // fixes zero-pad for trivial no-mode case
-  // set up pp & pn as ptrs to start of pos(ie nonneg) & neg chunks of fk array
-  BIGINT pp = -2*k2min*ms, pn = 0;   // CMCL mode-ordering case (2* since cmplx)
-  if (modeord==1) { pp = 0; pn = 2*(k2max+1)*ms; }  // or, instead, FFT ordering
-  if (dir==2)               // zero pad needed x-lines (contiguous in memory)
-    for (BIGINT j=nf1*(k2max+1); j<nf1*(nf2+k2min); ++j)  // sweeps all dims
-      fw[j][0] = fw[j][1] = 0.0;
-  for (BIGINT k2=0;k2<=k2max;++k2, pp+=2*ms)          // non-neg y-freqs
-    // point fk and fw to the start of this y value's row (2* is for complex):
-    deconvolveshuffle1d(dir,prefac/ker2[k2],ker1,ms,fk + pp,nf1,&fw[nf1*k2],modeord);
-  for (BIGINT k2=k2min;k2<0;++k2, pn+=2*ms)           // neg y-freqs
-    deconvolveshuffle1d(dir,prefac/ker2[-k2],ker1,ms,fk + pn,nf1,&fw[nf1*(nf2+k2)],modeord);
-}
-
-void deconvolveshuffle3d(int dir,FLT prefac,FLT *ker1, FLT *ker2,
-			 FLT *ker3, BIGINT ms, BIGINT mt, BIGINT mu,
-			 FLT *fk, BIGINT nf1, BIGINT nf2, BIGINT nf3,
-			 FFTW_CPX* fw, int modeord)
-/*
-  3D version of deconvolveshuffle2d, calls it on each xy-plane using 1/ker3 fac.
-
-  if dir==1: copies fw to fk with ampl by prefac/(ker1(k1)*ker2(k2)*ker3(k3)).
-  if dir==2: copies fk to fw (and zero pads rest of it), same amplification.
+  So doing all the x-lines, which may be done in parallel, does the whole
+  grid: mt*mu of them if dir==1, nf2*nf3 if dir==2.
 
   modeord=0: use CMCL-compatible mode ordering in fk (each dim increasing)
           1: use FFT-style (pos then negative, on each dim)
@@ -374,39 +392,148 @@ void deconvolveshuffle3d(int dir,FLT prefac,FLT *ker1, FLT *ker2,
   fw is a FFTW style complex array, ie FLT [nf1*nf2*nf3][2], effectively
        FLTs alternating re,im parts; again nf1 is fastest and nf3 slowest.
   ker1, ker2, ker3 are real-valued FLT arrays of lengths nf1/2+1, nf2/2+1,
-       and nf3/2+1 respectively.
+       and nf3/2+1 respectively; ker2, ker3 are NULL for unused dims (for
+       which mt or mu = 1, nf2 or nf3 = 1).
+  realfk=1 (only for dir==2): fk is a real FLT array of size ms*mt*mu.
 
   Barnett 2/1/17, Fixed mu=0 case 3/14/17. modeord 10/25/17
 */
 {
-  BIGINT k3min = -mu/2, k3max = (mu-1)/2;    // inclusive range of k3 indices
-  if (mu==0) k3max=-1;           // fixes zero-pad for trivial no-mode case
-  // set up pp & pn as ptrs to start of pos(ie nonneg) & neg chunks of fk array
-  BIGINT pp = -2*k3min*ms*mt, pn = 0; // CMCL mode-ordering (2* since cmplx)
-  if (modeord==1) { pp = 0; pn = 2*(k3max+1)*ms*mt; }  // or FFT ordering
-  BIGINT np = nf1*nf2;  // # pts in an upsampled Fourier xy-plane
-  if (dir==2)           // zero pad needed xy-planes (contiguous in memory)
-    for (BIGINT j=np*(k3max+1);j<np*(nf3+k3min);++j)  // sweeps all dims
-      fw[j][0] = fw[j][1] = 0.0;
-  for (BIGINT k3=0;k3<=k3max;++k3, pp+=2*ms*mt)      // non-neg z-freqs
-    // point fk and fw to the start of this z value's plane (2* is for complex):
-    deconvolveshuffle2d(dir,prefac/ker3[k3],ker1,ker2,ms,mt,
-			fk + pp,nf1,nf2,&fw[np*k3],modeord);
-  for (BIGINT k3=k3min;k3<0;++k3, pn+=2*ms*mt)       // neg z-freqs
-    deconvolveshuffle2d(dir,prefac/ker3[-k3],ker1,ker2,ms,mt,
-			fk + pn,nf1,nf2,&fw[np*(nf3+k3)],modeord);
+  BIGINT k2, k3, p2, p3, j2, j3;     // freqs, fk and fw indices of the x-line
+  if (dir==1) {
+    p2 = l2; p3 = l3;
+    k2 = modefreq(p2, mt, modeord); k3 = modefreq(p3, mu, modeord);
+    j2 = k2<0 ? nf2+k2 : k2; j3 = k3<0 ? nf3+k3 : k3;
+  } else {
+    j2 = l2; j3 = l3;
+    FFTW_CPX *w = fw + nf1*(j2 + nf2*j3);
+    if (!gridfreq(j2, nf2, mt, &k2) || !gridfreq(j3, nf3, mu, &k3)) {
+      for (BIGINT j=lo; j<hi; ++j)                 // zero padding x-line
+        w[j][0] = w[j][1] = 0.0;
+      return;
+    }
+    p2 = modeord==1 ? (k2<0 ? k2+mt : k2) : k2+mt/2;
+    p3 = modeord==1 ? (k3<0 ? k3+mu : k3) : k3+mu/2;
+  }
+  if (ker3) prefac /= ker3[k3<0 ? -k3 : k3];      // this x-line's factor
+  if (ker2) prefac /= ker2[k2<0 ? -k2 : k2];
+  int nc = realfk ? 1 : 2;       // # FLTs per entry of fk
+  deconvolveshuffleline(dir, prefac, ker1, ms, fk + nc*ms*(p2 + mt*p3), nf1,
+                        fw + nf1*(j2 + nf2*j3), modeord, realfk, lo, hi);
+}
+
+static void deconvolveshufflehalf(int dir, FLT prefac, FLT *ker1, FLT *ker2,
+                                  FLT *ker3, BIGINT ms, BIGINT mt, BIGINT mu,
+                                  FLT *fk, BIGINT nf1, BIGINT nf2, BIGINT nf3,
+                                  FFTW_CPX* fw, int modeord, int sign,
+                                  BIGINT l2, BIGINT l3, BIGINT lo, BIGINT hi)
+/*
+  Real-mode (Hermitian) version of deconvolveshuffle, for any dim, acting on
+  the half-spectrum fw of a real fine grid, as used by FFTW's r2c and c2r
+  transforms: fw is (nf1/2+1)*nf2*nf3 complex, holding the frequencies
+  0<=k1<=nf1/2 only (the others given by conjugate symmetry).
+
+  if dir==1: fills the modes lo<=q<hi (numbered in FFT order, see
+    deconvolveshuffleline) of the x-line of complex fk of the l2'th y-mode and
+    l3'th z-mode, from fw = r2c FFT of a real grid, using F(-k) = conj(F(k)),
+    with amplification by prefac/(ker1*ker2*ker3). FFTW's r2c has sign -1;
+    for sign>0 its conjugate is used.
+  if dir==2: writes to the entries lo<=j<hi of the x-line (l2,l3) of fw (or
+    zeroes them) the half-spectrum of the Hermitian part (F(k)+conj(F(-k)))/2
+    of the amplified fk (conjugated if sign<0), so that FFTW's c2r (sign +1)
+    gives the real part of the complex transform. Each entry gathers F(k) and
+    F(-k), so the x-lines may be done in parallel.
+
+  Other arguments and fk ordering are as in deconvolveshuffle.
+*/
+{
+  BIGINT nh1 = nf1/2+1;                      // # x-freqs in the half-spectrum
+  BIGINT k1min = -ms/2, k1max = (ms-1)/2;    // inclusive range of k1 indices
+  if (dir==1) {
+    BIGINT k2 = modefreq(l2, mt, modeord), k3 = modefreq(l3, mu, modeord);
+    FLT a3 = prefac / (ker3 ? ker3[k3<0 ? -k3 : k3] : (FLT)1.0);
+    FLT a23 = a3 / (ker2 ? ker2[k2<0 ? -k2 : k2] : (FLT)1.0);
+    BIGINT j2 = k2<0 ? nf2+k2 : k2, jm2 = k2>0 ? nf2-k2 : -k2;  // fw of k2,-k2
+    BIGINT j3 = k3<0 ? nf3+k3 : k3, jm3 = k3>0 ? nf3-k3 : -k3;
+    FLT *f = fk + 2*ms*(l2 + mt*l3);       // this x-line of fk
+    FFTW_CPX *w = fw + nh1*(j2 + nf2*j3);  // x-line of (k2,k3) in fw
+    FFTW_CPX *wm = fw + nh1*(jm2 + nf2*jm3);  // x-line of (-k2,-k3)
+    for (BIGINT q=lo;q<hi;++q) {
+      BIGINT k1 = q<=k1max ? q : q-ms;
+      FLT a = a23 / ker1[k1<0 ? -k1 : k1];
+      BIGINT p1 = (modeord==1) ? q : k1-k1min;
+      FLT re, im;           // F(k) is R(k) if k1>=0, else conj(R(-k))
+      if (k1>=0) { re = w[k1][0]; im = w[k1][1]; }
+      else { re = wm[-k1][0]; im = -wm[-k1][1]; }
+      if (sign>0) im = -im;
+      f[2*p1] = a*re;
+      f[2*p1+1] = a*im;
+    }
+    return;
+  }
+  FFTW_CPX *w = fw + nh1*(l2 + nf2*l3);     // this x-line of fw
+  for (BIGINT j=lo;j<hi;++j)
+    w[j][0] = w[j][1] = 0.0;
+  for (int neg=0; neg<2; ++neg) {  // add half of (conj) f(k), k1>=0, of the
+    // modes of this line, then conj of those of (-k2,-k3), k1<=0, at -k1...
+    BIGINT k2, k3;
+    if (!gridfreq(neg ? (nf2-l2)%nf2 : l2, nf2, mt, &k2) ||
+        !gridfreq(neg ? (nf3-l3)%nf3 : l3, nf3, mu, &k3))
+      continue;                    // (no such modes)
+    FLT a3 = prefac / (ker3 ? ker3[k3<0 ? -k3 : k3] : (FLT)1.0);
+    FLT a23 = a3 / (ker2 ? ker2[k2<0 ? -k2 : k2] : (FLT)1.0);
+    BIGINT p2 = (modeord==1) ? (k2<0 ? k2+mt : k2) : k2+mt/2;
+    BIGINT p3 = (modeord==1) ? (k3<0 ? k3+mu : k3) : k3+mu/2;
+    FLT *f = fk + 2*ms*(p2 + mt*p3);       // its x-line of fk
+    BIGINT j0 = max(lo,(BIGINT)0), j1 = min(hi, (neg ? -k1min : k1max)+1);
+    for (BIGINT j=j0;j<j1;++j) {
+      BIGINT k1 = neg ? -j : j;
+      FLT a = a23 / ker1[j];
+      BIGINT p1 = (modeord==1) ? (k1<0 ? k1+ms : k1) : k1-k1min;
+      FLT re = (FLT)0.5*a*f[2*p1], im = (FLT)0.5*a*f[2*p1+1];
+      if (sign<0) im = -im;
+      w[j][0] += re;
+      w[j][1] += neg ? -im : im;
+    }
+  }
+}
+
+static void repackrealgrid(FLT *fw, BIGINT nf1, BIGINT nrows, int topad)
+/* Moves the nrows x-lines (of nf1 reals each) of a real fine grid between
+   the contiguous layout used by the spreader (topad=0) and the padded layout
+   of FFTW's in-place r2c/c2r transforms, with 2*(nf1/2+1) reals per x-line
+   (topad=1), in place.
+*/
+{
+  BIGINT ld = 2*(nf1/2+1);
+  if (topad)
+    for (BIGINT r=nrows-1;r>0;--r)      // backwards, since lines move up
+      memmove(fw + r*ld, fw + r*nf1, sizeof(FLT)*nf1);
+  else
+    for (BIGINT r=1;r<nrows;++r)
+      memmove(fw + r*nf1, fw + r*ld, sizeof(FLT)*nf1);
 }
 
 
 // --------- batch helper functions for t1,2 exec: ---------------------------
 
-int spreadinterpSortedBatch(int batchSize, FINUFFT_PLAN p, CPX* cBatch)
+int spreadinterpSortedBatch(int batchSize, FINUFFT_PLAN p, FFTW_CPX* fwBatch,
+                            CPX* cBatch, int realdata, int nthr)
 /*
   Spreads (or interpolates) a batch of batchSize strength vectors in cBatch
-  to (or from) the batch of fine working grids p->fwBatch, using the same set of
+  to (or from) the batch of fine working grids fwBatch (p->fwBatch, or if
+  pipelined p->fwBatch2), using the same set of
   (index-sorted) NU points p->X,Y,Z for each vector in the batch.
+  Uses at most nthr threads, or if nthr=0 those of the plan.
   The direction (spread vs interpolate) is set by p->spopts.spread_direction.
-  Returns 0 (no error reporting for now).
+  If realdata=1, cBatch in fact holds real FLTs: strengths to spread, or in
+  real mode (p->opts.realmode) also interpolated values, from real grids.
+  Spreading uses (and grows) the plan's per-thread scratch p->spreadScratch,
+  if set up by setpts (see reserve_spread_scratch), and both directions read
+  the kernel values from p->kerTab if setpts stored them (see kernel_table).
+  Interpolation is instead a sparse product with the interpolation matrix if
+  setpts stored it (see interp_matrix).
+  Returns 0, or ERR_SPREAD_ALLOC if spreading failed to get its workspace.
   Notes:
   1) cBatch is already assumed to have the correct offset, ie here we
      read from the start of cBatch (unlike Malleo). fwBatch also has zero offset
@@ -418,87 +545,103 @@ int spreadinterpSortedBatch(int batchSize, FINUFFT_PLAN p, CPX* cBatch)
   // omp_sets_nested deprecated, so don't use; assume not nested for 2 to work.
   // But when nthr_outer=1 here, omp par inside the loop sees all threads...
   int nthr_outer = p->opts.spread_thread==1 ? 1 : batchSize;
+  spread_opts spopts = p->spopts;
+  if (nthr>0) {
+    nthr_outer = min(nthr_outer, nthr);
+    spopts.nthreads = nthr;
+  }
+  spopts.realdata = realdata;
+  spopts.realgrid = p->opts.realmode;
+  spopts.presorted = (p->Xs!=NULL);   // use the folded sorted coords
+  FLT *X = p->Xs ? p->Xs : p->X, *Y = p->Xs ? p->Ys : p->Y;
+  FLT *Z = p->Xs ? p->Zs : p->Z;
+  int dir = spopts.spread_direction;
+  int ier = 0;
   
 #pragma omp parallel for num_threads(nthr_outer)
   for (int i=0; i<batchSize; i++) {
-    FFTW_CPX *fwi = p->fwBatch + i*p->nf;  // start of i'th fw array in wkspace
-    CPX *ci = cBatch + i*p->nj;            // start of i'th c array in cBatch
-    spreadinterpSorted(p->sortIndices, p->nf1, p->nf2, p->nf3, (FLT*)fwi, p->nj,
-                       p->X, p->Y, p->Z, (FLT*)ci, p->spopts, p->didSort);
+    FFTW_CPX *fwi = fwBatch + i*p->nfw;    // start of i'th fw array in wkspace
+    // start of i'th c array in cBatch...
+    FLT *ci = realdata ? (FLT*)cBatch + i*p->nj : (FLT*)(cBatch + i*p->nj);
+    int t = MY_OMP_GET_THREAD_NUM();    // this batch thread's scratch, if any
+    thread_arenas* sc = (t<p->nSpreadScratch) ? p->spreadScratch + t : NULL;
+    if (spopts.realgrid && dir==2)      // c2r output to contiguous real grid
+      repackrealgrid((FLT*)fwi, p->nf1, p->nf2*p->nf3, 0);
+    int ieri = 0;
+    if (dir==2 && p->interpCols)        // sparse product with stored matrix
+      interpCSR(p->sortIndices, p->nf1, p->nf2, p->nf3, (FLT*)fwi, p->nj,
+                p->interpCols, p->interpVals, ci, spopts);
+    else
+      ieri = spreadinterpSorted(p->sortIndices, p->nf1, p->nf2, p->nf3,
+                                (FLT*)fwi, p->nj, X, Y, Z, ci,
+                                spopts, p->didSort, sc, p->kerTab);
+    if (ieri) {
+#pragma omp atomic write
+      ier = ieri;
+    }
+    if (spopts.realgrid && dir==1)      // real grid to padded r2c input
+      repackrealgrid((FLT*)fwi, p->nf1, p->nf2*p->nf3, 1);
   }
-  return 0;
+  return ier;
 }
 
-int deconvolveBatch(int batchSize, FINUFFT_PLAN p, CPX* fkBatch)
+int deconvolveBatch(int batchSize, FINUFFT_PLAN p, FFTW_CPX* fwBatch,
+                    CPX* fkBatch, int realfk, int nthr)
 /*
-  Type 1: deconvolves (amplifies) from each interior fw array in p->fwBatch
-  into each output array fk in fkBatch.
+  Type 1: deconvolves (amplifies) from each interior fw array in fwBatch
+  (p->fwBatch, or if pipelined p->fwBatch2) into each output array fk in
+  fkBatch.
   Type 2: deconvolves from user-supplied input fk to 0-padded interior fw,
-  again looping over fk in fkBatch and fw in p->fwBatch.
+  again looping over fk in fkBatch and fw in fwBatch. If realfk=1, fkBatch
+  in fact holds real FLT coefficients. Uses at most nthr threads, or if
+  nthr=0 those of the plan.
+  In real mode (p->opts.realmode) each fw is a half-spectrum (see
+  deconvolveshufflehalf).
   The direction (spread vs interpolate) is set by p->spopts.spread_direction.
-  This is mostly a loop calling deconvolveshuffle?d for the needed dim batchSize
-  times.
+  The threads share the x-lines of all the fw (or fk) arrays, each a
+  contiguous range of them, so a single large transform is done in parallel
+  too. If there are fewer x-lines than threads (eg 1D) they are split.
   Barnett 5/21/20, simplified from Malleo 2019 (eg t3 logic won't be in here)
 */
 {
-  // since deconvolveshuffle?d are single-thread, omp par seems to help here...
-#pragma omp parallel for num_threads(batchSize)
-  for (int i=0; i<batchSize; i++) {
-    FFTW_CPX *fwi = p->fwBatch + i*p->nf;  // start of i'th fw array in wkspace
-    CPX *fki = fkBatch + i*p->N;           // start of i'th fk array in fkBatch
+  int dir = p->spopts.spread_direction;
+  int realmode = p->opts.realmode;
+  // the x-lines: for dir=1 the mt*mu of modes of each fk, for dir=2 all
+  // the nf2*nf3 of each fw, to fill or zero; and their length (see
+  // deconvolveshuffleline)...
+  BIGINT nl2 = dir==1 ? p->mt : p->nf2, nl3 = dir==1 ? p->mu : p->nf3;
+  BIGINT nl = nl2*nl3, nlines = batchSize*nl;
+  BIGINT len = dir==1 ? p->ms : (realmode ? p->nf1/2+1 : p->nf1);
+  if (nlines==0)                           // (no modes in some dim)
+    return 0;
+  int nt = nthr>0 ? nthr : p->opts.nthreads;
+  nt = (int)min((BIGINT)nt, 1 + 2*nlines*len/4096);  // as zeroGrid
+  BIGINT nsplit = 1 + (nt-1)/nlines;       // pieces of each x-line
+#pragma omp parallel for num_threads(nt) schedule(static)
+  for (BIGINT t=0; t<nlines*nsplit; t++) {
+    BIGINT l = t/nsplit, s = t%nsplit;     // x-line l, its piece s
+    BIGINT lo = len*s/nsplit, hi = len*(s+1)/nsplit;
+    BIGINT i = l/nl, l2 = (l%nl)%nl2, l3 = (l%nl)/nl2;
+    FFTW_CPX *fwi = fwBatch + i*p->nfw;    // start of i'th fw array in wkspace
+    // start of i'th fk array in fkBatch...
+    FLT *fki = realfk ? (FLT*)fkBatch + i*p->N : (FLT*)(fkBatch + i*p->N);
     
-    // Call routine from common.cpp for the dim; prefactors hardcoded to 1.0...
-    if (p->dim == 1)
-      deconvolveshuffle1d(p->spopts.spread_direction, 1.0, p->phiHat1,
-                          p->ms, (FLT *)fki,
-                          p->nf1, fwi, p->opts.modeord);
-    else if (p->dim == 2)
-      deconvolveshuffle2d(p->spopts.spread_direction,1.0, p->phiHat1,
-                          p->phiHat2, p->ms, p->mt, (FLT *)fki,
-                          p->nf1, p->nf2, fwi, p->opts.modeord);
+    // prefactors hardcoded to 1.0...
+    if (realmode)
+      deconvolveshufflehalf(dir, 1.0, p->phiHat1, p->phiHat2, p->phiHat3,
+                            p->ms, p->mt, p->mu, fki, p->nf1, p->nf2, p->nf3,
+                            fwi, p->opts.modeord, p->fftSign, l2, l3, lo, hi);
     else
-      deconvolveshuffle3d(p->spopts.spread_direction, 1.0, p->phiHat1,
-                          p->phiHat2, p->phiHat3, p->ms, p->mt, p->mu,
-                          (FLT *)fki, p->nf1, p->nf2, p->nf3,
-                          fwi, p->opts.modeord);
+      deconvolveshuffle(dir, 1.0, p->phiHat1, p->phiHat2, p->phiHat3,
+                        p->ms, p->mt, p->mu, fki, p->nf1, p->nf2, p->nf3,
+                        fwi, p->opts.modeord, realfk, l2, l3, lo, hi);
   }
   return 0;
 }
 
 
-// since this func is local only, we macro its name here...
-#ifdef SINGLE
-#define GRIDSIZE_FOR_FFTW gridsize_for_fftwf
-#else
-#define GRIDSIZE_FOR_FFTW gridsize_for_fftw
-#endif
-
-int* GRIDSIZE_FOR_FFTW(FINUFFT_PLAN p){
-// local helper func returns a new int array of length dim, extracted from
-// the finufft plan, that fftw_plan_many_dft needs as its 2nd argument.
-  int* nf;
-  if(p->dim == 1){ 
-    nf = new int[1];
-    nf[0] = (int)p->nf1;
-  }
-  else if (p->dim == 2){ 
-    nf = new int[2];
-    nf[0] = (int)p->nf2;
-    nf[1] = (int)p->nf1; 
-  }   // fftw enforced row major ordering, ie dims are backwards ordered
-  else{ 
-    nf = new int[3];
-    nf[0] = (int)p->nf3;
-    nf[1] = (int)p->nf2;
-    nf[2] = (int)p->nf1;
-  }
-  return nf;
-}
-
-
-
-
 // --------------- rest is the 5 user guru (plan) interface drivers: -----------
+// (followed by FFTW wisdom import/export utilities)
 
 
 
@@ -528,10 +671,506 @@ void FINUFFT_DEFAULT_OPTS(nufft_opts *o)
   o->maxbatchsize = 0;
   o->spread_nthr_atomic = -1;
   o->spread_max_sp_size = 0;
+  o->realmode = 0;
+  o->spread_precompute_coords = 0;
+  o->spread_kernel_table_mb = 0;
+  o->spread_interp_matrix_mb = 0;
+  o->spread_partition = 0;
+  o->spread_bin_tune = 0;
+  o->pipeline = 0;
+  o->fft_prune = 0;
   // sphinx tag (don't remove): @defopts_end
 }
 
 
+static BIGINT interp_nnzrow(FINUFFT_PLAN p)
+// Nonzeros per row (NU pt) of the interpolation matrix, ie nspread^dim.
+{
+  BIGINT n = 1;
+  for (int d=0; d<p->dim; ++d)
+    n *= p->spopts.nspread;
+  return n;
+}
+
+static long long plan_bytes(FINUFFT_PLAN p)
+// Bytes of the working arrays currently held by plan p (for its stats).
+{
+  long long b = 0;
+  if (p->fwBatch)
+    b += sizeof(FFTW_CPX)*p->nfw*p->batchSize;
+  if (p->fwBatch2)       // (pipelined)
+    b += sizeof(FFTW_CPX)*p->nfw*p->batchSize;
+  if (p->sortIndices)
+    b += sizeof(BIGINT)*p->nj;
+  if (p->sortPos)        // updatepts state (bin starts ignored, fewer)
+    b += sizeof(BIGINT)*p->nj;
+  if (p->Xs)             // folded sorted coords
+    b += sizeof(FLT)*p->dim*(((BIGINT)p->nj+15) & ~(BIGINT)15);
+  if (p->kerTab)         // kernel values table
+    b += sizeof(FLT)*p->dim*p->spopts.nspread*(BIGINT)p->nj;
+  if (p->interpCols)     // interpolation matrix
+    b += (sizeof(BIGINT)+sizeof(FLT))*interp_nnzrow(p)*p->nj;
+  for (int k=0; k<p->nSpreadScratch; ++k)
+    b += arenas_bytes(p->spreadScratch + k);
+  if (p->type!=3)        // kernel Fourier series
+    b += sizeof(FLT)*(p->nf1/2+1 + (p->dim>1 ? p->nf2/2+1 : 0) +
+                      (p->dim>2 ? p->nf3/2+1 : 0));
+  else if (p->CpBatch) { // t3 after setpts: CpBatch, X', prephase, S', deconv
+    b += (sizeof(CPX)*(p->batchSize+1) + sizeof(FLT)*p->dim)*p->nj;
+    b += (sizeof(CPX) + sizeof(FLT)*p->dim)*p->nk;
+    if (p->innerT2plan)
+      b += p->innerT2plan->stats.bytes;
+  }
+  return b;
+}
+
+static int reserve_spread_scratch(FINUFFT_PLAN p)
+/* Sets up p->spreadScratch, the per-thread workspace reused by the spreader
+   (spreadSorted) over all batches and executes, so that these do no heap
+   allocation once it is big enough: one thread_arenas for all threads, or one
+   per batch thread if opts.spread_thread=2 (where each batch is spread by one
+   thread). If p spreads (type 1 or 3; type 2 only does for the adjoint, then
+   growing it lazily), also grows each thread's slot for its subproblem's
+   copy of the NU pts to suit the current M (layout as in spreadSorted),
+   touched by the thread (with its usual OMP thread number) that will use it.
+   The subgrid slots grow on the first spread. Returns 0 or ERR_ALLOC.
+*/
+{
+  int nthr = MY_OMP_GET_MAX_THREADS();        // as spreadSorted chooses
+  if (p->spopts.nthreads>0)
+    nthr = min(nthr,p->spopts.nthreads);
+  int nouter = (p->opts.spread_thread==1) ? 1 : p->batchSize;
+  if (!p->spreadScratch) {
+    p->spreadScratch = (thread_arenas*)malloc(sizeof(thread_arenas)*nouter);
+    if (!p->spreadScratch)
+      return ERR_ALLOC;
+    for (int k=0; k<nouter; ++k)
+      arenas_init(p->spreadScratch + k);
+    p->nSpreadScratch = nouter;
+  }
+  for (int k=0; k<nouter; ++k)
+    if (arenas_resize(p->spreadScratch + k, 2*nthr))
+      return ERR_ALLOC;
+  if (p->type==2 || p->nj==0)
+    return 0;
+  // upper bound on subproblem size M0 (see spreadSorted)...
+  BIGINT M0 = 1 + (p->nj-1)/nthr;           // split one subprob per thr...
+  if (M0 > (BIGINT)p->spopts.max_subproblem_size)   // ...or capped size
+    M0 = p->spopts.max_subproblem_size;
+  M0 += 1;                                  // (rounding of breakpoints)
+  if (!p->didSort && nthr==1)
+    M0 = p->nj;
+  BIGINT M0a = (M0 + 15) & ~(BIGINT)15;
+  int nc = p->opts.realmode ? 1 : 2;
+  int ncopy = p->Xs ? 0 : p->dim;           // coords copied per subprob
+  size_t bytes = sizeof(FLT)*M0a*(ncopy + nc);
+  int fail = 0;
+  int nper = (nouter==1) ? nthr : 1;          // threads spreading with a set
+#pragma omp parallel num_threads(nouter*nper)
+  {
+    int t = MY_OMP_GET_THREAD_NUM();
+    thread_arenas* a = p->spreadScratch + ((nouter==1) ? 0 : t);
+    char* b = (char*)arena_get(a, (nouter==1) ? 2*t : 0, bytes);
+    if (b)
+      memset(b, 0, bytes);                    // first touch
+    else {
+#pragma omp atomic write
+      fail = 1;
+    }
+  }
+  return fail ? ERR_ALLOC : 0;
+}
+
+static int fold_coords(FINUFFT_PLAN p)
+/* If opts.spread_precompute_coords, (re)allocates p->Xs,Ys,Zs and fills them
+   with the NU pts p->X,Y,Z folded and rescaled as the spreader needs, in the
+   order of p->sortIndices (see foldCoords), for spreadinterpSortedBatch to use
+   with spopts.presorted. Called by setpts after sorting. Returns 0 or ERR_ALLOC.
+*/
+{
+  if (p->Xs) FFTW_FR(p->Xs);
+  p->Xs = p->Ys = p->Zs = NULL;
+  if (!p->opts.spread_precompute_coords || p->nj==0)
+    return 0;
+  BIGINT Ma = ((BIGINT)p->nj + 15) & ~(BIGINT)15;   // keep each 64-byte aligned
+  p->Xs = (FLT*)FFTW_ALLOC_RE(p->dim*Ma);
+  if (!p->Xs)
+    return ERR_ALLOC;
+  if (p->dim>1) p->Ys = p->Xs + Ma;
+  if (p->dim>2) p->Zs = p->Xs + 2*Ma;
+  foldCoords(p->Xs, p->Ys, p->Zs, NULL, p->sortIndices, p->nj, p->nf1, p->nf2,
+             p->nf3, p->X, p->Y, p->Z, p->spopts);
+  return 0;
+}
+
+static int kernel_table(FINUFFT_PLAN p)
+/* If opts.spread_kernel_table_mb>0, and the table fits in that many MB,
+   (re)allocates p->kerTab and fills it with the spreading kernel values of the
+   NU pts p->X,Y,Z in the order of p->sortIndices (see kernelTable), which
+   spreadinterpSortedBatch then uses instead of evaluating the kernel. Else
+   leaves it NULL. Called by setpts after sorting. Returns 0 or ERR_ALLOC.
+*/
+{
+  if (p->kerTab) FFTW_FR(p->kerTab);
+  p->kerTab = NULL;
+  if (p->opts.spread_kernel_table_mb<=0 || p->nj==0)
+    return 0;
+  BIGINT nrow = (BIGINT)p->dim*p->spopts.nspread;     // FLTs per NU pt
+  double mb = (double)sizeof(FLT)*nrow*p->nj / (1<<20);
+  if (mb > p->opts.spread_kernel_table_mb) {
+    if (p->opts.debug) printf("[%s] kernel table (%.3g MB) over cap, not used\n", __func__, mb);
+    return 0;
+  }
+  p->kerTab = (FLT*)FFTW_ALLOC_RE(nrow*p->nj);
+  if (!p->kerTab)
+    return ERR_ALLOC;
+  kernelTable(p->kerTab, NULL, p->sortIndices, p->nj, p->nf1, p->nf2, p->nf3,
+              p->X, p->Y, p->Z, p->spopts);
+  return 0;
+}
+
+static int interp_matrix(FINUFFT_PLAN p)
+/* For types 1,2, if opts.spread_interp_matrix_mb>0, and the interpolation
+   matrix of the NU pts p->X,Y,Z fits in that many MB, (re)allocates
+   p->interpCols,interpVals and fills them with it, rows in the order of
+   p->sortIndices (see interpMatrix), which spreadinterpSortedBatch then uses
+   to interpolate (spreading is unchanged). Else leaves them NULL. Called by
+   setpts after sorting. Returns 0 or ERR_ALLOC.
+*/
+{
+  free(p->interpCols);
+  if (p->interpVals) FFTW_FR(p->interpVals);
+  p->interpCols = NULL; p->interpVals = NULL;
+  if (p->type==3 || p->opts.spread_interp_matrix_mb<=0 || p->nj==0)
+    return 0;
+  BIGINT nnz = interp_nnzrow(p)*p->nj;
+  double mb = (double)(sizeof(BIGINT)+sizeof(FLT))*nnz / (1<<20);
+  if (mb > p->opts.spread_interp_matrix_mb) {
+    if (p->opts.debug) printf("[%s] interp matrix (%.3g MB) over cap, not used\n", __func__, mb);
+    return 0;
+  }
+  p->interpCols = (BIGINT*)malloc(sizeof(BIGINT)*nnz);
+  p->interpVals = (FLT*)FFTW_ALLOC_RE(nnz);
+  if (!p->interpCols || !p->interpVals)
+    return ERR_ALLOC;
+  interpMatrix(p->interpCols, p->interpVals, NULL, p->sortIndices, p->nj,
+               p->nf1, p->nf2, p->nf3, p->X, p->Y, p->Z, p->spopts);
+  return 0;
+}
+
+// Bin sort tuning (opts.spread_bin_tune). The timed choices (=2) are kept for
+// the rest of the process in a table, keyed by fine grid size, number of NU
+// pts rounded down to a power of 2, kernel width, threads and spread
+// direction, which finufft_export_tuning and finufft_import_tuning write and
+// read. As with FFTW wisdom there is one table per precision.
+struct bin_tuning {
+  double bx, by, bz;          // bin sizes (spread_opts.bin_size_*)
+  int sort_nthr;              // threads for the sort (spread_opts.sort_threads,
+                              // so 0 is the sort's own choice)
+};
+typedef std::array<long long,7> bin_tuning_key;
+static std::map<bin_tuning_key, bin_tuning> tuned_bins;  // see tuning lock
+
+static bin_tuning heuristic_bins(FINUFFT_PLAN p)
+// Bin sizes for p's fine grid and p->nj NU pts, without
+// timing anything. The pts of a bin are visited in random order, each
+// touching a box of w^dim grid pts, so in 1D and 2D the largest bins (doubling
+// the default in x in 1D, up to 64 times, or y in 2D, up to 4 times) are
+// taken whose box padded by w fits in half the L1 cache, which lowers both
+// the reloads of grid data shared by neighboring bins, and the size of the
+// sort's bin counts. In 3D larger bins were measured to be slower, so the
+// defaults are only shrunk (in x) if their padded box overflows half the L2
+// cache. The sort threads are left to the sort's cost model (indexSort).
+{
+  BIGINT l1, l2;
+  get_cache_sizes(&l1, &l2);
+  int ns = p->spopts.nspread;
+  double g = (p->opts.realmode ? 1 : 2)*sizeof(FLT);     // bytes per grid pt
+  bin_tuning b = {p->spopts.bin_size_x, p->spopts.bin_size_y,
+                  p->spopts.bin_size_z, 0};
+  if (p->dim==1) {
+    while (b.bx<64*p->spopts.bin_size_x && (2*b.bx+ns)*g <= l1/2)
+      b.bx *= 2;
+  } else if (p->dim==2) {
+    while (b.by<4*p->spopts.bin_size_y && (b.bx+ns)*(2*b.by+ns)*g <= l1/2)
+      b.by *= 2;
+  } else {            // taller bins make the subproblems' subgrids thicker,
+    while (b.bx>4 && (b.bx+ns)*(b.by+ns)*(b.bz+ns)*g > l2/2)  // so only shrink
+      b.bx /= 2;
+  }
+  return b;
+}
+
+static double time_bins(FINUFFT_PLAN p, const bin_tuning& b, FLT* xj,
+                        FLT* yj, FLT* zj, FLT* c, int dir, int spread)
+// Time (best of three) of the sort of the NU pts xj,yj,zj with bins b, and if
+// spread=1 of a spread (dir=1) or interpolation (dir=2) of c using it, with
+// p->fwBatch as the grid.
+{
+  spread_opts spopts = p->spopts;
+  spopts.bin_size_x = b.bx; spopts.bin_size_y = b.by; spopts.bin_size_z = b.bz;
+  spopts.sort_threads = b.sort_nthr;
+  spopts.spread_direction = dir;
+  spopts.realdata = spopts.realgrid = p->opts.realmode;
+  spopts.presorted = 0;
+  spopts.debug = 0;
+  double best = INFINITY;
+  for (int rep=0; rep<3; rep++) {
+    CNTime timer; timer.start();
+    int did_sort = indexSort(p->sortIndices, p->nf1, p->nf2, p->nf3, p->nj,
+                             xj, yj, zj, spopts);
+    if (spread)
+      spreadinterpSorted(p->sortIndices, p->nf1, p->nf2, p->nf3,
+                         (FLT*)p->fwBatch, p->nj, xj, yj, zj, c, spopts,
+                         did_sort, NULL, NULL);
+    best = min(best, timer.elapsedsec());
+  }
+  return best;
+}
+
+static int tune_bins(FINUFFT_PLAN p, FLT* xj, FLT* yj, FLT* zj)
+/* Sets the sort bin sizes and threads in p->spopts, before the sort of the
+   (bounds-checked) NU pts xj,yj,zj in setpts, according to
+   opts.spread_bin_tune: 0 keeps the defaults, 1 uses heuristic_bins, 2 looks
+   up the table of timed choices, or if not there times a few bin sizes around
+   the heuristic one (and the defaults), each by a sort and a spread (or
+   interpolation, for type 2) into p->fwBatch, then the sort with 1, all, and
+   its own choice of threads, and stores the fastest in the table.
+   The one-off cost of this is up to 24 sorts and 18 spreads.
+   Returns 0, or ERR_ALLOC.
+*/
+{
+  if (p->opts.spread_bin_tune<=0 || p->spopts.sort==0 || p->nj==0)
+    return 0;
+  int maxnthr = p->opts.nthreads;
+  bin_tuning h = heuristic_bins(p), b = h;
+  const char* how = "heuristic";
+  if (p->opts.spread_bin_tune>=2) {
+    int dir = (p->type==2) ? 2 : 1;
+    bin_tuning_key key = {(long long)p->nf1, (long long)p->nf2,
+                          (long long)p->nf3, (long long)floor(log2((double)p->nj)),
+                          p->spopts.nspread, maxnthr, dir};
+    bool found;
+#pragma omp critical (finufft_tuning)
+    {
+      std::map<bin_tuning_key, bin_tuning>::iterator it = tuned_bins.find(key);
+      found = (it!=tuned_bins.end());
+      if (found) b = it->second;
+    }
+    how = "stored";
+    if (!found) {
+      CPX* c = (CPX*)calloc(p->nj, sizeof(CPX));    // strengths: any will do
+      if (!c)
+        return ERR_ALLOC;
+      if (dir==2)                   // a zero grid to interpolate from
+        memset(p->fwBatch, 0, sizeof(FLT)*(p->opts.realmode ? 1 : 2)*p->nf);
+      bin_tuning d = {p->spopts.bin_size_x, p->spopts.bin_size_y,
+                      p->spopts.bin_size_z, h.sort_nthr};
+      std::vector<bin_tuning> cand(1, h);           // candidates: h first...
+      cand.push_back(d);
+      bin_tuning v = h; v.bx = 2*h.bx; cand.push_back(v);
+      if (h.bx>=2) { v = h; v.bx = h.bx/2; cand.push_back(v); }
+      if (p->dim>1) {
+        v = h; v.by *= 2; if (p->dim>2) v.bz *= 2;
+        cand.push_back(v);
+        if (h.by>=2) {
+          v = h; v.by /= 2; if (p->dim>2) v.bz /= 2;
+          cand.push_back(v);
+        }
+      }
+      double tbest = INFINITY;
+      for (size_t k=0; k<cand.size(); ++k) {
+        if (k>0 && cand[k].bx==h.bx && cand[k].by==h.by && cand[k].bz==h.bz)
+          continue;                                 // (defaults may equal h)
+        double t = time_bins(p, cand[k], xj, yj, zj, (FLT*)c, dir, 1);
+        if (p->opts.debug>1)
+          printf("[%s] bins %gx%gx%g:\t%.3g s\n", __func__, cand[k].bx,
+                 cand[k].by, cand[k].bz, t);
+        if (t<tbest) { tbest = t; b = cand[k]; }
+      }
+      free(c);
+      int nthrs[3] = {0, 1, maxnthr};               // 0: the sort's choice
+      tbest = INFINITY;
+      for (int k=0; k<3; ++k) {
+        if (k==2 && maxnthr==1)
+          continue;
+        bin_tuning v = b; v.sort_nthr = nthrs[k];
+        double t = time_bins(p, v, xj, yj, zj, NULL, dir, 0);
+        if (t<tbest) { tbest = t; b.sort_nthr = nthrs[k]; }
+      }
+#pragma omp critical (finufft_tuning)
+      tuned_bins[key] = b;
+      how = "timed";
+    }
+  }
+  p->spopts.bin_size_x = b.bx;
+  p->spopts.bin_size_y = b.by;
+  p->spopts.bin_size_z = b.bz;
+  p->spopts.sort_threads = b.sort_nthr;
+  if (p->opts.debug)
+    printf("[%s] %s bins %gx%gx%g, sort threads %d\n", __func__, how, b.bx,
+           b.by, b.bz, b.sort_nthr);
+  return 0;
+}
+
+static void fftw_init_once()
+// Setup FFTW global state, including its threads (needed before planning or
+// reading wisdom containing multithreaded plans). Caller must hold the OMP
+// critical lock, making FINUFFT thread-safe (can be called inside OMP) if
+// -DFFTW_PLAN_SAFE is used.
+{
+  static bool did_fftw_init = 0;    // the only global state of FINUFFT
+  if (!did_fftw_init) {
+    FFTW_INIT();            // should only do once
+    FFTW_PLAN_SF();         // if -DFFTW_PLAN_SAFE, make FFTW thread-safe
+    did_fftw_init = 1;
+  }
+}
+
+static void plan_pruned_fft(FINUFFT_PLAN p, FFTPLAN* f, int howmany,
+                            int type, int sign)
+/* Appends to f the FFTW plans of the pruned FFT (see opts.fft_prune) of type
+   type, sign sign, of the first howmany fine grids of p->fwBatch (dim>1,
+   complex). It is done as 1D passes along each dim d, for type 1 from x up,
+   as only the kept modes are needed of the dims already done, for type 2
+   from the top dim down, as the input is zero outside the modes in the dims
+   not yet done. So each pass skips the lines outside the modes in the dims
+   below d, which lie in two ranges (nonnegative and negative freqs, as in
+   deconvolveshuffle*), ie is up to 2^d guru plans. Call inside the planner
+   lock.
+*/
+{
+  int dim = p->dim;
+  BIGINT n[3] = {p->nf1, p->nf2, p->nf3};           // fine grid sizes,
+  BIGINT m[3] = {p->ms, p->mt, p->mu};              // # modes,
+  BIGINT str[3] = {1, p->nf1, p->nf1*p->nf2};       // strides, in x,y,z
+  for (int k=0; k<dim; k++) {
+    int d = type==1 ? k : dim-1-k;                  // this pass is along d
+    FFTW_IODIM64 fd = {n[d], str[d], str[d]};
+    for (int c=0; c < (1<<d); c++) {   // bit e of c: which range in dim e<d
+      FFTW_IODIM64 hd[3];              // loops: transforms, and other dims
+      hd[0].n = howmany; hd[0].is = hd[0].os = p->nf;
+      int nh = 1;
+      BIGINT off = 0;
+      for (int e=0; e<dim; e++) {
+        if (e==d) continue;
+        BIGINT len = n[e];
+        if (e<d) {                     // only the modes of this range
+          int neg = (c>>e) & 1;
+          len = neg ? m[e]/2 : m[e] - m[e]/2;
+          if (neg) off += (n[e] - len)*str[e];
+        }
+        hd[nh].n = len; hd[nh].is = hd[nh].os = str[e];
+        nh++;
+      }
+      bool empty = false;
+      for (int h=0; h<nh; h++)
+        empty |= (hd[h].n==0);
+      if (empty) continue;              // (eg no negative freqs if 1 mode)
+      f->plan[f->n] = FFTW_PLAN_GURU64_DFT(1, &fd, nh, hd, p->fwBatch + off,
+                                           p->fwBatch + off, sign, p->opts.fftw);
+      f->off[f->n++] = off;
+    }
+  }
+}
+
+static void grid_iodims(FINUFFT_PLAN p, BIGINT nxi, BIGINT nxo,
+                        FFTW_IODIM64* dims)
+// Fills dims[0..dim-1] with the sizes of p's fine grid, in FFTW's row-major
+// order (x last), and the strides of the input and output grids, whose
+// x-lines are stored with nxi and nxo entries (nf1, or the padded real or
+// complex half-spectrum lines in real mode).
+{
+  BIGINT n[3] = {p->nf1, p->nf2, p->nf3};
+  BIGINT is = 1, os = 1;
+  for (int d=0; d<p->dim; d++) {
+    FFTW_IODIM64 *g = &dims[p->dim-1-d];
+    g->n = n[d]; g->is = is; g->os = os;
+    is *= d ? n[d] : nxi;
+    os *= d ? n[d] : nxo;
+  }
+}
+
+static FFTPLAN plan_fft(FINUFFT_PLAN p, int nthr_fft, int howmany, int type)
+/* Plans the FFT of type type (that of the type 1 or 2 plan p, or the other
+   one for its adjoint) in place on the first howmany fine grids of
+   p->fwBatch, which planning may overwrite, with nthr_fft threads. It is r2c
+   (type 1) or c2r (type 2) in real mode, else of sign p->fftSign for
+   type=p->type and the opposite for the adjoint, pruned if opts.fft_prune
+   and dim>1. Uses FFTW's guru64 interface, so that grid sizes and strides
+   may exceed 2^31.
+*/
+{
+  int dim = p->dim;
+  int sign = type==p->type ? p->fftSign : -p->fftSign;
+  FFTPLAN f;
+  f.n = 0;
+  FFTW_IODIM64 dims[3], hd;            // the grid, and the loop over grids
+  hd.n = howmany;
+  // FFTW's thread count is global planner state, so set it for each plan
+  // (eg single-threaded plans for finufft_execute_many), in the same lock
+#pragma omp critical
+  {
+    FFTW_PLAN_TH(nthr_fft);
+    if (p->opts.realmode) {   // in-place r2c (type 1) or c2r (type 2)
+      BIGINT nxc = p->nf1/2 + 1;          // complex half-spectrum x-lines,
+      FLT *fwr = (FLT*)p->fwBatch;        // and padded real x-lines (fastest)
+      if (type==1) {
+        grid_iodims(p, 2*nxc, nxc, dims);
+        hd.is = 2*p->nfw; hd.os = p->nfw;
+        f.plan[0] = FFTW_PLAN_GURU64_R2C(dim, dims, 1, &hd, fwr, p->fwBatch,
+                                         p->opts.fftw);
+      } else {
+        grid_iodims(p, nxc, 2*nxc, dims);
+        hd.is = p->nfw; hd.os = 2*p->nfw;
+        f.plan[0] = FFTW_PLAN_GURU64_C2R(dim, dims, 1, &hd, p->fwBatch, fwr,
+                                         p->opts.fftw);
+      }
+      f.off[0] = 0; f.n = 1;
+    } else if (p->opts.fft_prune && dim>1)
+      plan_pruned_fft(p, &f, howmany, type, sign);
+    else {
+      grid_iodims(p, p->nf1, p->nf1, dims);
+      hd.is = hd.os = p->nf;
+      f.plan[0] = FFTW_PLAN_GURU64_DFT(dim, dims, 1, &hd, p->fwBatch,
+                                       p->fwBatch, sign, p->opts.fftw);
+      f.off[0] = 0; f.n = 1;
+    }
+  }
+  return f;
+}
+
+static void execute_fft(FINUFFT_PLAN p, FFTPLAN* f, int type, FFTW_CPX* fw)
+// Runs the FFT f, planned by plan_fft for type type, on the fine grids fw
+// (p->fwBatch, or p->fwBatch2 of the same layout and alignment).
+{
+  if (p->opts.realmode) {
+    if (type==1)
+      FFTW_EX_R2C(f->plan[0], (FLT*)fw, fw);
+    else
+      FFTW_EX_C2R(f->plan[0], fw, (FLT*)fw);
+  } else
+    for (int i=0; i<f->n; i++)
+      FFTW_EX_DFT(f->plan[i], fw + f->off[i], fw + f->off[i]);
+}
+
+static void destroy_fft(FFTPLAN* f)
+// Destroys the FFTW plans of f, if any.
+{
+  for (int i=0; i<f->n; i++)
+    FFTW_DE(f->plan[i]);
+  f->n = 0;
+}
+
+static int last_batch_size(FINUFFT_PLAN p)
+// Size of the last batch of p, if smaller than the others, else 0 (no plans
+// for it needed).
+{
+  int last = p->ntrans - (p->nbatch-1)*p->batchSize;
+  return last<p->batchSize ? last : 0;
+}
+
+
 // PPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPPP
 int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
                      int ntrans, FLT tol, FINUFFT_PLAN *pp, nufft_opts* opts)
@@ -546,6 +1185,8 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
 
   p = new FINUFFT_PLAN_S;                // allocate fresh plan struct
   *pp = p;                               // pass out plan as ptr to plan struct
+  memset(&(p->stats), 0, sizeof(finufft_stats));
+  CNTime tplan; tplan.start();           // for p->stats.t_makeplan
 
   if (opts==NULL)                        // use default opts
     FINUFFT_DEFAULT_OPTS(&(p->opts));
@@ -567,6 +1208,10 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
     fprintf(stderr,"[%s] ntrans (%d) should be at least 1.\n",__func__,ntrans);
     return ERR_NTRANS_NOTVALID;
   }
+  if (p->opts.realmode && type==3) {
+    fprintf(stderr,"[%s] real mode (opts.realmode) is for types 1 and 2 only.\n",__func__);
+    return ERR_REALMODE;
+  }
   
   // get stuff from args...
   p->type = type;
@@ -580,6 +1225,7 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
   if (p->opts.nthreads>0)
     nthr = p->opts.nthreads;                // user override (no limit or check)
   p->opts.nthreads = nthr;                  // store actual # thr planned for
+  p->stats.nthreads = nthr;
 
   // choose batchSize for types 1,2 or 3... (uses int ceil(b/a)=1+(b-1)/a trick)
   if (p->opts.maxbatchsize==0) {            // logic to auto-set best batchsize
@@ -589,6 +1235,7 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
     p->batchSize = min(p->opts.maxbatchsize,ntrans);
     p->nbatch = 1+(ntrans-1)/p->batchSize;  // resulting # batches
   }
+  p->stats.batchsize = p->batchSize;
   if (p->opts.spread_thread==0)
     p->opts.spread_thread=2;                // our auto choice
   if (p->opts.spread_thread!=1 && p->opts.spread_thread!=2) {
@@ -625,6 +1272,15 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
   p->phiHat1 = NULL; p->phiHat2 = NULL; p->phiHat3 = NULL;
   p->nf1 = 1; p->nf2 = 1; p->nf3 = 1;  // crucial to leave as 1 for unused dims
   p->sortIndices = NULL;               // used in all three types
+  p->sortPos = NULL; p->binStart = NULL;  // only built by updatepts
+  p->spreadScratch = NULL; p->nSpreadScratch = 0;   // set up by setpts
+  p->Xs = NULL; p->Ys = NULL; p->Zs = NULL;          // (also)
+  p->kerTab = NULL;                                  // (also)
+  p->interpCols = NULL; p->interpVals = NULL;        // (also)
+  p->fftwPlan.n = 0;
+  p->fftwPlanAdj.n = 0;                // only planned if adjoint is used
+  p->fwBatch2 = NULL; p->fftwPlanPipe.n = 0; p->nthrPipe = 0;  // if pipelined
+  p->fftwPlanLast.n = 0; p->fftwPlanAdjLast.n = 0; p->fftwPlanPipeLast.n = 0;
   
   //  ------------------------ types 1,2: planning needed ---------------------
   if (type==1 || type==2) {
@@ -634,15 +1290,7 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
     // Now place FFTW initialization in a lock, courtesy of OMP. Makes FINUFFT
     // thread-safe (can be called inside OMP) if -DFFTW_PLAN_SAFE used...
 #pragma omp critical
-    {
-      static bool did_fftw_init = 0;    // the only global state of FINUFFT
-      if (!did_fftw_init) {
-	FFTW_INIT();            // setup FFTW global state; should only do once
-	FFTW_PLAN_TH(nthr_fft); // ditto
-	FFTW_PLAN_SF();         // if -DFFTW_PLAN_SAFE, make FFTW thread-safe
-	did_fftw_init = 1;      // insure other FINUFFT threads don't clash
-      }
-    } 
+    fftw_init_once();
 
     p->spopts.spread_direction = type;
 
@@ -686,29 +1334,53 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
     onedim_fseries_kernel(p->nf1, p->phiHat1, p->spopts);
     if (dim>1) onedim_fseries_kernel(p->nf2, p->phiHat2, p->spopts);
     if (dim>2) onedim_fseries_kernel(p->nf3, p->phiHat3, p->spopts);
+    p->stats.t_kernel = timer.elapsedsec();
     if (p->opts.debug) printf("[%s] kernel fser (ns=%d):\t\t%.3g s\n",__func__,p->spopts.nspread, timer.elapsedsec());
 
     timer.restart();
     p->nf = p->nf1*p->nf2*p->nf3;      // fine grid total number of points
-    if (p->nf * p->batchSize > MAX_NF) {
+    p->nfw = p->nf;                    // complex entries of each fw array
+    if (p->opts.realmode)              // real grid / half-spectrum, in place
+      p->nfw = (p->nf1/2 + 1)*p->nf2*p->nf3;
+    if (p->nfw * p->batchSize > MAX_NF) {
       fprintf(stderr, "[%s] fwBatch would be bigger than MAX_NF, not attempting malloc!\n",__func__);
       return ERR_MAXNALLOC;
     }
-    p->fwBatch = FFTW_ALLOC_CPX(p->nf * p->batchSize);    // the big workspace
-    if (p->opts.debug) printf("[%s] fwBatch %.2fGB alloc:   \t%.3g s\n", __func__,(double)1E-09*sizeof(CPX)*p->nf*p->batchSize, timer.elapsedsec());
+    p->fwBatch = FFTW_ALLOC_CPX(p->nfw * p->batchSize);   // the big workspace
     if(!p->fwBatch) {      // we don't catch all such mallocs, just this big one
       fprintf(stderr, "[%s] FFTW malloc failed for fwBatch (working fine grids)!\n",__func__);
       free(p->phiHat1); free(p->phiHat2); free(p->phiHat3);
       return ERR_ALLOC;
     }
+    for (int i=0; i<p->batchSize; i++)    // first touch, as spreading zeroes
+      zeroGrid((FLT*)(p->fwBatch + i*p->nfw), 2*p->nfw, nthr);
+    p->stats.t_alloc = timer.elapsedsec();
+    if (p->opts.debug) printf("[%s] fwBatch %.2fGB alloc:   \t%.3g s\n", __func__,(double)1E-09*sizeof(CPX)*p->nfw*p->batchSize, timer.elapsedsec());
    
     timer.restart();            // plan the FFTW
-    int *ns = GRIDSIZE_FOR_FFTW(p);
-    // fftw_plan_many_dft args: rank, gridsize/dim, howmany, in, inembed, istride, idist, ot, onembed, ostride, odist, sign, flags 
-    p->fftwPlan = FFTW_PLAN_MANY_DFT(dim, ns, p->batchSize, p->fwBatch,
-         NULL, 1, p->nf, p->fwBatch, NULL, 1, p->nf, p->fftSign, p->opts.fftw);
+    p->fftwPlan = plan_fft(p, nthr_fft, p->batchSize, type);
+    int last = last_batch_size(p);   // don't FFT unused grids of a last batch
+    if (last)
+      p->fftwPlanLast = plan_fft(p, nthr_fft, last, type);
+    // pipelined batches (opts.pipeline) need two batches, and threads to
+    // split between the FFT stage (nthrPipe of them) and spread/interp...
+#ifdef _OPENMP
+    if (p->opts.pipeline==1 && p->nbatch>1 && nthr>1) {
+      p->nthrPipe = nthr/2;
+      p->fftwPlanPipe = plan_fft(p, p->nthrPipe, p->batchSize, type);
+      if (last)
+        p->fftwPlanPipeLast = plan_fft(p, p->nthrPipe, last, type);
+      p->fwBatch2 = FFTW_ALLOC_CPX(p->nfw * p->batchSize);
+      if (!p->fwBatch2) {
+        fprintf(stderr, "[%s] FFTW malloc failed for fwBatch2 (pipeline)!\n",__func__);
+        return ERR_ALLOC;
+      }
+      for (int i=0; i<p->batchSize; i++)  // first touch, as spreading zeroes
+        zeroGrid((FLT*)(p->fwBatch2 + i*p->nfw), 2*p->nfw, nthr-p->nthrPipe);
+    }
+#endif
+    p->stats.t_fftwplan = timer.elapsedsec();
     if (p->opts.debug) printf("[%s] FFTW plan (mode %d, nthr=%d):\t%.3g s\n", __func__,p->opts.fftw, nthr_fft, timer.elapsedsec());
-    delete []ns;
     
   } else {  // -------------------------- type 3 (no planning) ------------
 
@@ -720,9 +1392,12 @@ int FINUFFT_MAKEPLAN(int type, int dim, BIGINT* n_modes, int iflag,
     p->prephase = NULL;
     p->deconv = NULL;
     p->innerT2plan = NULL;
+    p->spopts.spread_direction = 1;    // (it spreads, as setpts sorts for)
     // Type 3 will call finufft_makeplan for type 2; no need to init FFTW
     // Note we don't even know nj or nk yet, so can't do anything else!
   }
+  p->stats.bytes = plan_bytes(p);
+  p->stats.t_makeplan = tplan.elapsedsec();
   return ier;         // report setup_spreader status (could be warning)
 }
 
@@ -738,6 +1413,7 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
 {
   int d = p->dim;     // abbrev for spatial dim
   CNTime timer; timer.start();
+  CNTime tset; tset.start();           // for p->stats.t_setpts
   p->nj = nj;    // the user only now chooses how many NU (x,y,z) pts
 
   if (p->type!=3) {  // ------------------ TYPE 1,2 SETPTS -------------------
@@ -750,13 +1426,46 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
     if (ier)         // no warnings allowed here
       return ier;    
     timer.restart();
+    free(p->sortIndices);   // in case setpts is called again on this plan
+    free(p->sortPos); p->sortPos = NULL;     // updatepts state is stale
+    free(p->binStart); p->binStart = NULL;
     p->sortIndices = (BIGINT *)malloc(sizeof(BIGINT)*p->nj);
     if (!p->sortIndices) {
       fprintf(stderr,"[%s] failed to allocate sortIndices!\n",__func__);
       return ERR_SPREAD_ALLOC;
     }
+    if (tune_bins(p, xj, yj, zj)) {
+      fprintf(stderr,"[%s] failed to allocate for bin tuning!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (p->opts.debug && p->opts.spread_bin_tune) printf("[%s] bin tuning:\t\t%.3g s\n", __func__, timer.elapsedsec());
+    timer.restart();
     p->didSort = indexSort(p->sortIndices, p->nf1, p->nf2, p->nf3, p->nj, xj, yj, zj, p->spopts);
+    p->stats.t_sort = timer.elapsedsec();
     if (p->opts.debug) printf("[%s] sort (didSort=%d):\t\t%.3g s\n", __func__,p->didSort, timer.elapsedsec());
+    timer.restart();
+    if (fold_coords(p)) {
+      fprintf(stderr,"[%s] failed to allocate folded coords!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (p->opts.debug && p->Xs) printf("[%s] fold sorted coords:\t%.3g s\n", __func__, timer.elapsedsec());
+    timer.restart();
+    if (kernel_table(p)) {
+      fprintf(stderr,"[%s] failed to allocate kernel table!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (p->opts.debug && p->kerTab) printf("[%s] kernel table:\t\t%.3g s\n", __func__, timer.elapsedsec());
+    timer.restart();
+    if (interp_matrix(p)) {
+      fprintf(stderr,"[%s] failed to allocate interpolation matrix!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (p->opts.debug && p->interpCols) printf("[%s] interp matrix:\t\t%.3g s\n", __func__, timer.elapsedsec());
+    if (reserve_spread_scratch(p)) {
+      fprintf(stderr,"[%s] failed to allocate spreader scratch!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (p->opts.debug>1) printf("[%s] spreader scratch:\t%.3g s\n", __func__, timer.elapsedsec());
 
     
   } else {   // ------------------------- TYPE 3 SETPTS -----------------------
@@ -799,6 +1508,7 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
         printf("\tX3=%.3g C3=%.3g S3=%.3g D3=%.3g gam3=%g nf3=%lld\n", p->t3P.X3, p->t3P.C3,S3, p->t3P.D3, p->t3P.gam3,(long long) p->nf3);
     }
     p->nf = p->nf1*p->nf2*p->nf3;      // fine grid total number of points
+    p->nfw = p->nf;
     if (p->nf * p->batchSize > MAX_NF) {
       fprintf(stderr, "[%s t3] fwBatch would be bigger than MAX_NF, not attempting malloc!\n",__func__);
       return ERR_MAXNALLOC;
@@ -811,6 +1521,8 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
       fprintf(stderr, "[%s t3] malloc fail for fwBatch or CpBatch!\n",__func__);
       return ERR_ALLOC; 
     }
+    for (int i=0; i<p->batchSize; i++)    // first touch, as spreading zeroes
+      zeroGrid((FLT*)(p->fwBatch + i*p->nf), 2*p->nf, p->opts.nthreads);
     //printf("fwbatch, cpbatch ptrs: %llx %llx\n",p->fwBatch,p->CpBatch);
 
     // alloc rescaled NU src pts x'_j (in X etc), rescaled NU targ pts s'_k ...
@@ -903,6 +1615,8 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
     free(phiHatk1); free(phiHatk2); free(phiHatk3);  // done w/ deconv fill
     if (p->opts.debug) printf("[%s t3] phase & deconv factors:\t%.3g s\n",__func__,timer.elapsedsec());
 
+    p->stats.t_t3prep = tset.elapsedsec();
+
     // Set up sort for spreading Cp (from primed NU src pts X, Y, Z) to fw...
     timer.restart();
     p->sortIndices = (BIGINT *)malloc(sizeof(BIGINT)*p->nj);
@@ -910,8 +1624,27 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
       fprintf(stderr,"[%s t3] failed to allocate sortIndices!\n",__func__);
       return ERR_SPREAD_ALLOC;
     }
+    if (tune_bins(p, p->X, p->Y, p->Z)) {
+      fprintf(stderr,"[%s t3] failed to allocate for bin tuning!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (p->opts.debug && p->opts.spread_bin_tune) printf("[%s t3] bin tuning:\t\t%.3g s\n", __func__, timer.elapsedsec());
+    timer.restart();
     p->didSort = indexSort(p->sortIndices, p->nf1, p->nf2, p->nf3, p->nj, p->X, p->Y, p->Z, p->spopts);
+    p->stats.t_sort = timer.elapsedsec();
     if (p->opts.debug) printf("[%s t3] sort (didSort=%d):\t\t%.3g s\n",__func__, p->didSort, timer.elapsedsec());
+    if (fold_coords(p)) {
+      fprintf(stderr,"[%s t3] failed to allocate folded coords!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (kernel_table(p)) {
+      fprintf(stderr,"[%s t3] failed to allocate kernel table!\n",__func__);
+      return ERR_ALLOC;
+    }
+    if (reserve_spread_scratch(p)) {
+      fprintf(stderr,"[%s t3] failed to allocate spreader scratch!\n",__func__);
+      return ERR_ALLOC;
+    }
  
     // Plan and setpts once, for the (repeated) inner type 2 finufft call...
     timer.restart();
@@ -920,8 +1653,10 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
     t2opts.debug = max(0,p->opts.debug-1);        // don't print as much detail
     t2opts.spread_debug = max(0,p->opts.spread_debug-1);
     t2opts.showwarn = 0;                          // so don't see warnings 2x
+    t2opts.maxbatchsize = p->batchSize;  // our batches, incl. any smaller last
+    t2opts.pipeline = 0;                 // (run one batch at a time)
     // (...could vary other t2opts here?)
-    int ier = FINUFFT_MAKEPLAN(2, d, t2nmodes, p->fftSign, p->batchSize, p->tol,
+    int ier = FINUFFT_MAKEPLAN(2, d, t2nmodes, p->fftSign, p->ntrans, p->tol,
                                &p->innerT2plan, &t2opts);
     if (ier>1) {     // if merely warning, still proceed
       fprintf(stderr,"[%s t3]: inner type 2 plan creation failed with ier=%d!\n",__func__,ier);
@@ -932,84 +1667,376 @@ int FINUFFT_SETPTS(FINUFFT_PLAN p, BIGINT nj, FLT* xj, FLT* yj, FLT* zj,
       fprintf(stderr,"[%s t3]: inner type 2 setpts failed, ier=%d!\n",__func__,ier);
       return ier;
     }
+    p->stats.t_t3inner = timer.elapsedsec();
     if (p->opts.debug) printf("[%s t3] inner t2 plan & setpts: \t%.3g s\n", __func__,timer.elapsedsec());
 
   }
+  p->stats.didsort = p->didSort;
+  p->stats.bytes = plan_bytes(p);
+  p->stats.t_setpts = tset.elapsedsec();
   return 0;
 }
 // ............ end setpts ..................................................
 
 
+int FINUFFT_UPDATEPTS(FINUFFT_PLAN p, BIGINT n, BIGINT* ind, FLT* x, FLT* y,
+                      FLT* z)
+/* For type 1,2: moves the n NU pts of indices ind[0..n-1] (each in [0,M) of
+   the last setpts) to the new coords x[i],y[i],z[i] (length-n arrays; y, z
+   ignored in lower dims), writing them into the xj,yj,zj arrays passed to
+   setpts. Only the moved pts are bounds-checked and re-binned, and the sort
+   permutation patched (see indexSortUpdate), so the cost scales with n rather
+   than M, apart from O(M) on the first call after setpts to set up the bins.
+   Falls back to a full sort if many pts change bin.
+   Not for type 3, whose rescaling depends on all the pts.
+*/
+{
+  if (p->type==3) {
+    fprintf(stderr,"[%s] updatepts is only for types 1 and 2!\n",__func__);
+    return ERR_TYPE_NOTVALID;
+  }
+  CNTime timer; timer.start();
+  int d = p->dim;
+  for (BIGINT i=0; i<n; ++i)
+    if (ind[i]<0 || ind[i]>=p->nj) {
+      fprintf(stderr,"[%s] index ind[%lld]=%lld not in [0,M=%lld)!\n",
+              __func__,(long long)i,(long long)ind[i],(long long)p->nj);
+      return ERR_PTS_INDEX;
+    }
+  int ier = spreadcheck(p->nf1, p->nf2, p->nf3, n, x, y, z, p->spopts);
+  if (ier)
+    return ier;
+  if (!p->didSort) {           // identity perm: just overwrite the coords
+    for (BIGINT i=0; i<n; ++i) {
+      p->X[ind[i]] = x[i];
+      if (d>1) p->Y[ind[i]] = y[i];
+      if (d>2) p->Z[ind[i]] = z[i];
+    }
+    if (p->Xs)                 // and their folded copies, in the same places
+      foldCoords(p->Xs, p->Ys, p->Zs, ind, ind, n, p->nf1, p->nf2, p->nf3,
+                 p->X, p->Y, p->Z, p->spopts);
+    if (p->kerTab)             // and kernel values
+      kernelTable(p->kerTab, ind, ind, n, p->nf1, p->nf2, p->nf3,
+                  p->X, p->Y, p->Z, p->spopts);
+    if (p->interpCols)         // and interpolation matrix rows
+      interpMatrix(p->interpCols, p->interpVals, ind, ind, n, p->nf1, p->nf2,
+                   p->nf3, p->X, p->Y, p->Z, p->spopts);
+    p->stats.t_sort = 0.0;
+    p->stats.t_setpts = timer.elapsedsec();
+    return 0;
+  }
+  if (!p->binStart) {          // first update since setpts: set up the bins
+    p->sortPos = (BIGINT *)malloc(sizeof(BIGINT)*p->nj);
+    if (p->sortPos)
+      p->binStart = indexSortBins(p->sortPos, p->sortIndices, p->nf1, p->nf2,
+                                  p->nf3, p->nj, p->X, p->Y, p->Z, p->spopts);
+    if (!p->binStart) {
+      fprintf(stderr,"[%s] failed to allocate sort bins!\n",__func__);
+      free(p->sortPos); p->sortPos = NULL;
+      return ERR_SPREAD_ALLOC;
+    }
+    if (p->opts.debug) printf("[%s] set up bins:\t\t%.3g s\n", __func__, timer.elapsedsec());
+  }
+  BIGINT crossed = indexSortUpdate(p->sortIndices, p->sortPos, p->binStart,
+                                   p->nf1, p->nf2, p->nf3, p->nj, p->X, p->Y,
+                                   p->Z, n, ind, x, y, z, p->spopts,
+                                   p->Xs, p->Ys, p->Zs, p->kerTab,
+                                   p->interpCols, p->interpVals);
+  if (crossed<0) {             // too many bin changes: sort all pts afresh
+    for (BIGINT i=0; i<n; ++i) {
+      p->X[ind[i]] = x[i];
+      if (d>1) p->Y[ind[i]] = y[i];
+      if (d>2) p->Z[ind[i]] = z[i];
+    }
+    free(p->sortPos); p->sortPos = NULL;
+    free(p->binStart); p->binStart = NULL;
+    p->didSort = indexSort(p->sortIndices, p->nf1, p->nf2, p->nf3, p->nj,
+                           p->X, p->Y, p->Z, p->spopts);
+    if (fold_coords(p) || kernel_table(p) || interp_matrix(p))
+      return ERR_ALLOC;
+    if (p->opts.debug) printf("[%s] full re-sort (didSort=%d):\t%.3g s\n", __func__, p->didSort, timer.elapsedsec());
+  } else if (p->opts.debug)
+    printf("[%s] %lld pts, %lld bin steps:\t%.3g s\n", __func__, (long long)n, (long long)crossed, timer.elapsedsec());
+  p->stats.t_sort = timer.elapsedsec();
+  p->stats.didsort = p->didSort;
+  p->stats.bytes = plan_bytes(p);
+  p->stats.t_setpts = timer.elapsedsec();
+  return 0;
+}
+
+
+int FINUFFT_INTERP_MATRIX(FINUFFT_PLAN p, BIGINT* nf, BIGINT* nnzrow,
+                          BIGINT* cols, FLT* vals)
+/* For type 1,2: exports the interpolation matrix A of the NU pts of the last
+   setpts (or updatepts), the sparse M-by-(nf1*nf2*nf3) real matrix with which
+   the interpolation step of type 2 is c = A*fw, for fw the fine grid (x index
+   fastest), and the spreading step of type 1 is fw = A^T*c. Writes the fine
+   grid sizes to nf[0..2] (1 for unused dims) and the number of nonzeros per
+   row (nspread^dim) to *nnzrow; then if cols and vals are not NULL (each of
+   length M*nnzrow) fills them with A in CSR form, rows in user order with
+   implicit row starts (see interpMatrix). Returns 0, or ERR_TYPE_NOTVALID
+   for type 3.
+*/
+{
+  if (p->type==3) {
+    fprintf(stderr,"[%s] interp_matrix is only for types 1 and 2!\n",__func__);
+    return ERR_TYPE_NOTVALID;
+  }
+  nf[0] = p->nf1; nf[1] = p->nf2; nf[2] = p->nf3;
+  *nnzrow = interp_nnzrow(p);
+  if (cols && vals)
+    interpMatrix(cols, vals, NULL, NULL, p->nj, p->nf1, p->nf2, p->nf3,
+                 p->X, p->Y, p->Z, p->spopts);
+  return 0;
+}
+
+
 // EEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE
-int FINUFFT_EXECUTE(FINUFFT_PLAN p, CPX* cj, CPX* fk){
-/* See ../docs/cguru.doc for current documentation.
+static int exec12batch(FINUFFT_PLAN p, int type, FFTPLAN* fftwplan,
+                       int thisBatchSize, CPX* cjb, CPX* fkb, int realc,
+                       int realf, double* t)
+/* One batch of a type 1 or 2 transform on the sorted NU pts of the type 1 or 2
+   plan p, using its workspace p->fwBatch. type may be that of the plan, or
+   the other one (3-p->type) for the adjoint, in which case fftwplan is the
+   opposite-sign p->fftwPlanAdj. fftwplan must be for thisBatchSize
+   transforms (the ...Last plan for a smaller last batch). cjb and fkb point to the batch of strengths
+   and of coefficients; realc, realf as in execute_internal.
+   Accumulates spread/interp, FFT and deconvolve times into t[0], t[1], t[2].
+   Returns 0, or the error code of spreadinterpSortedBatch (then stopping).
+*/
+{
+  CNTime timer; timer.start();
+  p->spopts.spread_direction = type;
+  
+  // STEP 1: (varies by type)
+  if (type == 1) {  // type 1: spread NU pts p->X, weights cj, to fw grid
+    int ier = spreadinterpSortedBatch(thisBatchSize, p, p->fwBatch, cjb, realc, 0);
+    t[0] += timer.elapsedsec();
+    if (ier) return ier;
+  } else {          //  type 2: amplify Fourier coeffs fk into 0-padded fw
+    deconvolveBatch(thisBatchSize, p, p->fwBatch, fkb, realf, 0);
+    t[2] += timer.elapsedsec();
+  }
+  
+  // STEP 2: call the pre-planned FFT on this batch
+  timer.restart();
+  execute_fft(p, fftwplan, type, p->fwBatch);
+  t[1] += timer.elapsedsec();
+  if (p->opts.debug>1)
+    printf("\tFFTW exec:\t\t%.3g s\n", timer.elapsedsec());
+  
+  // STEP 3: (varies by type)
+  timer.restart();
+  if (type == 1) {   // type 1: deconvolve (amplify) fw and shuffle to fk
+    deconvolveBatch(thisBatchSize, p, p->fwBatch, fkb, 0, 0);
+    t[2] += timer.elapsedsec();
+  } else {          // type 2: interpolate unif fw grid to NU target pts
+    int ier = spreadinterpSortedBatch(thisBatchSize, p, p->fwBatch, cjb, realc, 0);
+    t[0] += timer.elapsedsec();
+    if (ier) return ier;
+  }
+  return 0;
+}
+
+static int exec12stage(FINUFFT_PLAN p, int type, int b, int stage, CPX* cj,
+                       CPX* fk, int realc, int realf, double* t)
+/* One of the two stages of batch b of a pipelined execute (no adjoint) of the
+   type 1 or 2 plan p, in fine grid workspace b%2 (p->fwBatch or
+   p->fwBatch2). Stage 0 is the type 1 spread, or the type 2 deconvolve and
+   FFT; stage 1 the type 1 FFT and deconvolve, or the type 2 interp. So the
+   stage with the FFT uses p->nthrPipe threads, the other the rest of them.
+   cj, fk, realc, realf as in execute_internal. Accumulates times into t, and
+   returns, as exec12batch.
+*/
+{
+  CNTime timer; timer.start();
+  int thisBatchSize = min(p->ntrans - b*p->batchSize, p->batchSize);
+  int bB = b*p->batchSize;           // as in execute_internal
+  CPX* cjb = realc ? (CPX*)((FLT*)cj + bB*p->nj) : cj + bB*p->nj;
+  CPX* fkb = realf ? (CPX*)((FLT*)fk + bB*p->N) : fk + bB*p->N;
+  FFTW_CPX* fw = (b%2) ? p->fwBatch2 : p->fwBatch;
+  FFTPLAN* plan = thisBatchSize<p->batchSize ? &p->fftwPlanPipeLast
+                                             : &p->fftwPlanPipe;
+  int nthrfft = p->nthrPipe, nthrspread = p->opts.nthreads - p->nthrPipe;
+  if ((type==1) == (stage==0)) {     // spread or interp
+    int ier = spreadinterpSortedBatch(thisBatchSize, p, fw, cjb, realc,
+                                      nthrspread);
+    t[0] += timer.elapsedsec();
+    return ier;
+  }
+  if (type==2) {
+    deconvolveBatch(thisBatchSize, p, fw, fkb, realf, nthrfft);
+    t[2] += timer.elapsedsec();
+    timer.restart();
+  }
+  execute_fft(p, plan, type, fw);
+  t[1] += timer.elapsedsec();
+  if (type==1) {
+    timer.restart();
+    deconvolveBatch(thisBatchSize, p, fw, fkb, 0, nthrfft);
+    t[2] += timer.elapsedsec();
+  }
+  return 0;
+}
+
+static int exec12pipelined(FINUFFT_PLAN p, int type, CPX* cj, CPX* fk,
+                           int realc, int realf, double* t)
+/* All the batches of an execute (no adjoint) of the type 1 or 2 plan p,
+   pipelined (see opts.pipeline): stage 1 of each batch b-1 (see exec12stage)
+   runs in a helper thread while this one does stage 0 of batch b, in the other
+   workspace. As each thread starts its own OMP parallel regions, no nesting
+   is needed. Accumulates the stage times of both threads into t, so they may
+   add up to more than the elapsed time. Returns 0, or the first error code of
+   a stage, stopping (once the helper thread is joined) at that batch.
+*/
+{
+  double th[3] = {0.0, 0.0, 0.0};   // the helper thread's times
+  p->spopts.spread_direction = type;  // once, as both threads read it
+  int ier = exec12stage(p, type, 0, 0, cj, fk, realc, realf, t);
+  for (int b=1; b<=p->nbatch && !ier; b++) {
+    if (p->opts.debug>1) printf("[%s] batch %d stage 1 with batch %d stage 0:\n",__func__,b-1,b);
+    bool helped = false;
+    int ierh = 0;                   // the helper thread's error code
+#ifdef _OPENMP
+    try {
+      std::thread helper([&] {
+          ierh = exec12stage(p, type, b-1, 1, cj, fk, realc, realf, th); });
+      if (b<p->nbatch)
+        ier = exec12stage(p, type, b, 0, cj, fk, realc, realf, t);
+      helper.join();
+      helped = true;
+    } catch (const std::system_error&) {}  // no thread: do them in turn
+#endif
+    if (!helped) {
+      ierh = exec12stage(p, type, b-1, 1, cj, fk, realc, realf, th);
+      if (!ierh && b<p->nbatch)
+        ier = exec12stage(p, type, b, 0, cj, fk, realc, realf, t);
+    }
+    if (ierh) ier = ierh;
+  }
+  for (int k=0; k<3; k++)
+    t[k] += th[k];
+  return ier;
+}
+
+static void report12times(FINUFFT_PLAN p, int type, const char* name,
+                          double* t)
+// debug report of the times accumulated by exec12batch, in natural order
+{
+  if(type == 1) {
+    printf("[%s] done. tot spread:\t\t%.3g s\n",name,t[0]);
+    printf("               tot FFT:\t\t\t\t%.3g s\n", t[1]);
+    printf("               tot deconvolve:\t\t\t%.3g s\n", t[2]);
+  } else {
+    printf("[%s] done. tot deconvolve:\t\t%.3g s\n",name,t[2]);
+    printf("               tot FFT:\t\t\t\t%.3g s\n", t[1]);
+    printf("               tot interp:\t\t\t%.3g s\n",t[0]);
+  }
+}
+
+static void record12times(FINUFFT_PLAN p, double* t, double ttot,
+                          int pipelined)
+// records the times t accumulated by exec12batch (or exec12pipelined, if
+// pipelined), and the total time ttot, of an execute of the type 1 or 2 plan
+// p in p->stats
+{
+  p->stats.pipelined = pipelined;
+  p->stats.t_spreadinterp = t[0];
+  p->stats.t_fft = t[1];
+  p->stats.t_deconv = t[2];
+  p->stats.t_prephase = 0.0;
+  p->stats.t_inner = 0.0;
+  p->stats.nbatch = p->nbatch;
+  p->stats.t_execute = ttot;
+  p->stats.nexecute++;
+  p->stats.t_executetotal += ttot;
+}
+
+static int plan_adjoint_fft(FINUFFT_PLAN p)
+/* Makes (once) p->fftwPlanAdj (and p->fftwPlanAdjLast, if the last batch is
+   smaller), the FFT of opposite sign to p->fftwPlan acting
+   in place on the same p->fwBatch, as needed by the adjoint of a type 1 or 2
+   plan. Planning may overwrite p->fwBatch, which holds no data between
+   executes. Returns 0, or ERR_REALMODE for a real-mode plan.
+*/
+{
+  if (p->opts.realmode) {
+    fprintf(stderr,"[%s] adjoint not available for real-mode plans.\n",__func__);
+    return ERR_REALMODE;
+  }
+  if (!p->fftwPlanAdj.n) {
+    CNTime timer; timer.start();
+    int nthr = p->opts.nthreads;        // as in makeplan
+    p->fftwPlanAdj = plan_fft(p, nthr, p->batchSize, 3-p->type);
+    int last = last_batch_size(p);
+    if (last)
+      p->fftwPlanAdjLast = plan_fft(p, nthr, last, 3-p->type);
+    if (p->opts.debug) printf("[%s] FFTW plan (mode %d):\t%.3g s\n", __func__,p->opts.fftw, timer.elapsedsec());
+  }
+  return 0;
+}
+
+static int execute_internal(FINUFFT_PLAN p, CPX* cj, CPX* fk, int realin,
+                            int adjoint){
+/* The work of FINUFFT_EXECUTE, FINUFFT_EXECUTE_REALIN and
+   FINUFFT_EXECUTE_ADJOINT.
 
    For given (stack of) weights cj or coefficients fk, performs NUFFTs with
    existing (sorted) NU pts and existing plan.
    For type 1 and 3: cj is input, fk is output.
    For type 2: fk is input, cj is output.
+   If realin=1, the input array (cj for types 1,3, fk for type 2) in fact
+   holds real FLT values, which are read without making a complex copy.
+   In real mode (p->opts.realmode, types 1,2) cj is always real.
+   If adjoint=1 (types 1,2 only, realin=0), instead performs the adjoint
+   transform, ie the other type with opposite sign, so that the roles of cj
+   and fk as input and output are swapped.
    Performs spread/interp, pre/post deconvolve, and fftw_execute as appropriate
    for each of the 3 types.
    For cases of ntrans>1, performs work in blocks of size up to batchSize.
-   Return value 0 (no error diagnosis yet).
+   Return value 0, or the error code of the first failed spread/interp (eg
+   ERR_SPREAD_ALLOC), after which the output is not valid.
    Barnett 5/20/20, based on Malleo 2019.
 */
   CNTime timer; timer.start();
+  int realc = (realin && p->type!=2) || p->opts.realmode;   // cj is real
+  int realf = realin && p->type==2;   // fk is real (input)
   
   if (p->type!=3){ // --------------------- TYPE 1,2 EXEC ------------------
   
-    double t_sprint = 0.0, t_fft = 0.0, t_deconv = 0.0;  // accumulated timing
+    int type = adjoint ? 3 - p->type : p->type;       // type actually done
+    FFTPLAN* fftwplan = adjoint ? &p->fftwPlanAdj : &p->fftwPlan;
+    FFTPLAN* fftwplanlast = adjoint ? &p->fftwPlanAdjLast : &p->fftwPlanLast;
+    double t[3] = {0.0, 0.0, 0.0};  // accumulated sprint, FFT, deconv timing
+    int pipelined = p->fwBatch2 && !adjoint;     // (see opts.pipeline)
     if (p->opts.debug)
-      printf("[%s] start ntrans=%d (%d batches, bsize=%d)...\n", __func__, p->ntrans, p->nbatch, p->batchSize);
+      printf("[%s] start ntrans=%d (%d batches, bsize=%d%s)...\n", __func__, p->ntrans, p->nbatch, p->batchSize, pipelined ? ", pipelined" : "");
     
+    int ier = 0;
+    if (pipelined)
+      ier = exec12pipelined(p, type, cj, fk, realc, realf, t);
+    else
     for (int b=0; b*p->batchSize < p->ntrans; b++) { // .....loop b over batches
 
       // current batch is either batchSize, or possibly truncated if last one
       int thisBatchSize = min(p->ntrans - b*p->batchSize, p->batchSize);
       int bB = b*p->batchSize;         // index of vector, since batchsizes same
-      CPX* cjb = cj + bB*p->nj;        // point to batch of weights
-      CPX* fkb = fk + bB*p->N;         // point to batch of mode coeffs
+      // point to batch of weights, and of mode coeffs (in FLTs if real)...
+      CPX* cjb = realc ? (CPX*)((FLT*)cj + bB*p->nj) : cj + bB*p->nj;
+      CPX* fkb = realf ? (CPX*)((FLT*)fk + bB*p->N) : fk + bB*p->N;
       if (p->opts.debug>1) printf("[%s] start batch %d (size %d):\n",__func__, b,thisBatchSize);
-      
-      // STEP 1: (varies by type)
-      timer.restart();
-      if (p->type == 1) {  // type 1: spread NU pts p->X, weights cj, to fw grid
-        spreadinterpSortedBatch(thisBatchSize, p, cjb);
-        t_sprint += timer.elapsedsec();
-      } else {          //  type 2: amplify Fourier coeffs fk into 0-padded fw
-        deconvolveBatch(thisBatchSize, p, fkb);
-        t_deconv += timer.elapsedsec();
-      }
-             
-      // STEP 2: call the pre-planned FFT on this batch
-      timer.restart();
-      FFTW_EX(p->fftwPlan);   // if thisBatchSize<batchSize it wastes some flops
-      t_fft += timer.elapsedsec();
-      if (p->opts.debug>1)
-        printf("\tFFTW exec:\t\t%.3g s\n", timer.elapsedsec());
-      
-      // STEP 3: (varies by type)
-      timer.restart();        
-      if (p->type == 1) {   // type 1: deconvolve (amplify) fw and shuffle to fk
-        deconvolveBatch(thisBatchSize, p, fkb);
-        t_deconv += timer.elapsedsec();
-      } else {          // type 2: interpolate unif fw grid to NU target pts
-        spreadinterpSortedBatch(thisBatchSize, p, cjb);
-        t_sprint += timer.elapsedsec(); 
-      }
+      ier = exec12batch(p, type, thisBatchSize<p->batchSize ? fftwplanlast
+                        : fftwplan, thisBatchSize, cjb, fkb, realc, realf, t);
+      if (ier) break;
     }                                                   // ........end b loop
+    if (ier) return ier;
     
-    if (p->opts.debug) {  // report total times in their natural order...
-      if(p->type == 1) {
-        printf("[%s] done. tot spread:\t\t%.3g s\n",__func__,t_sprint);
-        printf("               tot FFT:\t\t\t\t%.3g s\n", t_fft);
-        printf("               tot deconvolve:\t\t\t%.3g s\n", t_deconv);
-      } else {
-        printf("[%s] done. tot deconvolve:\t\t%.3g s\n",__func__,t_deconv);
-        printf("               tot FFT:\t\t\t\t%.3g s\n", t_fft);
-        printf("               tot interp:\t\t\t%.3g s\n",t_sprint);
-      }
-    }
+    if (p->opts.debug)   // report total times in their natural order...
+      report12times(p, type, __func__, t);
+    if (p->opts.debug && pipelined)
+      printf("               (pipelined, overlap %.3g s)\n",
+             t[0]+t[1]+t[2]-timer.elapsedsec());
+    record12times(p, t, timer.elapsedsec(), pipelined);
   }
 
   else {  // ----------------------------- TYPE 3 EXEC ---------------------
@@ -1017,6 +2044,8 @@ int FINUFFT_EXECUTE(FINUFFT_PLAN p, CPX* cj, CPX* fk){
     //for (BIGINT j=0;j<10;++j) printf("\tcj[%ld]=%.15g+%.15gi\n",(long int)j,(double)real(cj[j]),(double)imag(cj[j]));  // debug
     
     double t_pre=0.0, t_spr=0.0, t_t2=0.0, t_deconv=0.0;  // accumulated timings
+    double t2[3] = {0.0, 0.0, 0.0};   // (inside the t2: sprint, FFT, deconv)
+    FINUFFT_PLAN q = p->innerT2plan;
     if (p->opts.debug)
       printf("[%s t3] start ntrans=%d (%d batches, bsize=%d)...\n",__func__,p->ntrans, p->nbatch, p->batchSize);
 
@@ -1026,6 +2055,7 @@ int FINUFFT_EXECUTE(FINUFFT_PLAN p, CPX* cj, CPX* fk){
       int thisBatchSize = min(p->ntrans - b*p->batchSize, p->batchSize);
       int bB = b*p->batchSize;
       CPX* cjb = cj + bB*p->nj;           // batch of input strengths
+      FLT* cjbr = (FLT*)cj + bB*p->nj;    // (or of real input strengths)
       CPX* fkb = fk + bB*p->nk;           // batch of output strengths
       if (p->opts.debug>1) printf("[%s t3] start batch %d (size %d):\n",__func__,b,thisBatchSize);
       
@@ -1034,27 +2064,32 @@ int FINUFFT_EXECUTE(FINUFFT_PLAN p, CPX* cj, CPX* fk){
 #pragma omp parallel for num_threads(p->opts.nthreads)   // or p->batchSize?
       for (int i=0; i<thisBatchSize; i++) {
         BIGINT ioff = i*p->nj;
-        for (BIGINT j=0;j<p->nj;++j)
-          p->CpBatch[ioff+j] = p->prephase[j] * cjb[ioff+j];
+        if (realc)
+          for (BIGINT j=0;j<p->nj;++j)
+            p->CpBatch[ioff+j] = p->prephase[j] * cjbr[ioff+j];
+        else
+          for (BIGINT j=0;j<p->nj;++j)
+            p->CpBatch[ioff+j] = p->prephase[j] * cjb[ioff+j];
       }
       t_pre += timer.elapsedsec(); 
       
       // STEP 1: spread c'_j batch (x'_j NU pts) into fw batch grid...
       timer.restart();
       p->spopts.spread_direction = 1;                         // spread
-      spreadinterpSortedBatch(thisBatchSize, p, p->CpBatch);  // p->X are primed
+      int ier = spreadinterpSortedBatch(thisBatchSize, p, p->fwBatch, p->CpBatch, 0, 0);  // p->X primed
       t_spr += timer.elapsedsec();
+      if (ier) return ier;
 
       //for (int j=0;j<p->nf1;++j) printf("fw[%d]=%.3g+%.3gi\n",j,p->fwBatch[j][0],p->fwBatch[j][1]);  // debug
    
       // STEP 2: type 2 NUFFT from fw batch to user output fk array batch...
+      // (this is batch b of q too, as q has our ntrans and batchSize)
       timer.restart();
-      // illegal possible shrink of ntrans *after* plan for smaller last batch:
-      p->innerT2plan->ntrans = thisBatchSize;      // do not try this at home!
-      /* (alarming that FFTW not shrunk, but safe, because t2's fwBatch array
-         still the same size, as Andrea explained; just wastes a few flops) */
-      FINUFFT_EXECUTE(p->innerT2plan, fkb, (CPX*)(p->fwBatch));
+      ier = exec12batch(q, 2, thisBatchSize<q->batchSize ? &q->fftwPlanLast
+                        : &q->fftwPlan, thisBatchSize, fkb, (CPX*)(p->fwBatch),
+                        0, 0, t2);
       t_t2 += timer.elapsedsec();
+      if (ier) return ier;
 
       // STEP 3: apply deconvolve (precomputed 1/phiHat(targ_k), phasing too)...
       timer.restart();
@@ -1073,12 +2108,177 @@ int FINUFFT_EXECUTE(FINUFFT_PLAN p, CPX* cj, CPX* fk){
       printf("                  tot type 2:\t\t\t%.3g s\n", t_t2);
       printf("                  tot deconvolve:\t\t%.3g s\n", t_deconv);
     }    
+    p->stats.t_spreadinterp = t_spr + t2[0];
+    p->stats.t_fft = t2[1];
+    p->stats.t_deconv = t_deconv + t2[2];
+    p->stats.t_prephase = t_pre;
+    p->stats.t_inner = t_t2;
+    p->stats.nbatch = p->nbatch;
+    p->stats.pipelined = 0;
+    p->stats.t_execute = t_pre + t_spr + t_t2 + t_deconv;
+    p->stats.nexecute++;
+    p->stats.t_executetotal += p->stats.t_execute;
   }
   //for (BIGINT k=0;k<10;++k) printf("\tfk[%ld]=%.15g+%.15gi\n",(long int)k,(double)real(fk[k]),(double)imag(fk[k]));  // debug
   
   return 0; 
 }
 
+int FINUFFT_EXECUTE(FINUFFT_PLAN p, CPX* cj, CPX* fk){
+/* See ../docs/cguru.doc for current documentation.
+   For type 1 and 3: cj is input, fk is output.
+   For type 2: fk is input, cj is output.
+*/
+  if (p->opts.realmode) {
+    fprintf(stderr,"[%s] real-mode plan needs execute_realin (type 1) or execute_realout (type 2).\n",__func__);
+    return ERR_REALMODE;
+  }
+  return execute_internal(p, cj, fk, 0, 0);
+}
+
+int FINUFFT_EXECUTE_REALIN(FINUFFT_PLAN p, FLT* in, CPX* out){
+/* See ../docs/cguru.doc for current documentation.
+   As FINUFFT_EXECUTE but with real-valued input: strengths cj (types 1,3) or
+   coefficients fk (type 2), which are never expanded to a complex copy.
+*/
+  if (p->opts.realmode && p->type==2) {
+    fprintf(stderr,"[%s] real-mode type 2 plan needs execute_realout.\n",__func__);
+    return ERR_REALMODE;
+  }
+  if (p->type==2)
+    return execute_internal(p, out, (CPX*)in, 1, 0);
+  else
+    return execute_internal(p, (CPX*)in, out, 1, 0);
+}
+
+int FINUFFT_EXECUTE_REALOUT(FINUFFT_PLAN p, CPX* in, FLT* out){
+/* See ../docs/cguru.doc for current documentation.
+   For a real-mode type 2 plan: reads complex coefficients fk (in), writes the
+   real part of the type 2 transform to the real array cj (out).
+*/
+  if (!p->opts.realmode || p->type!=2) {
+    fprintf(stderr,"[%s] only for real-mode type 2 plans.\n",__func__);
+    return ERR_REALMODE;
+  }
+  return execute_internal(p, (CPX*)out, in, 0, 0);
+}
+
+int FINUFFT_EXECUTE_ADJOINT(FINUFFT_PLAN p, CPX* cj, CPX* fk){
+/* See ../docs/cguru.doc for current documentation.
+   Adjoint of a type 1 or 2 plan, ie the other type with opposite sign, on
+   the same sorted NU pts and workspace.
+   For type 1: fk is input, cj is output.
+   For type 2: cj is input, fk is output.
+*/
+  if (p->type==3) {
+    fprintf(stderr,"[%s] adjoint only for type 1 and 2 plans.\n",__func__);
+    return ERR_TYPE_NOTVALID;
+  }
+  int ier = plan_adjoint_fft(p);
+  if (ier) return ier;
+  return execute_internal(p, cj, fk, 0, 1);
+}
+
+int FINUFFT_EXECUTE_NORMAL(FINUFFT_PLAN p, CPX* in, CPX* out, FLT* w){
+/* See ../docs/cguru.doc for current documentation.
+   Applies A^* W A, where A is the transform of the type 1 or 2 plan p and W
+   the diagonal of the (optional, else NULL) real weights w. For type 2, in
+   and out are coefficient arrays (size N*ntrans), w has size nj; for type 1
+   they are strength arrays (size nj*ntrans), w has size N. in and out may be
+   the same array. Each batch goes through the transform and its adjoint
+   before the next, so the intermediate only needs batchSize vectors.
+*/
+  if (p->type==3) {
+    fprintf(stderr,"[%s] normal operator only for type 1 and 2 plans.\n",__func__);
+    return ERR_TYPE_NOTVALID;
+  }
+  int ier = plan_adjoint_fft(p);
+  if (ier) return ier;
+  BIGINT nio = p->type==2 ? p->N : p->nj;     // size of each in/out vector
+  BIGINT nmid = p->type==2 ? p->nj : p->N;    // " intermediate vector
+  CPX* mid = (CPX*)malloc(sizeof(CPX)*nmid*p->batchSize);
+  if (!mid) {
+    fprintf(stderr,"[%s] malloc failed for intermediate batch!\n",__func__);
+    return ERR_ALLOC;
+  }
+  CNTime timer; timer.start();
+  double t[3] = {0.0, 0.0, 0.0};
+  for (int b=0; b*p->batchSize < p->ntrans; b++) { // .....loop b over batches
+    int thisBatchSize = min(p->ntrans - b*p->batchSize, p->batchSize);
+    int bB = b*p->batchSize;
+    CPX* inb = in + bB*nio;
+    CPX* outb = out + bB*nio;
+    int last = thisBatchSize<p->batchSize;      // (smaller last batch)
+    FFTPLAN* plan = last ? &p->fftwPlanLast : &p->fftwPlan;
+    FFTPLAN* planadj = last ? &p->fftwPlanAdjLast : &p->fftwPlanAdj;
+    if (p->type==2)
+      ier = exec12batch(p, 2, plan, thisBatchSize, mid, inb, 0, 0, t);
+    else
+      ier = exec12batch(p, 1, plan, thisBatchSize, inb, mid, 0, 0, t);
+    if (ier) break;
+    if (w) {
+#pragma omp parallel for num_threads(p->opts.nthreads)
+      for (int i=0; i<thisBatchSize; i++)
+        for (BIGINT j=0;j<nmid;++j)
+          mid[i*nmid+j] *= w[j];
+    }
+    if (p->type==2)
+      ier = exec12batch(p, 1, planadj, thisBatchSize, mid, outb, 0, 0, t);
+    else
+      ier = exec12batch(p, 2, planadj, thisBatchSize, outb, mid, 0, 0, t);
+    if (ier) break;
+  }                                                   // ........end b loop
+  free(mid);
+  if (ier) return ier;
+  if (p->opts.debug)
+    printf("[%s] done. tot sprint %.3g s, FFT %.3g s, deconvolve %.3g s\n",__func__,t[0],t[1],t[2]);
+  record12times(p, t, timer.elapsedsec(), 0);
+  return 0;
+}
+
+int FINUFFT_GET_STATS(FINUFFT_PLAN p, finufft_stats* stats){
+/* See ../docs/cguru.doc for current documentation.
+   Copies the timings and statistics of plan p (see finufft_stats.h), as
+   recorded by its makeplan, last setpts and last execute, to *stats.
+*/
+  if (!p || !stats)
+    return 1;
+  *stats = p->stats;
+  return 0;
+}
+
+int FINUFFT_EXECUTE_MANY(int nplans, FINUFFT_PLAN* plans, CPX** cj, CPX** fk,
+                         int nthreads){
+/* See ../docs/cguru.doc for current documentation.
+   Executes nplans distinct plans (each with its NU pts already set), plan i
+   on cj[i] and fk[i] as in FINUFFT_EXECUTE (or, for real-mode plans, with
+   real cj[i] as in FINUFFT_EXECUTE_REALIN/REALOUT), concurrently on nthreads
+   threads (0: all available), one plan per thread at a time. Meant for many
+   small unrelated transforms, made with opts.nthreads=1, whose individual
+   executes are too short to use several threads well.
+   Returns 0, or the first nonzero error code of any of the executes.
+*/
+  int nthr = MY_OMP_GET_MAX_THREADS();
+  if (nthreads>0)
+    nthr = nthreads;
+  int ier = 0;
+#pragma omp parallel for num_threads(nthr) schedule(dynamic,1)
+  for (int i=0; i<nplans; i++) {
+    int ieri;
+    if (plans[i]->opts.realmode && plans[i]->type==1)
+      ieri = FINUFFT_EXECUTE_REALIN(plans[i], (FLT*)cj[i], fk[i]);
+    else if (plans[i]->opts.realmode)
+      ieri = FINUFFT_EXECUTE_REALOUT(plans[i], fk[i], (FLT*)cj[i]);
+    else
+      ieri = FINUFFT_EXECUTE(plans[i], cj[i], fk[i]);
+    if (ieri) {
+#pragma omp critical
+      if (!ier) ier = ieri;
+    }
+  }
+  return ier;
+}
+
 
 // DDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDDD
 int FINUFFT_DESTROY(FINUFFT_PLAN p)
@@ -1091,8 +2291,23 @@ int FINUFFT_DESTROY(FINUFFT_PLAN p)
     return 1;
   FFTW_FR(p->fwBatch);   // free the big FFTW (or t3 spread) working array
   free(p->sortIndices);
+  free(p->sortPos);
+  free(p->binStart);
+  if (p->Xs) FFTW_FR(p->Xs);
+  if (p->kerTab) FFTW_FR(p->kerTab);
+  free(p->interpCols);
+  if (p->interpVals) FFTW_FR(p->interpVals);
+  for (int k=0; k<p->nSpreadScratch; ++k)
+    arenas_free(p->spreadScratch + k);
+  free(p->spreadScratch);
   if (p->type==1 || p->type==2) {
-    FFTW_DE(p->fftwPlan);
+    destroy_fft(&p->fftwPlan);
+    destroy_fft(&p->fftwPlanAdj);
+    destroy_fft(&p->fftwPlanPipe);
+    destroy_fft(&p->fftwPlanLast);
+    destroy_fft(&p->fftwPlanAdjLast);
+    destroy_fft(&p->fftwPlanPipeLast);
+    if (p->fwBatch2) FFTW_FR(p->fwBatch2);
     free(p->phiHat1);
     free(p->phiHat2);
     free(p->phiHat3);
@@ -1107,3 +2322,114 @@ int FINUFFT_DESTROY(FINUFFT_PLAN p)
   free(p);
   return 0;              // success
 }
+
+
+// WWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWWW
+int FINUFFT_IMPORT_WISDOM(const char* filename)
+// Read FFTW wisdom (accumulated plans, eg from a previous process using
+// opts.fftw=FFTW_MEASURE) from file, so that later makeplan calls with the
+// same grid sizes, batch size and threads plan at almost no cost.
+// Wisdom is per precision: finufftf_* reads/writes single-precision wisdom.
+// Returns 0 if success, else ERR_FFTW_WISDOM.
+{
+  int ok;
+#pragma omp critical
+  {
+    fftw_init_once();                  // so threaded plans can be read
+    ok = FFTW_IMPORT_WIS(filename);    // FFTW planner is not thread-safe
+  }
+  if (!ok) {
+    fprintf(stderr,"[%s] failed to import FFTW wisdom from %s\n",__func__,filename);
+    return ERR_FFTW_WISDOM;
+  }
+  return 0;
+}
+
+int FINUFFT_EXPORT_WISDOM(const char* filename)
+// Write all FFTW wisdom accumulated so far in this process to file, eg after
+// makeplan with opts.fftw=FFTW_MEASURE. Returns 0 if success, else
+// ERR_FFTW_WISDOM.
+{
+  int ok;
+#pragma omp critical
+  {
+    fftw_init_once();
+    ok = FFTW_EXPORT_WIS(filename);
+  }
+  if (!ok) {
+    fprintf(stderr,"[%s] failed to export FFTW wisdom to %s\n",__func__,filename);
+    return ERR_FFTW_WISDOM;
+  }
+  return 0;
+}
+
+int FINUFFT_EXPORT_TUNING(const char* filename)
+// Write the table of sort bin sizes and threads chosen by timing (plans with
+// opts.spread_bin_tune=2) so far in this process to a text file, one line
+// per problem size, to be read by finufft_import_tuning in a later process.
+// The table is per precision, as for wisdom. Returns 0 if success, else
+// ERR_BIN_TUNING.
+{
+  FILE* f = fopen(filename, "w");
+  if (!f) {
+    fprintf(stderr,"[%s] failed to open %s\n",__func__,filename);
+    return ERR_BIN_TUNING;
+  }
+  int ok;
+#pragma omp critical (finufft_tuning)
+  {
+    ok = fprintf(f, "# finufft bin tuning (%s): nf1 nf2 nf3 log2M w nthr dir"
+                 " bx by bz sort_nthr\n", sizeof(FLT)==4 ? "single" : "double")>0;
+    for (std::map<bin_tuning_key, bin_tuning>::iterator it=tuned_bins.begin();
+         it!=tuned_bins.end(); ++it) {
+      const bin_tuning_key& k = it->first;
+      const bin_tuning& b = it->second;
+      ok = ok && fprintf(f, "%lld %lld %lld %lld %lld %lld %lld %g %g %g %d\n",
+                         k[0],k[1],k[2],k[3],k[4],k[5],k[6],
+                         b.bx,b.by,b.bz,b.sort_nthr)>0;
+    }
+  }
+  if (fclose(f) || !ok) {
+    fprintf(stderr,"[%s] failed to write %s\n",__func__,filename);
+    return ERR_BIN_TUNING;
+  }
+  return 0;
+}
+
+int FINUFFT_IMPORT_TUNING(const char* filename)
+// Read a file written by finufft_export_tuning (in the same precision) into
+// the table of timed bin choices, so that plans with opts.spread_bin_tune=2
+// of those sizes use them without timing. Entries already in the table are
+// overwritten. Returns 0 if success, else ERR_BIN_TUNING (nothing read).
+{
+  FILE* f = fopen(filename, "r");
+  if (!f) {
+    fprintf(stderr,"[%s] failed to open %s\n",__func__,filename);
+    return ERR_BIN_TUNING;
+  }
+  char line[256], prec[16];
+  std::map<bin_tuning_key, bin_tuning> read;
+  bool ok = fgets(line, sizeof(line), f) &&
+    sscanf(line, "# finufft bin tuning (%15[a-z])", prec)==1 &&
+    !strcmp(prec, sizeof(FLT)==4 ? "single" : "double");
+  while (ok && fgets(line, sizeof(line), f)) {
+    bin_tuning_key k;
+    bin_tuning b;
+    ok = sscanf(line, "%lld %lld %lld %lld %lld %lld %lld %lf %lf %lf %d",
+                &k[0],&k[1],&k[2],&k[3],&k[4],&k[5],&k[6],
+                &b.bx,&b.by,&b.bz,&b.sort_nthr)==11 &&
+      b.bx>0 && b.by>0 && b.bz>0 && b.sort_nthr>=0;
+    read[k] = b;
+  }
+  fclose(f);
+  if (!ok) {
+    fprintf(stderr,"[%s] %s is not a %s precision bin tuning file\n",__func__,
+            filename, sizeof(FLT)==4 ? "single" : "double");
+    return ERR_BIN_TUNING;
+  }
+#pragma omp critical (finufft_tuning)
+  for (std::map<bin_tuning_key, bin_tuning>::iterator it=read.begin();
+       it!=read.end(); ++it)
+    tuned_bins[it->first] = it->second;
+  return 0;
+}
@@ -14,30 +14,46 @@ using namespace std;
 static inline void set_kernel_args(FLT *args, FLT x, const spread_opts& opts);
 static inline void evaluate_kernel_vector(FLT *ker, FLT *args, const spread_opts& opts, const int N);
 static inline void eval_kernel_vec_Horner(FLT *ker, const FLT z, const int w, const spread_opts &opts);
+template<int nc>
 void interp_line(FLT *out,FLT *du, FLT *ker,BIGINT i1,BIGINT N1,int ns);
+template<int nc>
 void interp_square(FLT *out,FLT *du, FLT *ker1, FLT *ker2, BIGINT i1,BIGINT i2,BIGINT N1,BIGINT N2,int ns);
+template<int nc>
 void interp_cube(FLT *out,FLT *du, FLT *ker1, FLT *ker2, FLT *ker3,
 		 BIGINT i1,BIGINT i2,BIGINT i3,BIGINT N1,BIGINT N2,BIGINT N3,int ns);
+template<int nc>
+void spread_wrapped(FLT *du, FLT re0, FLT im0, FLT *ker1, FLT *ker2,
+                    FLT *ker3, BIGINT i1, BIGINT i2, BIGINT i3, BIGINT N1,
+                    BIGINT N2, BIGINT N3, int ndims, int ns, BIGINT lo,
+                    BIGINT hi);
+static int spreadLowDensity(BIGINT* sort_indices, BIGINT N1, BIGINT N2,
+                            BIGINT N3, FLT *data_uniform, BIGINT M, FLT *kx,
+                            FLT *ky, FLT *kz, FLT *data_nonuniform,
+                            const spread_opts& opts, int nthr, FLT *ktab);
 void spread_subproblem_1d(BIGINT off1, BIGINT size1,FLT *du0,BIGINT M0,FLT *kx0,
-                          FLT *dd0,const spread_opts& opts);
+                          FLT *dd0,const spread_opts& opts, FLT *ktab);
 void spread_subproblem_2d(BIGINT off1, BIGINT off2, BIGINT size1,BIGINT size2,
                           FLT *du0,BIGINT M0,
-			  FLT *kx0,FLT *ky0,FLT *dd0,const spread_opts& opts);
+			  FLT *kx0,FLT *ky0,FLT *dd0,const spread_opts& opts,
+                          FLT *ktab);
 void spread_subproblem_3d(BIGINT off1,BIGINT off2, BIGINT off3, BIGINT size1,
                           BIGINT size2,BIGINT size3,FLT *du0,BIGINT M0,
 			  FLT *kx0,FLT *ky0,FLT *kz0,FLT *dd0,
-			  const spread_opts& opts);
+			  const spread_opts& opts, FLT *ktab);
+static void kernel_row(FLT *row, FLT x, FLT y, FLT z, int ndims,
+                       const spread_opts& opts);
+static void matrix_row(BIGINT *cols, FLT *vals, FLT x, FLT y, FLT z,
+                       BIGINT N1, BIGINT N2, BIGINT N3, int ndims,
+                       const spread_opts& opts);
 void add_wrapped_subgrid(BIGINT offset1,BIGINT offset2,BIGINT offset3,
 			 BIGINT size1,BIGINT size2,BIGINT size3,BIGINT N1,
-			 BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0);
+			 BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0, int nc);
 void add_wrapped_subgrid_thread_safe(BIGINT offset1,BIGINT offset2,BIGINT offset3,
                                      BIGINT size1,BIGINT size2,BIGINT size3,BIGINT N1,
-                                     BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0);
-void bin_sort_singlethread(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-	      BIGINT N1,BIGINT N2,BIGINT N3,int pirange,
-	      double bin_size_x,double bin_size_y,double bin_size_z, int debug);
-void bin_sort_multithread(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-	      BIGINT N1,BIGINT N2,BIGINT N3,int pirange,
+                                     BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0,
+                                     int nc);
+void bin_sort(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
+              BIGINT N1,BIGINT N2,BIGINT N3,int pirange,
               double bin_size_x,double bin_size_y,double bin_size_z, int debug,
               int nthr);
 void get_subgrid(BIGINT &offset1,BIGINT &offset2,BIGINT &offset3,BIGINT &size1,
@@ -59,6 +75,18 @@ void get_subgrid(BIGINT &offset1,BIGINT &offset2,BIGINT &offset3,BIGINT &size1,
          (x + (x>=-PI ? (x<PI ? PI : -PI) : 3*PI)) * ((FLT)M_1_2PI*N) : \
                         (x>=0.0 ? (x<(FLT)N ? x : x-(FLT)N) : x+(FLT)N))
 
+// default binning box sizes (in U grid pts) used by indexSort and
+// indexSortUpdate, unless opts.bin_size_* are changed after setup_spreader
+#define BIN_SIZE_X 16.0
+#define BIN_SIZE_Y 4.0
+#define BIN_SIZE_Z 4.0
+// bin_sort's max number of superbins (groups of bins) of its first pass
+#define MAX_SUPERBINS 65536
+// low density: fewer than 1 NU pt per this many U grid pts, where spreading
+// writes each NU pt straight to the grid (spreadLowDensity), and its NU pts
+// are not sorted (those for interpolation still are)
+#define LOW_DENSITY 1000
+
 
 
 // ==========================================================================
@@ -147,10 +175,11 @@ int spreadinterp(
     return ERR_SPREAD_ALLOC;
   }
   int did_sort = indexSort(sort_indices, N1, N2, N3, M, kx, ky, kz, opts);
-  spreadinterpSorted(sort_indices, N1, N2, N3, data_uniform,
-                     M, kx, ky, kz, data_nonuniform, opts, did_sort);
+  ier = spreadinterpSorted(sort_indices, N1, N2, N3, data_uniform,
+                           M, kx, ky, kz, data_nonuniform, opts, did_sort, NULL,
+                           NULL);
   free(sort_indices);
-  return 0;
+  return ier;
 }
 
 static int ndims_from_Ns(BIGINT N1, BIGINT N2, BIGINT N3)
@@ -220,8 +249,9 @@ int spreadcheck(BIGINT N1, BIGINT N2, BIGINT N3, BIGINT M, FLT *kx, FLT *ky,
 int indexSort(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3, BIGINT M, 
                FLT *kx, FLT *ky, FLT *kz, spread_opts opts)
 /* This makes a decision whether or not to sort the NU pts (influenced by
-   opts.sort), and if yes, calls either single- or multi-threaded bin sort,
-   writing reordered index list to sort_indices. If decided not to sort, the
+   opts.sort), and if yes, calls the bin sort (with opts.sort_threads threads,
+   or if 0 a number chosen by its cost model), writing reordered index list to
+   sort_indices. If decided not to sort, the
    identity permutation is written to sort_indices.
    The permutation is designed to make RAM access close to contiguous, to
    speed up spreading/interpolation, in the case of disordered NU points.
@@ -247,13 +277,15 @@ int indexSort(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3, BIGINT M,
 {
   CNTime timer;
   int ndims = ndims_from_Ns(N1,N2,N3);
-  BIGINT N=N1*N2*N3;            // U grid (periodic box) sizes
   
-  // heuristic binning box size for U grid... affects performance:
-  double bin_size_x = 16, bin_size_y = 4, bin_size_z = 4;
-  // put in heuristics based on cache sizes (only useful for single-thread) ?
+  // binning box size for U grid (default, or tuned by caller)... affects
+  // performance only:
+  double bin_size_x = opts.bin_size_x, bin_size_y = opts.bin_size_y;
+  double bin_size_z = opts.bin_size_z;
 
   int better_to_sort = !(ndims==1 && (opts.spread_direction==2 || (M > 1000*N1))); // 1D small-N or dir=2 case: don't sort
+  if (opts.spread_direction==1 && M*LOW_DENSITY < N1*N2*N3)
+    better_to_sort = 0;  // low-density spread: pts seldom share cache lines
 
   timer.start();                 // if needed, sort all the NU pts...
   int did_sort=0;
@@ -265,12 +297,13 @@ int indexSort(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3, BIGINT M,
     // store a good permutation ordering of all NU pts (dim=1,2 or 3)
     int sort_debug = (opts.debug>=2);    // show timing output?
     int sort_nthr = opts.sort_threads;   // choose # threads for sorting
-    if (sort_nthr==0)   // use auto choice: when N>>M, one thread is better!
-      sort_nthr = (10*M>N) ? maxnthr : 1;      // heuristic
-    if (sort_nthr==1)
-      bin_sort_singlethread(sort_indices,M,kx,ky,kz,N1,N2,N3,opts.pirange,bin_size_x,bin_size_y,bin_size_z,sort_debug);
-    else                                      // sort_nthr>1, sets # threads
-      bin_sort_multithread(sort_indices,M,kx,ky,kz,N1,N2,N3,opts.pirange,bin_size_x,bin_size_y,bin_size_z,sort_debug,sort_nthr);
+    if (sort_nthr==0) {  // auto choice: minimize bin_sort's cost model
+      double nbins = (N1/bin_size_x+1) * (N2>1 ? N2/bin_size_y+1 : 1) *
+        (N3>1 ? N3/bin_size_z+1 : 1);    // (M+nbins)/nthr + nthr*superbins
+      sort_nthr = (int)sqrt((M+nbins)/MAX_SUPERBINS);
+      sort_nthr = max(1,min(maxnthr,sort_nthr));
+    }
+    bin_sort(sort_indices,M,kx,ky,kz,N1,N2,N3,opts.pirange,bin_size_x,bin_size_y,bin_size_z,sort_debug,sort_nthr);
     if (opts.debug) 
       printf("\tsorted (%d threads):\t%.3g s\n",sort_nthr,timer.elapsedsec());
     did_sort=1;
@@ -285,35 +318,491 @@ int indexSort(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3, BIGINT M,
 }
 
 
+static inline BIGINT bin_of(FLT x, FLT y, FLT z, BIGINT N1, BIGINT N2,
+                            BIGINT N3, const spread_opts& opts)
+// Index of the bin of the NU pt (x,y,z) in the bin sort used by indexSort.
+// y (z) is ignored if N2=1 (N3=1). Must match bin_sort.
+{
+  int pirange = opts.pirange;
+  BIGINT nbins1 = N1/opts.bin_size_x+1;
+  BIGINT nbins2 = (N2>1) ? N2/opts.bin_size_y+1 : 1;
+  BIGINT i1=FOLDRESCALE(x,N1,pirange)/opts.bin_size_x, i2=0, i3=0;
+  if (N2>1) i2 = FOLDRESCALE(y,N2,pirange)/opts.bin_size_y;
+  if (N3>1) i3 = FOLDRESCALE(z,N3,pirange)/opts.bin_size_z;
+  return i1+nbins1*(i2+nbins2*i3);
+}
+
+BIGINT* indexSortBins(BIGINT* sort_pos, BIGINT* sort_indices, BIGINT N1,
+                      BIGINT N2, BIGINT N3, BIGINT M, FLT *kx, FLT *ky,
+                      FLT *kz, spread_opts opts)
+/* Given the bin-sorted permutation sort_indices written by indexSort (when it
+   sorted) for the NU pts kx,ky,kz (same inputs as indexSort), builds the
+   state needed by indexSortUpdate to patch it when a few points move:
+   writes to sort_pos (preallocated length M) the inverse permutation, ie
+   sort_indices[sort_pos[j]] = j, and returns a newly malloc'ed array (NULL
+   if malloc failed) of length nbins+1 whose b'th entry is the start in
+   sort_indices of the b'th bin, the last entry being M. Cost O(M + nbins).
+*/
+{
+  BIGINT nbins = (BIGINT)(N1/opts.bin_size_x+1) *
+    ((N2>1) ? (BIGINT)(N2/opts.bin_size_y+1) : 1) *
+    ((N3>1) ? (BIGINT)(N3/opts.bin_size_z+1) : 1);
+  BIGINT* bin_start = (BIGINT*)calloc(nbins+1, sizeof(BIGINT));
+  if (!bin_start)
+    return NULL;
+  int nthr = MY_OMP_GET_MAX_THREADS();
+  if (opts.nthreads>0)
+    nthr = min(nthr,opts.nthreads);
+#pragma omp parallel for num_threads(nthr) schedule(static)
+  for (BIGINT i=0; i<M; i++)
+    sort_pos[sort_indices[i]] = i;
+  for (BIGINT j=0; j<M; j++)           // count pts per bin
+    bin_start[1+bin_of(kx[j], (N2>1) ? ky[j] : 0, (N3>1) ? kz[j] : 0,
+                       N1,N2,N3,opts)]++;
+  for (BIGINT b=0; b<nbins; b++)       // cumsum
+    bin_start[b+1] += bin_start[b];
+  return bin_start;
+}
+
+void foldCoords(FLT *fx, FLT *fy, FLT *fz, BIGINT* dst, BIGINT* src,
+                BIGINT n, BIGINT N1, BIGINT N2, BIGINT N3, FLT *kx, FLT *ky,
+                FLT *kz, spread_opts opts)
+/* Writes folded and rescaled coords of NU pts (as used by the spreader, in
+   [0,N1] etc), for the spreader to use instead of kx,ky,kz when
+   opts.presorted=1: fx[dst[i]] = FOLDRESCALE(kx[src[i]]) for i=0,..,n-1,
+   and the same for fy from ky if N2>1, fz from kz if N3>1. dst (src) NULL
+   means the identity. Eg dst=NULL, src=sort_indices from indexSort, n=M,
+   gives the pts in sorted order, which is what presorted means.
+*/
+{
+  int nthr = MY_OMP_GET_MAX_THREADS();
+  if (opts.nthreads>0)
+    nthr = min(nthr,opts.nthreads);
+  if (n<10000) nthr = 1;            // not worth it
+#pragma omp parallel for num_threads(nthr) schedule(static)
+  for (BIGINT i=0; i<n; i++) {
+    BIGINT d = dst ? dst[i] : i, s = src ? src[i] : i;
+    fx[d] = FOLDRESCALE(kx[s],N1,opts.pirange);
+    if (N2>1) fy[d] = FOLDRESCALE(ky[s],N2,opts.pirange);
+    if (N3>1) fz[d] = FOLDRESCALE(kz[s],N3,opts.pirange);
+  }
+}
+
+void kernelTable(FLT *ktab, BIGINT* dst, BIGINT* src, BIGINT n, BIGINT N1,
+                 BIGINT N2, BIGINT N3, FLT *kx, FLT *ky, FLT *kz,
+                 spread_opts opts)
+/* Writes the spreading kernel values of NU pts, for spreadinterpSorted to use
+   instead of evaluating the kernel: row dst[i] of ktab, of ndims*nspread
+   FLTs (the x values, then y, then z), is for NU pt src[i], i=0,..,n-1. The
+   values are exactly those the spreader would evaluate (see kernel_row).
+   dst (src) NULL means the identity; as for foldCoords, dst=NULL,
+   src=sort_indices, n=M gives the table in sorted order, as used.
+*/
+{
+  int ndims = ndims_from_Ns(N1,N2,N3);
+  int ns = opts.nspread;
+  int nthr = MY_OMP_GET_MAX_THREADS();
+  if (opts.nthreads>0)
+    nthr = min(nthr,opts.nthreads);
+  if (n<1000) nthr = 1;             // not worth it
+#pragma omp parallel for num_threads(nthr) schedule(static)
+  for (BIGINT i=0; i<n; i++) {
+    BIGINT d = dst ? dst[i] : i, s = src ? src[i] : i;
+    kernel_row(ktab + (BIGINT)ndims*ns*d, FOLDRESCALE(kx[s],N1,opts.pirange),
+               (N2>1) ? FOLDRESCALE(ky[s],N2,opts.pirange) : 0,
+               (N3>1) ? FOLDRESCALE(kz[s],N3,opts.pirange) : 0, ndims, opts);
+  }
+}
+
+void interpMatrix(BIGINT *cols, FLT *vals, BIGINT* dst, BIGINT* src, BIGINT n,
+                  BIGINT N1, BIGINT N2, BIGINT N3, FLT *kx, FLT *ky, FLT *kz,
+                  spread_opts opts)
+/* Writes rows of the interpolation matrix, the sparse M-by-(N1*N2*N3) matrix
+   A such that interpolation is data_nonuniform = A*data_uniform (and
+   spreading is data_uniform = A^T*data_nonuniform). Each row has exactly
+   nnzrow = nspread^ndims entries (the tensor product kernel), so it is stored
+   as CSR with implicit row starts nnzrow*r: row r has column indices (into
+   the uniform grid, x fastest, periodically wrapped) cols[nnzrow*r+k] and
+   values vals[nnzrow*r+k], k=0,..,nnzrow-1, in the order interp_{line,square,
+   cube} visit them. Row dst[i] is written for NU pt src[i], i=0,..,n-1; dst
+   (src) NULL means the identity, so dst=src=NULL, n=M gives A in user order,
+   while dst=NULL, src=sort_indices gives it with rows in sorted order, as
+   interpCSR uses it.
+*/
+{
+  int ndims = ndims_from_Ns(N1,N2,N3);
+  BIGINT nnzrow = 1;
+  for (int d=0; d<ndims; d++)
+    nnzrow *= opts.nspread;
+  int nthr = MY_OMP_GET_MAX_THREADS();
+  if (opts.nthreads>0)
+    nthr = min(nthr,opts.nthreads);
+  if (n<1000) nthr = 1;             // not worth it
+#pragma omp parallel for num_threads(nthr) schedule(static)
+  for (BIGINT i=0; i<n; i++) {
+    BIGINT d = dst ? dst[i] : i, s = src ? src[i] : i;
+    matrix_row(cols + nnzrow*d, vals + nnzrow*d,
+               FOLDRESCALE(kx[s],N1,opts.pirange),
+               (N2>1) ? FOLDRESCALE(ky[s],N2,opts.pirange) : 0,
+               (N3>1) ? FOLDRESCALE(kz[s],N3,opts.pirange) : 0,
+               N1, N2, N3, ndims, opts);
+  }
+}
+
+void interpCSR(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3,
+               FLT *data_uniform, BIGINT M, BIGINT *cols, FLT *vals,
+               FLT *data_nonuniform, spread_opts opts)
+/* Interpolates from the uniform grid to the M NU pts as a sparse
+   matrix-vector product with their interpolation matrix, stored with rows in
+   sorted order (see interpMatrix), instead of evaluating the kernel: row r
+   gives data_nonuniform[sort_indices[r]]. The inputs and outputs are as for
+   interpSorted (complex, or real if opts.realgrid).
+*/
+{
+  int ndims = ndims_from_Ns(N1,N2,N3);
+  BIGINT nnzrow = 1;
+  for (int d=0; d<ndims; d++)
+    nnzrow *= opts.nspread;
+  int nc = opts.realgrid ? 1 : 2;
+  int nthr = MY_OMP_GET_MAX_THREADS();
+  if (opts.nthreads>0)
+    nthr = min(nthr,opts.nthreads);
+  if (opts.debug)
+    printf("\tinterp CSR %dD (M=%lld; N1=%lld,N2=%lld,N3=%lld), nthr=%d\n",ndims,(long long)M,(long long)N1,(long long)N2,(long long)N3,nthr);
+  CNTime timer; timer.start();
+#pragma omp parallel for num_threads(nthr) schedule(static)
+  for (BIGINT r=0; r<M; r++) {
+    BIGINT *c = cols + nnzrow*r;
+    FLT *v = vals + nnzrow*r;
+    BIGINT j = sort_indices[r];
+    if (nc==1) {
+      FLT out = 0.0;
+      for (BIGINT k=0; k<nnzrow; k++)
+        out += data_uniform[c[k]]*v[k];
+      data_nonuniform[j] = out;
+    } else {
+      FLT out[] = {0.0, 0.0};
+      for (BIGINT k=0; k<nnzrow; k++) {
+        out[0] += data_uniform[2*c[k]]*v[k];
+        out[1] += data_uniform[2*c[k]+1]*v[k];
+      }
+      data_nonuniform[2*j] = out[0];
+      data_nonuniform[2*j+1] = out[1];
+    }
+  }
+  if (opts.debug) printf("\tt2 CSR interp:\t\t%.3g s\n",timer.elapsedsec());
+}
+
+BIGINT indexSortUpdate(BIGINT* sort_indices, BIGINT* sort_pos,
+                       BIGINT* bin_start, BIGINT N1, BIGINT N2, BIGINT N3,
+                       BIGINT M, FLT *kx, FLT *ky, FLT *kz, BIGINT n,
+                       BIGINT* ind, FLT *x, FLT *y, FLT *z, spread_opts opts,
+                       FLT *fx, FLT *fy, FLT *fz, FLT *ktab,
+                       BIGINT *mcols, FLT *mvals)
+/* Moves the n NU pts of indices ind[0..n-1] to new coords x,y,z (length-n,
+   bounds-checked already; y, z only read if N2>1, N3>1), overwriting their
+   entries in kx,ky,kz, and patches the bin-sorted permutation sort_indices,
+   its inverse sort_pos and the bin starts bin_start (from indexSortBins) so
+   that it remains sorted by bin. A pt changing bin is carried there by a
+   chain of swaps with the end (or start) of each bin in between, shifting each
+   bin boundary crossed by one, so the cost is O(n + bins crossed) rather than
+   the O(M) of a full indexSort. (The order within a bin is irrelevant.)
+   Repeated indices are allowed (the last coords win).
+   If fx is not NULL, the sorted folded coords fx,fy,fz (see foldCoords) are
+   kept in step with the permutation, and likewise the rows of the kernel
+   table ktab (see kernelTable) if it is not NULL, and those of the sorted
+   interpolation matrix mcols, mvals (see interpMatrix) if they are not NULL.
+
+   Returns the number of bin boundaries crossed, or -1 (having changed
+   nothing) if that would be more than M, in which case a full indexSort is
+   cheaper and is left to the caller.
+*/
+{
+  int pir = opts.pirange;
+  bool isky=(N2>1), iskz=(N3>1);
+  int ndims = ndims_from_Ns(N1,N2,N3);
+  BIGINT nrow = (BIGINT)ndims*opts.nspread;   // FLTs per row of ktab
+  BIGINT nnzrow = 1;                          // entries per row of mcols
+  for (int d=0; d<ndims; d++)
+    nnzrow *= opts.nspread;
+  BIGINT cost = 0;                  // estimate, exact if ind has no repeats
+  for (BIGINT i=0; i<n; i++) {
+    BIGINT j = ind[i];
+    BIGINT a = bin_of(kx[j], isky ? ky[j] : 0, iskz ? kz[j] : 0, N1,N2,N3,opts);
+    BIGINT b = bin_of(x[i], isky ? y[i] : 0, iskz ? z[i] : 0, N1,N2,N3,opts);
+    cost += (b>a) ? b-a : a-b;
+    if (cost>M)
+      return -1;
+  }
+  BIGINT crossed = 0;
+  for (BIGINT i=0; i<n; i++) {
+    BIGINT j = ind[i];
+    BIGINT a = bin_of(kx[j], isky ? ky[j] : 0, iskz ? kz[j] : 0, N1,N2,N3,opts);
+    kx[j] = x[i];
+    if (isky) ky[j] = y[i];
+    if (iskz) kz[j] = z[i];
+    BIGINT b = bin_of(kx[j], isky ? ky[j] : 0, iskz ? kz[j] : 0, N1,N2,N3,opts);
+    BIGINT q = sort_pos[j];         // where pt j is, always inside bin c
+    // (j itself is only written at the end, so skip the swap if already there)
+    for (BIGINT c=a; c<b; c++) {    // move up: swap to end of bin c, which
+      BIGINT e = --bin_start[c+1];  // then becomes the start of bin c+1
+      if (e!=q) {
+        BIGINT k = sort_indices[e];
+        sort_indices[q] = k; sort_pos[k] = q;
+        if (fx) {
+          fx[q] = fx[e];
+          if (isky) fy[q] = fy[e];
+          if (iskz) fz[q] = fz[e];
+        }
+        if (ktab)
+          for (BIGINT r=0; r<nrow; r++)
+            ktab[nrow*q+r] = ktab[nrow*e+r];
+        if (mcols)
+          for (BIGINT r=0; r<nnzrow; r++) {
+            mcols[nnzrow*q+r] = mcols[nnzrow*e+r];
+            mvals[nnzrow*q+r] = mvals[nnzrow*e+r];
+          }
+        q = e;
+      }
+    }
+    for (BIGINT c=a; c>b; c--) {    // move down: swap to start of bin c, which
+      BIGINT s = bin_start[c]++;    // then becomes the end of bin c-1
+      if (s!=q) {
+        BIGINT k = sort_indices[s];
+        sort_indices[q] = k; sort_pos[k] = q;
+        if (fx) {
+          fx[q] = fx[s];
+          if (isky) fy[q] = fy[s];
+          if (iskz) fz[q] = fz[s];
+        }
+        if (ktab)
+          for (BIGINT r=0; r<nrow; r++)
+            ktab[nrow*q+r] = ktab[nrow*s+r];
+        if (mcols)
+          for (BIGINT r=0; r<nnzrow; r++) {
+            mcols[nnzrow*q+r] = mcols[nnzrow*s+r];
+            mvals[nnzrow*q+r] = mvals[nnzrow*s+r];
+          }
+        q = s;
+      }
+    }
+    sort_indices[q] = j; sort_pos[j] = q;
+    if (fx) {
+      fx[q] = FOLDRESCALE(kx[j],N1,pir);
+      if (isky) fy[q] = FOLDRESCALE(ky[j],N2,pir);
+      if (iskz) fz[q] = FOLDRESCALE(kz[j],N3,pir);
+    }
+    if (ktab)
+      kernel_row(ktab + nrow*q, FOLDRESCALE(kx[j],N1,pir),
+                 isky ? FOLDRESCALE(ky[j],N2,pir) : 0,
+                 iskz ? FOLDRESCALE(kz[j],N3,pir) : 0, ndims, opts);
+    if (mcols)
+      matrix_row(mcols + nnzrow*q, mvals + nnzrow*q, FOLDRESCALE(kx[j],N1,pir),
+                 isky ? FOLDRESCALE(ky[j],N2,pir) : 0,
+                 iskz ? FOLDRESCALE(kz[j],N3,pir) : 0, N1,N2,N3, ndims, opts);
+    crossed += (b>a) ? b-a : a-b;
+  }
+  return crossed;
+}
+
+
 int spreadinterpSorted(BIGINT* sort_indices, BIGINT N1, BIGINT N2, BIGINT N3, 
 		      FLT *data_uniform, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-		      FLT *data_nonuniform, spread_opts opts, int did_sort)
+		      FLT *data_nonuniform, spread_opts opts, int did_sort,
+                      thread_arenas* scratch, FLT *ktab)
 /* Logic to select the main spreading (dir=1) vs interpolation (dir=2) routine.
-   See spreadinterp() above for inputs arguments and definitions.
-   Return value should always be 0 (no error reporting).
+   See spreadinterp() above for inputs arguments and definitions, and
+   spreadSorted for scratch (reusable per-thread workspace, or NULL).
+   ktab is the table of kernel values of the NU pts in sorted order (see
+   kernelTable), used instead of evaluating the kernel, or NULL.
+   Return value is 0, or ERR_SPREAD_ALLOC if the spreading workspace failed.
    Split out by Melody Shih, Jun 2018; renamed Barnett 5/20/20.
 */
 {
   if (opts.spread_direction==1)  // ========= direction 1 (spreading) =======
-    spreadSorted(sort_indices, N1, N2, N3, data_uniform, M, kx, ky, kz, data_nonuniform, opts, did_sort);
+    return spreadSorted(sort_indices, N1, N2, N3, data_uniform, M, kx, ky, kz, data_nonuniform, opts, did_sort, scratch, ktab);
   
   else           // ================= direction 2 (interpolation) ===========
-    interpSorted(sort_indices, N1, N2, N3, data_uniform, M, kx, ky, kz, data_nonuniform, opts, did_sort);
+    interpSorted(sort_indices, N1, N2, N3, data_uniform, M, kx, ky, kz, data_nonuniform, opts, did_sort, ktab);
   
   return 0;
 }
 
 
+static bool partition_subprobs(std::vector<BIGINT>& brk,
+                               std::vector<BIGINT>& sublen,
+                               std::vector<BIGINT>& gbrk,
+                               std::vector<BIGINT>& pbrk, BIGINT* sort_indices,
+                               BIGINT N1, BIGINT N2, BIGINT N3, BIGINT M,
+                               FLT *kx, FLT *ky, FLT *kz, int nthr,
+                               const spread_opts& opts)
+/* Sets up the subproblems of spreadSorted for lock-free writing (see there for
+   brk, sublen, gbrk, pbrk), given the bin-sorted NU pts. The grid is cut
+   along its slowest dim S (z in 3D, y in 2D, x in 1D) into an even number of
+   slabs, and in 2D, 3D each slab along the next dim T (y in 3D, x in 2D) into
+   an even number of tiles (or one), on sort bin boundaries, each tile wider
+   than ns+3 grid pts in both. Thus the subgrids of the NU pts in tiles whose
+   slab and T indices have the same parities (a "color") do not overlap, even
+   with periodic wrapping, so the (up to 4) colors can be spread in phases,
+   each tile of a phase by one thread, writing straight to the output grid.
+   The NU pts of a tile are its runs of consecutive sorted pts (one per bin
+   row, since sorted by bin with S slowest, then T), each a subproblem (split
+   to keep within opts.max_subproblem_size). Each run is assigned by the
+   coords of its own pts, so correctness does not rely on the sort, which only
+   makes the runs long. Tiles are counted to give each phase some 2*nthr.
+   Returns false (having set nothing) if the grid is too small for two slabs.
+*/
+{
+  int ndims = ndims_from_Ns(N1,N2,N3);
+  int ns = opts.nspread;
+  // the dims S (slabs) and T (tiles in a slab), as in bin_of...
+  BIGINT NS = (ndims==3) ? N3 : (ndims==2) ? N2 : N1;
+  double bsS = (ndims==3) ? opts.bin_size_z : (ndims==2) ? opts.bin_size_y :
+    opts.bin_size_x;
+  FLT *kS = (ndims==3) ? kz : (ndims==2) ? ky : kx;
+  BIGINT NT = (ndims==3) ? N2 : N1;
+  double bsT = (ndims==3) ? opts.bin_size_y : opts.bin_size_x;
+  FLT *kT = (ndims==3) ? ky : kx;
+  // numbers of slabs nsS and tiles per slab nsT, even (or nsT=1)...
+  BIGINT nfullS = (BIGINT)(NS/bsS), minbS = (BIGINT)ceil((ns+4)/bsS);
+  BIGINT nsS = min(nfullS/minbS, (BIGINT)((ndims==1) ? 4*nthr : 2*nthr));
+  nsS -= nsS%2;
+  if (nsS<2)
+    return false;
+  BIGINT nfullT = 0, nsT = 1;
+  if (ndims>1) {
+    nfullT = (BIGINT)(NT/bsT);
+    BIGINT minbT = (BIGINT)ceil((ns+4)/bsT);
+    BIGINT want = (8*(BIGINT)nthr + nsS-1)/nsS;      // tiles per slab
+    nsT = min(nfullT/minbT, want + want%2);
+    nsT -= nsT%2;
+    if (nsT<2) nsT = 1;
+  }
+  // slab (tile) index of each bin in S (T); the last takes the overflow bin
+  BIGINT nbinsS = nfullS+1, nbinsT = nfullT+1;
+  std::vector<BIGINT> slabS(nbinsS), slabT(ndims>1 ? nbinsT : 1, 0);
+  for (BIGINT s=0; s<nsS; s++)
+    for (BIGINT b=s*nfullS/nsS; b<((s+1)*nfullS)/nsS; b++)
+      slabS[b] = s;
+  slabS[nfullS] = nsS-1;
+  if (ndims>1) {
+    for (BIGINT t=0; t<nsT; t++)
+      for (BIGINT b=t*nfullT/nsT; b<((t+1)*nfullT)/nsT; b++)
+        slabT[b] = t;
+    slabT[nfullT] = nsT-1;
+  }
+  BIGINT ntile = nsS*nsT;
+  // find the runs of consecutive sorted pts in the same tile, in parallel...
+  std::vector< std::vector<BIGINT> > rstart(nthr), rtile(nthr);
+#pragma omp parallel num_threads(nthr)
+  {
+    int t = MY_OMP_GET_THREAD_NUM();
+    BIGINT lo = M*t/nthr, hi = M*(t+1)/nthr;
+    BIGINT prev = -1;
+    for (BIGINT i=lo; i<hi; i++) {
+      BIGINT j = opts.presorted ? i : sort_indices[i];
+      FLT s = opts.presorted ? kS[j] : FOLDRESCALE(kS[j],NS,opts.pirange);
+      BIGINT b = (BIGINT)(s/bsS);
+      b = (b<0) ? 0 : (b>nfullS ? nfullS : b);
+      BIGINT tile = slabS[b]*nsT;
+      if (nsT>1) {
+        FLT x = opts.presorted ? kT[j] : FOLDRESCALE(kT[j],NT,opts.pirange);
+        BIGINT c = (BIGINT)(x/bsT);
+        c = (c<0) ? 0 : (c>nfullT ? nfullT : c);
+        tile += slabT[c];
+      }
+      if (tile!=prev) {
+        rstart[t].push_back(i);
+        rtile[t].push_back(tile);
+        prev = tile;
+      }
+    }
+  }
+  // split runs into subproblems, and count those per tile...
+  std::vector<BIGINT> tcount(ntile+1, 0);
+  std::vector<BIGINT> sbrk, slen, stile;
+  BIGINT maxsub = opts.max_subproblem_size;
+  for (int t=0; t<nthr; t++)
+    for (size_t r=0; r<rstart[t].size(); r++) {
+      BIGINT end = (r+1<rstart[t].size()) ? rstart[t][r+1] :
+        (t+1<nthr ? M*(t+1)/nthr : M);
+      for (BIGINT i=rstart[t][r]; i<end; i+=maxsub) {
+        sbrk.push_back(i);
+        slen.push_back(min(maxsub, end-i));
+        stile.push_back(rtile[t][r]);
+        tcount[rtile[t][r]]++;
+      }
+    }
+  // order the nonempty tiles by color, then their subproblems by tile...
+  std::vector<BIGINT> torder;
+  pbrk.assign(1, 0);
+  for (int color=0; color<4; color++) {
+    for (BIGINT s=0; s<nsS; s++)
+      for (BIGINT t=0; t<nsT; t++)
+        if ((s%2)+2*(t%2)==color && tcount[s*nsT+t]>0)
+          torder.push_back(s*nsT+t);
+    if ((BIGINT)torder.size()>pbrk.back())
+      pbrk.push_back(torder.size());
+  }
+  std::vector<BIGINT> tfirst(ntile);     // first subproblem of each tile
+  gbrk.assign(1, 0);
+  for (size_t k=0; k<torder.size(); k++) {
+    tfirst[torder[k]] = gbrk.back();
+    gbrk.push_back(gbrk.back() + tcount[torder[k]]);
+  }
+  BIGINT nsub = sbrk.size();
+  brk.resize(nsub); sublen.resize(nsub);
+  for (BIGINT k=0; k<nsub; k++) {
+    BIGINT q = tfirst[stile[k]]++;
+    brk[q] = sbrk[k];
+    sublen[q] = slen[k];
+  }
+  return true;
+}
+
+void zeroGrid(FLT *data, BIGINT n, int nthr)
+/* Zeroes the n FLTs of data (a uniform grid), with nthr threads each doing
+   one contiguous chunk, ie a slab along the slowest dim, in order. This is
+   the layout of the low-density and partitioned spreading, and of FFTW's
+   threads, so if it is also the first touch of data (as in makeplan), the
+   pages go to the NUMA nodes of the threads that will use them. A single
+   thread zeroing (std::fill is no faster) does not saturate the memory
+   bandwidth of a large grid.
+*/
+{
+  nthr = (int)min((BIGINT)nthr, 1 + n/4096);   // at least a few pages each
+#pragma omp parallel num_threads(nthr)
+  {
+    int t = MY_OMP_GET_THREAD_NUM(), nt = MY_OMP_GET_NUM_THREADS();
+    BIGINT lo = n*t/nt, hi = n*(t+1)/nt;      // this thread's chunk
+    for (BIGINT i=lo; i<hi; i++)
+      data[i] = 0.0;
+  }
+}
+
 // --------------------------------------------------------------------------
 int spreadSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3, 
 		      FLT *data_uniform,BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-		      FLT *data_nonuniform, spread_opts opts, int did_sort)
+		      FLT *data_nonuniform, spread_opts opts, int did_sort,
+                      thread_arenas* scratch, FLT *ktab)
 // Spread NU pts in sorted order to a uniform grid. See spreadinterp() for doc.
+// The per-subproblem copies of the NU pts and the subgrids live in slots 2t
+// and 2t+1 of scratch, for each thread t, which persist to be reused by later
+// calls (only one call at a time may use a given scratch). If scratch is NULL
+// temporary ones are used, freed on exit. If ktab is not NULL the kernel
+// values are read from it (see kernelTable) rather than evaluated.
+// If opts.partition (and sorted, and nthr>1), the subgrids are added to the
+// output without locks or atomics, the subproblems being grouped into tiles
+// run in phases such that no two tiles of a phase touch the same grid pts (see
+// partition_subprobs). At low density (M*LOW_DENSITY<N) there are no
+// subproblems: see spreadLowDensity.
+// Returns 0, or ERR_SPREAD_ALLOC if scratch could not be allocated.
 {
   CNTime timer;
   int ndims = ndims_from_Ns(N1,N2,N3);
   BIGINT N=N1*N2*N3;            // output array size
   int ns=opts.nspread;          // abbrev. for w, kernel width
+  int nc = opts.realgrid ? 1 : 2;     // # FLTs per grid or NU data entry
   int nthr = MY_OMP_GET_MAX_THREADS();  // # threads to use to spread
   if (opts.nthreads>0)
     nthr = min(nthr,opts.nthreads);     // user override up to max avail
@@ -321,21 +810,17 @@ int spreadSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3,
     printf("\tspread %dD (M=%lld; N1=%lld,N2=%lld,N3=%lld; pir=%d), nthr=%d\n",ndims,(long long)M,(long long)N1,(long long)N2,(long long)N3,opts.pirange,nthr);
   
   timer.start();
-  for (BIGINT i=0; i<2*N; i++) // zero the output array. std::fill is no faster
-    data_uniform[i]=0.0;
+  zeroGrid(data_uniform, nc*N, nthr);   // zero the output array
   if (opts.debug) printf("\tzero output array\t%.3g s\n",timer.elapsedsec());
   if (M==0)                     // no NU pts, we're done
     return 0;
   
-  int spread_single = (nthr==1) || (M*100<N);     // low-density heuristic?
-  spread_single = 0;                 // for now
   timer.start();
-  if (spread_single) {    // ------- Basic single-core t1 spreading ------
-    for (BIGINT j=0; j<M; j++) {
-      // *** todo, not urgent
-      // ... (question is: will the index wrapping per NU pt slow it down?)
-    }
-    if (opts.debug) printf("\tt1 simple spreading:\t%.3g s\n",timer.elapsedsec());
+  if (M*LOW_DENSITY<N) {  // ------- Low-density: straight to the grid -------
+    int ier = spreadLowDensity(sort_indices, N1, N2, N3, data_uniform, M, kx,
+                               ky, kz, data_nonuniform, opts, nthr, ktab);
+    if (opts.debug) printf("\tt1 low-density spread:\t%.3g s\n",timer.elapsedsec());
+    return ier;
     
   } else {           // ------- Fancy multi-core blocked t1 spreading ----
                      // Splits sorted inds (jfm's advanced2), could double RAM.
@@ -345,38 +830,84 @@ int spreadSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3,
       nb = 1 + (M-1)/opts.max_subproblem_size;  // int div does ceil(M/opts.max_subproblem_size)
       if (opts.debug) printf("\tcapping subproblem sizes to max of %d\n",opts.max_subproblem_size);
     }
-    if (M*1000<N) {         // low-density heuristic: one thread per NU pt!
-      nb = M;
-      if (opts.debug) printf("\tusing low-density speed rescue nb=M...\n");
-    }
     if (!did_sort && nthr==1) {
       nb = 1;
       if (opts.debug) printf("\tunsorted nthr=1: forcing single subproblem...\n");
     }
-    if (opts.debug && nthr>opts.atomic_threshold)
-      printf("\tnthr big: switching add_wrapped OMP from critical to atomic (!)\n");
-      
-    std::vector<BIGINT> brk(nb+1); // NU index breakpoints defining nb subproblems
-    for (int p=0;p<=nb;++p)
-      brk[p] = (BIGINT)(0.5 + M*p/(double)nb);
+    // Subproblem isub is the sorted NU pts brk[isub] to brk[isub]+sublen[isub]
+    // -1. Subproblems are done in groups, each in sequence by one thread: group
+    // g is subproblems gbrk[g],..,gbrk[g+1]-1. The phases (colors) are done one
+    // after the other: phase p is groups pbrk[p],..,pbrk[p+1]-1.
+    std::vector<BIGINT> brk, sublen, gbrk, pbrk;
+    bool part = opts.partition && did_sort && nthr>1 &&
+      partition_subprobs(brk, sublen, gbrk, pbrk, sort_indices, N1, N2, N3, M,
+                         kx, ky, kz, nthr, opts);
+    if (part) {
+      nb = brk.size();
+      if (opts.debug) printf("\tpartitioned: %d subprobs in %d tiles, %d colors\n", nb, (int)gbrk.size()-1, (int)pbrk.size()-1);
+    } else {               // the usual: one group per subproblem, one phase
+      brk.resize(nb); sublen.resize(nb); gbrk.resize(nb+1);
+      for (int p=0;p<nb;++p) {
+        brk[p] = (BIGINT)(0.5 + M*p/(double)nb);
+        sublen[p] = (BIGINT)(0.5 + M*(p+1)/(double)nb) - brk[p];
+      }
+      for (int p=0;p<=nb;++p)
+        gbrk[p] = p;
+      pbrk = {0, (BIGINT)nb};
+      if (opts.debug && nthr>opts.atomic_threshold)
+        printf("\tnthr big: switching add_wrapped OMP from critical to atomic (!)\n");
+    }
+
+    thread_arenas tmp;             // the scratch, if none given
+    arenas_init(&tmp);
+    thread_arenas* sc = scratch ? scratch : &tmp;
+    if (arenas_resize(sc, 2*nthr)) {
+      fprintf(stderr,"[%s] failed to allocate scratch!\n",__func__);
+      return ERR_SPREAD_ALLOC;
+    }
+    int fail = 0;                  // any thread's scratch alloc failed?
     
+    for (size_t phase=0; phase+1<pbrk.size(); phase++) {
 #pragma omp parallel for num_threads(nthr) schedule(dynamic,1)  // each is big
-      for (int isub=0; isub<nb; isub++) {   // Main loop through the subproblems
-        BIGINT M0 = brk[isub+1]-brk[isub];  // # NU pts in this subproblem
-        // copy the location and data vectors for the nonuniform points
-        FLT *kx0=(FLT*)malloc(sizeof(FLT)*M0), *ky0=NULL, *kz0=NULL;
-        if (N2>1)
-          ky0=(FLT*)malloc(sizeof(FLT)*M0);
-        if (N3>1)
-          kz0=(FLT*)malloc(sizeof(FLT)*M0);
-        FLT *dd0=(FLT*)malloc(sizeof(FLT)*M0*2);    // complex strength data
-        for (BIGINT j=0; j<M0; j++) {           // todo: can avoid this copying?
+     for (BIGINT g=pbrk[phase]; g<pbrk[phase+1]; g++)
+      for (BIGINT isub=gbrk[g]; isub<gbrk[g+1]; isub++) {   // Main loop through the subproblems
+        BIGINT M0 = sublen[isub];           // # NU pts in this subproblem
+        int t = MY_OMP_GET_THREAD_NUM();    // this thread's slots 2t, 2t+1
+        // copy the location and data vectors for the nonuniform points, into
+        // consecutive (aligned) pieces of this thread's scratch; if presorted,
+        // the locations are used in place...
+        BIGINT M0a = (M0 + 15) & ~(BIGINT)15;   // rounded to 64 bytes or more
+        int ncopy = opts.presorted ? 0 : ndims;  // # coords to copy
+        FLT *kx0 = (FLT*)arena_get(sc, 2*t, sizeof(FLT)*M0a*(ncopy+nc));
+        if (!kx0) {
+#pragma omp atomic write
+          fail = 1;
+          continue;
+        }
+        FLT *dd0 = kx0 + ncopy*M0a;         // (complex) strength data
+        FLT *ky0 = (N2>1) ? kx0 + M0a : NULL;
+        FLT *kz0 = (N3>1) ? kx0 + 2*M0a : NULL;
+        if (opts.presorted) {
+          kx0 = kx + brk[isub];
+          if (N2>1) ky0 = ky + brk[isub];
+          if (N3>1) kz0 = kz + brk[isub];
+        }
+        for (BIGINT j=0; j<M0; j++) {
           BIGINT kk=sort_indices[j+brk[isub]];  // NU pt from subprob index list
-          kx0[j]=FOLDRESCALE(kx[kk],N1,opts.pirange);
-          if (N2>1) ky0[j]=FOLDRESCALE(ky[kk],N2,opts.pirange);
-          if (N3>1) kz0[j]=FOLDRESCALE(kz[kk],N3,opts.pirange);
-          dd0[j*2]=data_nonuniform[kk*2];     // real part
-          dd0[j*2+1]=data_nonuniform[kk*2+1]; // imag part
+          if (!opts.presorted) {
+            kx0[j]=FOLDRESCALE(kx[kk],N1,opts.pirange);
+            if (N2>1) ky0[j]=FOLDRESCALE(ky[kk],N2,opts.pirange);
+            if (N3>1) kz0[j]=FOLDRESCALE(kz[kk],N3,opts.pirange);
+          }
+          if (opts.realgrid)                    // real strengths & grid
+            dd0[j]=data_nonuniform[kk];
+          else if (opts.realdata) {             // real strengths
+            dd0[j*2]=data_nonuniform[kk];
+            dd0[j*2+1]=0.0;
+          } else {
+            dd0[j*2]=data_nonuniform[kk*2];     // real part
+            dd0[j*2+1]=data_nonuniform[kk*2+1]; // imag part
+          }
         }
         // get the subgrid which will include padding by roughly nspread/2
         BIGINT offset1,offset2,offset3,size1,size2,size3; // get_subgrid sets
@@ -389,53 +920,177 @@ int spreadSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3,
           else
             printf("\tsubgrid: off %lld,%lld,%lld\t siz %lld,%lld,%lld\t #NU %lld\n",(long long)offset1,(long long)offset2,(long long)offset3,(long long)size1,(long long)size2,(long long)size3,(long long)M0);
 	}
-        // allocate output data for this subgrid
-        FLT *du0=(FLT*)malloc(sizeof(FLT)*2*size1*size2*size3); // complex
+        // get output data for this subgrid (complex)
+        FLT *du0 = (FLT*)arena_get(sc, 2*t+1, sizeof(FLT)*nc*size1*size2*size3);
+        if (!du0) {
+#pragma omp atomic write
+          fail = 1;
+          continue;
+        }
         
         // Spread to subgrid without need for bounds checking or wrapping
         if (!(opts.flags & TF_OMIT_SPREADING)) {
+          FLT *ktab0 = ktab ? ktab + (BIGINT)ndims*ns*brk[isub] : NULL;
           if (ndims==1)
-            spread_subproblem_1d(offset1,size1,du0,M0,kx0,dd0,opts);
+            spread_subproblem_1d(offset1,size1,du0,M0,kx0,dd0,opts,ktab0);
           else if (ndims==2)
-            spread_subproblem_2d(offset1,offset2,size1,size2,du0,M0,kx0,ky0,dd0,opts);
+            spread_subproblem_2d(offset1,offset2,size1,size2,du0,M0,kx0,ky0,dd0,opts,ktab0);
           else
-            spread_subproblem_3d(offset1,offset2,offset3,size1,size2,size3,du0,M0,kx0,ky0,kz0,dd0,opts);
+            spread_subproblem_3d(offset1,offset2,offset3,size1,size2,size3,du0,M0,kx0,ky0,kz0,dd0,opts,ktab0);
 	}
         
         // do the adding of subgrid to output
         if (!(opts.flags & TF_OMIT_WRITE_TO_GRID)) {
-          if (nthr > opts.atomic_threshold)   // see above for debug reporting
-            add_wrapped_subgrid_thread_safe(offset1,offset2,offset3,size1,size2,size3,N1,N2,N3,data_uniform,du0);   // R Blackwell's atomic version
+          if (part)        // no other thread writes there in this phase
+            add_wrapped_subgrid(offset1,offset2,offset3,size1,size2,size3,N1,N2,N3,data_uniform,du0,nc);
+          else if (nthr > opts.atomic_threshold)   // see above for debug reporting
+            add_wrapped_subgrid_thread_safe(offset1,offset2,offset3,size1,size2,size3,N1,N2,N3,data_uniform,du0,nc);   // R Blackwell's atomic version
           else {
 #pragma omp critical
-            add_wrapped_subgrid(offset1,offset2,offset3,size1,size2,size3,N1,N2,N3,data_uniform,du0);
+            add_wrapped_subgrid(offset1,offset2,offset3,size1,size2,size3,N1,N2,N3,data_uniform,du0,nc);
           }
         }
-
-        // free up stuff from this subprob... (that was malloc'ed by hand)
-        free(dd0);
-        free(du0);
-        free(kx0);
-        if (N2>1) free(ky0);
-        if (N3>1) free(kz0); 
       }     // end main loop over subprobs
+    }       // end loop over phases
+      arenas_free(&tmp);            // (scratch is kept for the next call)
       if (opts.debug) printf("\tt1 fancy spread: \t%.3g s (%d subprobs)\n",timer.elapsedsec(), nb);
+      if (fail) {
+        fprintf(stderr,"[%s] failed to allocate scratch!\n",__func__);
+        return ERR_SPREAD_ALLOC;
+      }
     }   // end of choice of which t1 spread type to use
     return 0;
 };
 
 
+static int spreadLowDensity(BIGINT* sort_indices, BIGINT N1, BIGINT N2,
+                            BIGINT N3, FLT *data_uniform, BIGINT M, FLT *kx,
+                            FLT *ky, FLT *kz, FLT *data_nonuniform,
+                            const spread_opts& opts, int nthr, FLT *ktab)
+/* Spreads each NU pt (in the order of sort_indices) straight to the zeroed
+   uniform grid, wrapping its kernel's indices, with nthr threads. For the
+   low-density case, where the subgrids of spreadSorted would each hold about
+   one NU pt: it needs no grid workspace, and its cost is O(M*w^d) besides
+   zeroing the grid. The grid is split into nthr slabs along its slowest dim
+   (z in 3D, y in 2D, x in 1D), and the NU pts are bucketed once by the slabs
+   their kernels reach (mostly one, at the edges two). A thread spreads the
+   pts of a slab's bucket writing only inside it, so there are no locks or
+   atomics (which here cost more than the writes), and as each bucket keeps
+   the order of sort_indices the result does not depend on nthr. See
+   spreadSorted for the other inputs. Returns 0.
+*/
+{
+  int ndims = ndims_from_Ns(N1,N2,N3);
+  int ns=opts.nspread;
+  FLT ns2 = (FLT)ns/2;          // half spread width, used as stencil shift
+  int nc = opts.realgrid ? 1 : 2;     // # FLTs per grid or NU data entry
+  BIGINT NS = (ndims==3) ? N3 : (ndims==2) ? N2 : N1;   // slowest dim
+  FLT *kS = (ndims==3) ? kz : (ndims==2) ? ky : kx;
+  int nb = (int)min((BIGINT)nthr, NS);  // # slabs, b-th is [NS*b/nb,NS*(b+1)/nb)
+  if (opts.flags & TF_OMIT_SPREADING)
+    return 0;
+
+  // the slab of the first and last grid index (wrapped) each NU pt reaches
+  // (as NS>=2*ns, the slabs it reaches are those from first to last, cyclic)
+  std::vector<int> first(M), last(M);
+#pragma omp parallel for num_threads(nthr) schedule(static)
+  for (BIGINT i=0; i<M; i++) {
+    FLT s = opts.presorted ? kS[i] : FOLDRESCALE(kS[sort_indices[i]],NS,opts.pirange);
+    BIGINT iS = (BIGINT)std::ceil(s-ns2);
+    if (iS<0) iS+=NS;
+    if (iS>=NS) iS-=NS;
+    BIGINT iE = (iS+ns-1)%NS;
+    first[i] = (int)(((iS+1)*nb-1)/NS);    // largest b with NS*b/nb <= iS
+    last[i] = (int)(((iE+1)*nb-1)/NS);
+  }
+  // bucket b is the NU pts bkt[bstart[b]],..,bkt[bstart[b+1]-1] (indices into
+  // sort_indices, in increasing order)
+  std::vector<BIGINT> bstart(nb+1, 0);
+  for (BIGINT i=0; i<M; i++)
+    for (int b=first[i]; ; b=(b+1)%nb) {
+      bstart[b+1]++;
+      if (b==last[i]) break;
+    }
+  for (int b=0; b<nb; b++)
+    bstart[b+1] += bstart[b];
+  std::vector<BIGINT> bkt(bstart[nb]), pos(bstart.begin(), bstart.end()-1);
+  for (BIGINT i=0; i<M; i++)
+    for (int b=first[i]; ; b=(b+1)%nb) {
+      bkt[pos[b]++] = i;
+      if (b==last[i]) break;
+    }
+
+#pragma omp parallel for num_threads(nthr) schedule(dynamic,1)
+  for (int b=0; b<nb; b++) {
+    BIGINT lo = NS*b/nb, hi = NS*(b+1)/nb;   // this slab
+    FLT kernel_args[3*MAX_NSPREAD];
+    FLT kernel_values[3*MAX_NSPREAD];
+    for (BIGINT k=bstart[b]; k<bstart[b+1]; k++) {   // its NU pts, in order
+      BIGINT i = bkt[k], j = sort_indices[i];
+      FLT xj, yj=0, zj=0;
+      if (opts.presorted) {            // already folded, in sorted order
+        xj = kx[i];
+        if (ndims>1) yj = ky[i];
+        if (ndims>2) zj = kz[i];
+      } else {
+        xj = FOLDRESCALE(kx[j],N1,opts.pirange);
+        if (ndims>1) yj = FOLDRESCALE(ky[j],N2,opts.pirange);
+        if (ndims>2) zj = FOLDRESCALE(kz[j],N3,opts.pirange);
+      }
+      FLT re0, im0 = 0.0;
+      if (opts.realgrid || opts.realdata)
+        re0 = data_nonuniform[j];
+      else {
+        re0 = data_nonuniform[2*j];
+        im0 = data_nonuniform[2*j+1];
+      }
+      // spread block corner index, and kernel values, as in interpSorted...
+      BIGINT i1 = (BIGINT)std::ceil(xj-ns2);
+      BIGINT i2 = (ndims>1) ? (BIGINT)std::ceil(yj-ns2) : 0;
+      BIGINT i3 = (ndims>2) ? (BIGINT)std::ceil(zj-ns2) : 0;
+      FLT *k1 = kernel_values, *k2 = k1+ns, *k3 = k1+2*ns;
+      if (ktab) {                      // precomputed values
+        k1 = ktab + (BIGINT)ndims*ns*i;
+        k2 = k1 + ns;
+        k3 = k1 + 2*ns;
+      } else if (opts.kerevalmeth==0) {
+        set_kernel_args(kernel_args, (FLT)i1-xj, opts);
+        if (ndims>1) set_kernel_args(kernel_args+ns, (FLT)i2-yj, opts);
+        if (ndims>2) set_kernel_args(kernel_args+2*ns, (FLT)i3-zj, opts);
+        evaluate_kernel_vector(kernel_values, kernel_args, opts, ndims*ns);
+      } else {
+        eval_kernel_vec_Horner(k1,(FLT)i1-xj,ns,opts);
+        if (ndims>1) eval_kernel_vec_Horner(k2,(FLT)i2-yj,ns,opts);
+        if (ndims>2) eval_kernel_vec_Horner(k3,(FLT)i3-zj,ns,opts);
+      }
+      if (opts.flags & TF_OMIT_WRITE_TO_GRID)
+        continue;
+      if (nc==1)
+        spread_wrapped<1>(data_uniform,re0,im0,k1,k2,k3,i1,i2,i3,N1,N2,N3,
+                          ndims,ns,lo,hi);
+      else
+        spread_wrapped<2>(data_uniform,re0,im0,k1,k2,k3,i1,i2,i3,N1,N2,N3,
+                          ndims,ns,lo,hi);
+    }
+  }
+  return 0;
+}
+
+
 // --------------------------------------------------------------------------
 int interpSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3, 
 		      FLT *data_uniform,BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-		      FLT *data_nonuniform, spread_opts opts, int did_sort)
+		      FLT *data_nonuniform, spread_opts opts, int did_sort,
+                      FLT *ktab)
 // Interpolate to NU pts in sorted order from a uniform grid.
-// See spreadinterp() for doc.
+// See spreadinterp() for doc. If ktab is not NULL the kernel values are read
+// from it (see kernelTable) rather than evaluated.
 {
   CNTime timer;
   int ndims = ndims_from_Ns(N1,N2,N3);
   int ns=opts.nspread;          // abbrev. for w, kernel width
   FLT ns2 = (FLT)ns/2;          // half spread width, used as stencil shift
+  int nc = opts.realgrid ? 1 : 2;     // # FLTs per grid or NU data entry
   int nthr = MY_OMP_GET_MAX_THREADS();   // # threads to use to interp
   if (opts.nthreads>0)
     nthr = min(nthr,opts.nthreads);      // user override up to max avail
@@ -465,6 +1120,14 @@ int interpSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3,
         for (int ibuf=0; ibuf<bufsize; ibuf++) {
           BIGINT j = sort_indices[i+ibuf];
           jlist[ibuf] = j;
+          if (opts.presorted) {         // already folded, in sorted order
+            xjlist[ibuf] = kx[i+ibuf];
+            if(ndims >=2)
+              yjlist[ibuf] = ky[i+ibuf];
+            if(ndims == 3)
+              zjlist[ibuf] = kz[i+ibuf];
+            continue;
+          }
 	  xjlist[ibuf] = FOLDRESCALE(kx[j],N1,opts.pirange);
 	  if(ndims >=2)
 	    yjlist[ibuf] = FOLDRESCALE(ky[j],N2,opts.pirange);
@@ -492,7 +1155,13 @@ int interpSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3,
       // eval kernel values patch and use to interpolate from uniform data...
       if (!(opts.flags & TF_OMIT_SPREADING)) {
 
-	  if (opts.kerevalmeth==0) {               // choose eval method
+          FLT *k1 = ker1, *k2 = ker2, *k3 = ker3;
+	  if (ktab) {                              // precomputed values
+	    k1 = ktab + (BIGINT)ndims*ns*(i+ibuf);
+	    k2 = k1 + ns;
+	    k3 = k1 + 2*ns;
+	  }
+	  else if (opts.kerevalmeth==0) {               // choose eval method
 	    set_kernel_args(kernel_args, x1, opts);
 	    if(ndims > 1)  set_kernel_args(kernel_args+ns, x2, opts);
 	    if(ndims > 2)  set_kernel_args(kernel_args+2*ns, x3, opts);
@@ -508,13 +1177,22 @@ int interpSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3,
 
 	  switch(ndims){
 	  case 1:
-	    interp_line(target,data_uniform,ker1,i1,N1,ns);
+	    if (nc==1)
+	      interp_line<1>(target,data_uniform,k1,i1,N1,ns);
+	    else
+	      interp_line<2>(target,data_uniform,k1,i1,N1,ns);
 	    break;
 	  case 2:
-	    interp_square(target,data_uniform,ker1,ker2,i1,i2,N1,N2,ns);
+	    if (nc==1)
+	      interp_square<1>(target,data_uniform,k1,k2,i1,i2,N1,N2,ns);
+	    else
+	      interp_square<2>(target,data_uniform,k1,k2,i1,i2,N1,N2,ns);
 	    break;
 	  case 3:
-	    interp_cube(target,data_uniform,ker1,ker2,ker3,i1,i2,i3,N1,N2,N3,ns);
+	    if (nc==1)
+	      interp_cube<1>(target,data_uniform,k1,k2,k3,i1,i2,i3,N1,N2,N3,ns);
+	    else
+	      interp_cube<2>(target,data_uniform,k1,k2,k3,i1,i2,i3,N1,N2,N3,ns);
 	    break;
 	  default: //can't get here
 	    break;
@@ -526,8 +1204,12 @@ int interpSorted(BIGINT* sort_indices,BIGINT N1, BIGINT N2, BIGINT N3,
     // Copy result buffer to output array
     for (int ibuf=0; ibuf<bufsize; ibuf++) {
       BIGINT j = jlist[ibuf];
-      data_nonuniform[2*j] = outbuf[2*ibuf];
-      data_nonuniform[2*j+1] = outbuf[2*ibuf+1];              
+      if (nc==1)                              // real output
+        data_nonuniform[j] = outbuf[2*ibuf];
+      else {
+        data_nonuniform[2*j] = outbuf[2*ibuf];
+        data_nonuniform[2*j+1] = outbuf[2*ibuf+1];
+      }
     }         
         
       } // end NU targ loop
@@ -581,6 +1263,13 @@ int setup_spreader(spread_opts &opts, FLT eps, double upsampfac,
   opts.upsampfac = upsampfac;
   opts.nthreads = 0;            // all avail
   opts.sort_threads = 0;        // 0:auto-choice
+  opts.bin_size_x = BIN_SIZE_X; // sort bins (in U grid pts); may be tuned
+  opts.bin_size_y = BIN_SIZE_Y;
+  opts.bin_size_z = BIN_SIZE_Z;
+  opts.realdata = 0;            // complex NU data
+  opts.realgrid = 0;            // complex grid
+  opts.presorted = 0;           // NU pts as given by user (see foldCoords)
+  opts.partition = 0;           // subgrids added under critical or atomic
   // heuristic dir=1 chunking for nthr>>1, typical for intel i7 and skylake...
   opts.max_subproblem_size = (dim==1) ? 10000 : 100000;
   opts.flags = 0;               // 0:no timing flags (>0 for experts only)
@@ -707,6 +1396,77 @@ static inline void eval_kernel_vec_Horner(FLT *ker, const FLT x, const int w,
   }
 }
 
+static void kernel_row(FLT *row, FLT x, FLT y, FLT z, int ndims,
+                       const spread_opts& opts)
+/* Fills row[] with the ndims*ns kernel values (x ones, then y, then z) of a
+   NU pt at folded coords x,y,z, exactly as spread_subproblem_{1,2,3}d
+   evaluate them (including the 1D clip of the offset), for kernelTable.
+   The same values serve interpolation, bar that 1D clip, which only acts
+   when rounding errors are O(1) anyway.
+*/
+{
+  int ns = opts.nspread;
+  FLT ns2 = (FLT)ns/2;
+  FLT kernel_args[3*MAX_NSPREAD];
+  FLT kernel_values[3*MAX_NSPREAD];     // (padded room for evaluate_kernel_vector)
+  FLT xs[3] = {x, y, z};
+  FLT off[3];
+  for (int d=0; d<ndims; d++) {
+    BIGINT i1 = (BIGINT)std::ceil(xs[d] - ns2);   // as in get_subgrid
+    off[d] = (FLT)i1 - xs[d];
+  }
+  if (ndims==1) {               // 1D spreader clips
+    if (off[0]<-ns2) off[0]=-ns2;
+    if (off[0]>-ns2+1) off[0]=-ns2+1;
+  }
+  if (opts.kerevalmeth==0) {
+    for (int d=0; d<ndims; d++)
+      set_kernel_args(kernel_args+d*ns, off[d], opts);
+    evaluate_kernel_vector(kernel_values, kernel_args, opts, ndims*ns);
+  } else
+    for (int d=0; d<ndims; d++)
+      eval_kernel_vec_Horner(kernel_values+d*ns, off[d], ns, opts);
+  for (int r=0; r<ndims*ns; r++)
+    row[r] = kernel_values[r];
+}
+
+static void matrix_row(BIGINT *cols, FLT *vals, FLT x, FLT y, FLT z,
+                       BIGINT N1, BIGINT N2, BIGINT N3, int ndims,
+                       const spread_opts& opts)
+/* Fills cols[], vals[] with the ns^ndims column indices and values of the row
+   of the interpolation matrix for a NU pt at folded coords x,y,z, for
+   interpMatrix. The values are products of those of kernel_row, in the same
+   order and association as in interp_{line,square,cube}.
+*/
+{
+  int ns = opts.nspread;
+  FLT ns2 = (FLT)ns/2;
+  FLT ker[3*MAX_NSPREAD];
+  kernel_row(ker, x, y, z, ndims, opts);
+  FLT *ker1 = ker, *ker2 = ker + ns, *ker3 = ker + 2*ns;
+  BIGINT i1 = (BIGINT)std::ceil(x - ns2);
+  BIGINT i2 = (ndims>1) ? (BIGINT)std::ceil(y - ns2) : 0;
+  BIGINT i3 = (ndims>2) ? (BIGINT)std::ceil(z - ns2) : 0;
+  BIGINT k = 0;
+  for (int dz=0; dz<(ndims>2 ? ns : 1); dz++) {
+    BIGINT jz = i3+dz;
+    if (jz<0) jz += N3; else if (jz>=N3) jz -= N3;
+    for (int dy=0; dy<(ndims>1 ? ns : 1); dy++) {
+      BIGINT jy = i2+dy;
+      if (jy<0) jy += N2; else if (jy>=N2) jy -= N2;
+      FLT ker23 = (ndims>2) ? ker2[dy]*ker3[dz] : (ndims>1 ? ker2[dy] : 1.0);
+      for (int dx=0; dx<ns; dx++) {
+        BIGINT jx = i1+dx;
+        if (jx<0) jx += N1; else if (jx>=N1) jx -= N1;
+        cols[k] = jx + N1*(jy + N2*jz);
+        vals[k] = (ndims>1) ? ker1[dx]*ker23 : ker1[dx];
+        k++;
+      }
+    }
+  }
+}
+
+template<int nc>
 void interp_line(FLT *target,FLT *du, FLT *ker,BIGINT i1,BIGINT N1,int ns)
 // 1D interpolate complex values from du array to out, using real weights
 // ker[0] through ker[ns-1]. out must be size 2 (real,imag), and du
@@ -714,45 +1474,47 @@ void interp_line(FLT *target,FLT *du, FLT *ker,BIGINT i1,BIGINT N1,int ns)
 // Periodic wrapping in the du array is applied, assuming N1>=ns.
 // dx is index into ker array, j index in complex du (data_uniform) array.
 // Barnett 6/15/17
+// nc=1 instead interpolates real values: du has size N1 and out size 1.
 {
   FLT out[] = {0.0, 0.0};
   BIGINT j = i1;
   if (i1<0) {                               // wraps at left
     j+=N1;
     for (int dx=0; dx<-i1; ++dx) {
-      out[0] += du[2*j]*ker[dx];
-      out[1] += du[2*j+1]*ker[dx];
+      out[0] += du[nc*j]*ker[dx];
+      if (nc==2) out[1] += du[2*j+1]*ker[dx];
       ++j;
     }
     j-=N1;
     for (int dx=-i1; dx<ns; ++dx) {
-      out[0] += du[2*j]*ker[dx];
-      out[1] += du[2*j+1]*ker[dx];
+      out[0] += du[nc*j]*ker[dx];
+      if (nc==2) out[1] += du[2*j+1]*ker[dx];
       ++j;
     }
   } else if (i1+ns>=N1) {                    // wraps at right
     for (int dx=0; dx<N1-i1; ++dx) {
-      out[0] += du[2*j]*ker[dx];
-      out[1] += du[2*j+1]*ker[dx];
+      out[0] += du[nc*j]*ker[dx];
+      if (nc==2) out[1] += du[2*j+1]*ker[dx];
       ++j;
     }
     j-=N1;
     for (int dx=N1-i1; dx<ns; ++dx) {
-      out[0] += du[2*j]*ker[dx];
-      out[1] += du[2*j+1]*ker[dx];
+      out[0] += du[nc*j]*ker[dx];
+      if (nc==2) out[1] += du[2*j+1]*ker[dx];
       ++j;
     }
   } else {                                     // doesn't wrap
     for (int dx=0; dx<ns; ++dx) {
-      out[0] += du[2*j]*ker[dx];
-      out[1] += du[2*j+1]*ker[dx];
+      out[0] += du[nc*j]*ker[dx];
+      if (nc==2) out[1] += du[2*j+1]*ker[dx];
       ++j;
     }
   }
   target[0] = out[0];
-  target[1] = out[1];
+  if (nc==2) target[1] = out[1];
 }
 
+template<int nc>
 void interp_square(FLT *target,FLT *du, FLT *ker1, FLT *ker2, BIGINT i1,BIGINT i2,BIGINT N1,BIGINT N2,int ns)
 // 2D interpolate complex values from du (uniform grid data) array to out value,
 // using ns*ns square of real weights
@@ -762,6 +1524,7 @@ void interp_square(FLT *target,FLT *du, FLT *ker1, FLT *ker2, BIGINT i1,BIGINT i
 // Periodic wrapping in the du array is applied, assuming N1,N2>=ns.
 // dx,dy indices into ker array, j index in complex du array.
 // Barnett 6/16/17
+// nc=1 instead interpolates real values (du and out have 1 FLT per entry).
 {
   FLT out[] = {0.0, 0.0};
   if (i1>=0 && i1+ns<=N1 && i2>=0 && i2+ns<=N2) {  // no wrapping: avoid ptrs
@@ -769,8 +1532,8 @@ void interp_square(FLT *target,FLT *du, FLT *ker1, FLT *ker2, BIGINT i1,BIGINT i
       BIGINT j = N1*(i2+dy) + i1;
       for (int dx=0; dx<ns; dx++) {
 	FLT k = ker1[dx]*ker2[dy];
-	out[0] += du[2*j] * k;
-	out[1] += du[2*j+1] * k;
+	out[0] += du[nc*j] * k;
+	if (nc==2) out[1] += du[2*j+1] * k;
 	++j;
       }
     }
@@ -790,15 +1553,16 @@ void interp_square(FLT *target,FLT *du, FLT *ker1, FLT *ker2, BIGINT i1,BIGINT i
       for (int dx=0; dx<ns; dx++) {
 	FLT k = ker1[dx]*ker2[dy];
 	BIGINT j = oy + j1[dx];
-	out[0] += du[2*j] * k;
-	out[1] += du[2*j+1] * k;
+	out[0] += du[nc*j] * k;
+	if (nc==2) out[1] += du[2*j+1] * k;
       }
     }
   }
   target[0] = out[0];
-  target[1] = out[1];  
+  if (nc==2) target[1] = out[1];  
 }
 
+template<int nc>
 void interp_cube(FLT *target,FLT *du, FLT *ker1, FLT *ker2, FLT *ker3,
 		 BIGINT i1,BIGINT i2,BIGINT i3, BIGINT N1,BIGINT N2,BIGINT N3,int ns)
 // 3D interpolate complex values from du (uniform grid data) array to out value,
@@ -809,6 +1573,7 @@ void interp_cube(FLT *target,FLT *du, FLT *ker1, FLT *ker2, FLT *ker3,
 // Periodic wrapping in the du array is applied, assuming N1,N2,N3>=ns.
 // dx,dy,dz indices into ker array, j index in complex du array.
 // Barnett 6/16/17
+// nc=1 instead interpolates real values (du and out have 1 FLT per entry).
 {
   FLT out[] = {0.0, 0.0};  
   if (i1>=0 && i1+ns<=N1 && i2>=0 && i2+ns<=N2 && i3>=0 && i3+ns<=N3) {
@@ -820,8 +1585,8 @@ void interp_cube(FLT *target,FLT *du, FLT *ker1, FLT *ker2, FLT *ker3,
 	FLT ker23 = ker2[dy]*ker3[dz];
 	for (int dx=0; dx<ns; dx++) {
 	  FLT k = ker1[dx]*ker23;
-	  out[0] += du[2*j] * k;
-	  out[1] += du[2*j+1] * k;
+	  out[0] += du[nc*j] * k;
+	  if (nc==2) out[1] += du[2*j+1] * k;
 	  ++j;
 	}
       }
@@ -848,18 +1613,73 @@ void interp_cube(FLT *target,FLT *du, FLT *ker1, FLT *ker2, FLT *ker3,
 	for (int dx=0; dx<ns; dx++) {
 	  FLT k = ker1[dx]*ker23;
 	  BIGINT j = oy + j1[dx];
-	  out[0] += du[2*j] * k;
-	  out[1] += du[2*j+1] * k;
+	  out[0] += du[nc*j] * k;
+	  if (nc==2) out[1] += du[2*j+1] * k;
 	}
       }
     }
   }
   target[0] = out[0];
-  target[1] = out[1];  
+  if (nc==2) target[1] = out[1];  
+}
+
+template<int nc>
+void spread_wrapped(FLT *du, FLT re0, FLT im0, FLT *ker1, FLT *ker2,
+                    FLT *ker3, BIGINT i1, BIGINT i2, BIGINT i3, BIGINT N1,
+                    BIGINT N2, BIGINT N3, int ndims, int ns, BIGINT lo,
+                    BIGINT hi)
+// Adds the value (re0,im0) times the ns^ndims tensor product of the kernel
+// values ker1 (ker2, ker3) to du (uniform grid data, of size N1*N2*N3), with
+// lowest corner index (i1,i2,i3) and periodic wrapping, as in interp_cube
+// (unused dims have N=1 and i=0, and their ker is not read). Only the grid
+// pts whose index in the slowest dim (z in 3D, y in 2D, x in 1D) is in
+// [lo,hi) are written.
+// nc=1 instead spreads the real value re0 to a real du (1 FLT per entry).
+{
+  FLT one = 1.0;
+  int n2 = ns, n3 = ns;               // kernel widths in y, z
+  if (ndims<2) { n2 = 1; ker2 = &one; }
+  if (ndims<3) { n3 = 1; ker3 = &one; }
+  // 1d ptr lists (offsets in du), -1 where outside [lo,hi) in the slowest dim
+  BIGINT j1[MAX_NSPREAD], j2[MAX_NSPREAD], j3[MAX_NSPREAD];
+  BIGINT x=i1, y=i2, z=i3;            // initialize coords
+  for (int d=0; d<ns; d++) {
+    if (x<0) x+=N1;
+    if (x>=N1) x-=N1;
+    j1[d] = (ndims>1 || (x>=lo && x<hi)) ? x : -1;
+    x++;
+  }
+  for (int d=0; d<n2; d++) {
+    if (y<0) y+=N2;
+    if (y>=N2) y-=N2;
+    j2[d] = (ndims!=2 || (y>=lo && y<hi)) ? N1*y : -1;
+    y++;
+  }
+  for (int d=0; d<n3; d++) {
+    if (z<0) z+=N3;
+    if (z>=N3) z-=N3;
+    j3[d] = (ndims<3 || (z>=lo && z<hi)) ? N1*N2*z : -1;
+    z++;
+  }
+  for (int dz=0; dz<n3; dz++) {
+    if (j3[dz]<0) continue;
+    for (int dy=0; dy<n2; dy++) {
+      if (j2[dy]<0) continue;
+      BIGINT oy = j3[dz] + j2[dy];        // offset due to y & z
+      FLT ker23 = ker2[dy]*ker3[dz];
+      for (int dx=0; dx<ns; dx++) {
+        if (j1[dx]<0) continue;
+        FLT k = ker1[dx]*ker23;
+        FLT *trg = du + nc*(oy + j1[dx]);
+        trg[0] += re0*k;
+        if (nc==2) trg[1] += im0*k;
+      }
+    }
+  }
 }
 
 void spread_subproblem_1d(BIGINT off1, BIGINT size1,FLT *du,BIGINT M,
-			  FLT *kx,FLT *dd, const spread_opts& opts)
+			  FLT *kx,FLT *dd, const spread_opts& opts, FLT *ktab)
 /* 1D spreader from nonuniform to uniform subproblem grid, without wrapping.
    Inputs:
    off1 - integer offset of left end of du subgrid from that of overall fine
@@ -871,6 +1691,9 @@ void spread_subproblem_1d(BIGINT off1, BIGINT size1,FLT *du,BIGINT M,
    dd (length M complex, interleaved) - source strengths
    Outputs:
    du (length size1 complex, interleaved) - preallocated uniform subgrid array
+   If opts.realgrid, dd and du are instead real (one FLT per entry).
+   ktab (size M*ns, or NULL) - kernel values of the NU pts (see kernelTable),
+                   read instead of evaluating the kernel.
 
    The reason periodic wrapping is avoided in subproblems is speed: avoids
    conditionals, indirection (pointers), and integer mod. Originally 2017.
@@ -882,13 +1705,14 @@ void spread_subproblem_1d(BIGINT off1, BIGINT size1,FLT *du,BIGINT M,
 {
   int ns=opts.nspread;          // a.k.a. w
   FLT ns2 = (FLT)ns/2;          // half spread width
-  for (BIGINT i=0;i<2*size1;++i)         // zero output
+  int nc = opts.realgrid ? 1 : 2;        // # FLTs per entry of dd and du
+  for (BIGINT i=0;i<nc*size1;++i)        // zero output
     du[i] = 0.0;
   FLT kernel_args[MAX_NSPREAD];
   FLT ker[MAX_NSPREAD];
   for (BIGINT i=0; i<M; i++) {           // loop over NU pts
-    FLT re0 = dd[2*i];
-    FLT im0 = dd[2*i+1];
+    FLT re0 = dd[nc*i];
+    FLT im0 = (nc==2) ? dd[2*i+1] : 0.0;
     // ceil offset, hence rounding, must match that in get_subgrid...
     BIGINT i1 = (BIGINT)std::ceil(kx[i] - ns2);    // fine grid start index
     FLT x1 = (FLT)i1 - kx[i];            // x1 in [-w/2,-w/2+1], up to rounding
@@ -897,51 +1721,64 @@ void spread_subproblem_1d(BIGINT off1, BIGINT size1,FLT *du,BIGINT M,
     // This can only happen if the overall error would be O(1) anyway. Clip x1??
     if (x1<-ns2) x1=-ns2;
     if (x1>-ns2+1) x1=-ns2+1;   // ***
-    if (opts.kerevalmeth==0) {          // faster Horner poly method
+    FLT *k = ker;
+    if (ktab)                           // precomputed values
+      k = ktab + ns*i;
+    else if (opts.kerevalmeth==0) {     // faster Horner poly method
       set_kernel_args(kernel_args, x1, opts);
       evaluate_kernel_vector(ker, kernel_args, opts, ns);
     } else
       eval_kernel_vec_Horner(ker,x1,ns,opts);
     BIGINT j = i1-off1;    // offset rel to subgrid, starts the output indices
     // critical inner loop:
-    for (int dx=0; dx<ns; ++dx) {
-      FLT k = ker[dx];
-      du[2*j] += re0*k;
-      du[2*j+1] += im0*k;
-      ++j;
-    }
+    if (nc==1)                           // real grid
+      for (int dx=0; dx<ns; ++dx)
+        du[j++] += re0*k[dx];
+    else
+      for (int dx=0; dx<ns; ++dx) {
+        FLT kdx = k[dx];
+        du[2*j] += re0*kdx;
+        du[2*j+1] += im0*kdx;
+        ++j;
+      }
   }
 }
 
 void spread_subproblem_2d(BIGINT off1,BIGINT off2,BIGINT size1,BIGINT size2,
                           FLT *du,BIGINT M, FLT *kx,FLT *ky,FLT *dd,
-			  const spread_opts& opts)
+			  const spread_opts& opts, FLT *ktab)
 /* spreader from dd (NU) to du (uniform) in 2D without wrapping.
    See above docs/notes for spread_subproblem_2d.
    kx,ky (size M) are NU locations in [off+ns/2,off+size-1-ns/2] in both dims.
    dd (size M complex) are complex source strengths
    du (size size1*size2) is complex uniform output array
+   If opts.realgrid, dd and du are instead real (one FLT per entry).
+   ktab (size M*2*ns, or NULL) are kernel values to use (see kernelTable).
  */
 {
   int ns=opts.nspread;
   FLT ns2 = (FLT)ns/2;          // half spread width
-  for (BIGINT i=0;i<2*size1*size2;++i)
+  int nc = opts.realgrid ? 1 : 2;        // # FLTs per entry of dd and du
+  for (BIGINT i=0;i<nc*size1*size2;++i)
     du[i] = 0.0;
   FLT kernel_args[2*MAX_NSPREAD];
   // Kernel values stored in consecutive memory. This allows us to compute
   // values in two directions in a single kernel evaluation call.
   FLT kernel_values[2*MAX_NSPREAD];
-  FLT *ker1 = kernel_values;
-  FLT *ker2 = kernel_values + ns;  
   for (BIGINT i=0; i<M; i++) {           // loop over NU pts
-    FLT re0 = dd[2*i];
-    FLT im0 = dd[2*i+1];
+    FLT *ker1 = kernel_values;
+    FLT *ker2 = kernel_values + ns;
+    FLT re0 = dd[nc*i];
+    FLT im0 = (nc==2) ? dd[2*i+1] : 0.0;
     // ceil offset, hence rounding, must match that in get_subgrid...
     BIGINT i1 = (BIGINT)std::ceil(kx[i] - ns2);   // fine grid start indices
     BIGINT i2 = (BIGINT)std::ceil(ky[i] - ns2);
     FLT x1 = (FLT)i1 - kx[i];
     FLT x2 = (FLT)i2 - ky[i];
-    if (opts.kerevalmeth==0) {          // faster Horner poly method
+    if (ktab) {                         // precomputed values
+      ker1 = ktab + 2*ns*i;
+      ker2 = ker1 + ns;
+    } else if (opts.kerevalmeth==0) {          // faster Horner poly method
       set_kernel_args(kernel_args, x1, opts);
       set_kernel_args(kernel_args+ns, x2, opts);
       evaluate_kernel_vector(kernel_values, kernel_args, opts, 2*ns);
@@ -951,16 +1788,20 @@ void spread_subproblem_2d(BIGINT off1,BIGINT off2,BIGINT size1,BIGINT size2,
     }
     // Combine kernel with complex source value to simplify inner loop
     FLT ker1val[2*MAX_NSPREAD];    // here 2* is because of complex
-    for (int i = 0; i < ns; i++) {
-      ker1val[2*i] = re0*ker1[i];
-      ker1val[2*i+1] = im0*ker1[i];
-    }    
+    if (nc==1)
+      for (int i = 0; i < ns; i++)
+        ker1val[i] = re0*ker1[i];
+    else
+      for (int i = 0; i < ns; i++) {
+        ker1val[2*i] = re0*ker1[i];
+        ker1val[2*i+1] = im0*ker1[i];
+      }
     // critical inner loop:
     for (int dy=0; dy<ns; ++dy) {
       BIGINT j = size1*(i2-off2+dy) + i1-off1;   // should be in subgrid
       FLT kerval = ker2[dy];
-      FLT *trg = du+2*j;
-      for (int dx=0; dx<2*ns; ++dx) {
+      FLT *trg = du+nc*j;
+      for (int dx=0; dx<nc*ns; ++dx) {
 	trg[dx] += kerval*ker1val[dx];
       }	
     }
@@ -970,28 +1811,31 @@ void spread_subproblem_2d(BIGINT off1,BIGINT off2,BIGINT size1,BIGINT size2,
 void spread_subproblem_3d(BIGINT off1,BIGINT off2,BIGINT off3,BIGINT size1,
                           BIGINT size2,BIGINT size3,FLT *du,BIGINT M,
 			  FLT *kx,FLT *ky,FLT *kz,FLT *dd,
-			  const spread_opts& opts)
+			  const spread_opts& opts, FLT *ktab)
 /* spreader from dd (NU) to du (uniform) in 3D without wrapping.
    See above docs/notes for spread_subproblem_2d.
    kx,ky,kz (size M) are NU locations in [off+ns/2,off+size-1-ns/2] in each dim.
    dd (size M complex) are complex source strengths
    du (size size1*size2*size3) is uniform complex output array
+   If opts.realgrid, dd and du are instead real (one FLT per entry).
+   ktab (size M*3*ns, or NULL) are kernel values to use (see kernelTable).
  */
 {
   int ns=opts.nspread;
   FLT ns2 = (FLT)ns/2;          // half spread width
-  for (BIGINT i=0;i<2*size1*size2*size3;++i)
+  int nc = opts.realgrid ? 1 : 2;        // # FLTs per entry of dd and du
+  for (BIGINT i=0;i<nc*size1*size2*size3;++i)
     du[i] = 0.0;
   FLT kernel_args[3*MAX_NSPREAD];
   // Kernel values stored in consecutive memory. This allows us to compute
   // values in all three directions in a single kernel evaluation call.
   FLT kernel_values[3*MAX_NSPREAD];
-  FLT *ker1 = kernel_values;
-  FLT *ker2 = kernel_values + ns;
-  FLT *ker3 = kernel_values + 2*ns;  
   for (BIGINT i=0; i<M; i++) {           // loop over NU pts
-    FLT re0 = dd[2*i];
-    FLT im0 = dd[2*i+1];
+    FLT *ker1 = kernel_values;
+    FLT *ker2 = kernel_values + ns;
+    FLT *ker3 = kernel_values + 2*ns;
+    FLT re0 = dd[nc*i];
+    FLT im0 = (nc==2) ? dd[2*i+1] : 0.0;
     // ceil offset, hence rounding, must match that in get_subgrid...
     BIGINT i1 = (BIGINT)std::ceil(kx[i] - ns2);   // fine grid start indices
     BIGINT i2 = (BIGINT)std::ceil(ky[i] - ns2);
@@ -999,7 +1843,11 @@ void spread_subproblem_3d(BIGINT off1,BIGINT off2,BIGINT off3,BIGINT size1,
     FLT x1 = (FLT)i1 - kx[i];
     FLT x2 = (FLT)i2 - ky[i];
     FLT x3 = (FLT)i3 - kz[i];
-    if (opts.kerevalmeth==0) {          // faster Horner poly method
+    if (ktab) {                         // precomputed values
+      ker1 = ktab + 3*ns*i;
+      ker2 = ker1 + ns;
+      ker3 = ker1 + 2*ns;
+    } else if (opts.kerevalmeth==0) {          // faster Horner poly method
       set_kernel_args(kernel_args, x1, opts);
       set_kernel_args(kernel_args+ns, x2, opts);
       set_kernel_args(kernel_args+2*ns, x3, opts);
@@ -1011,18 +1859,22 @@ void spread_subproblem_3d(BIGINT off1,BIGINT off2,BIGINT off3,BIGINT size1,
     }
     // Combine kernel with complex source value to simplify inner loop
     FLT ker1val[2*MAX_NSPREAD];    // here 2* is because of complex
-    for (int i = 0; i < ns; i++) {
-      ker1val[2*i] = re0*ker1[i];
-      ker1val[2*i+1] = im0*ker1[i];	
-    }    
+    if (nc==1)
+      for (int i = 0; i < ns; i++)
+        ker1val[i] = re0*ker1[i];
+    else
+      for (int i = 0; i < ns; i++) {
+        ker1val[2*i] = re0*ker1[i];
+        ker1val[2*i+1] = im0*ker1[i];
+      }
     // critical inner loop:
     for (int dz=0; dz<ns; ++dz) {
       BIGINT oz = size1*size2*(i3-off3+dz);        // offset due to z
       for (int dy=0; dy<ns; ++dy) {
 	BIGINT j = oz + size1*(i2-off2+dy) + i1-off1;   // should be in subgrid
 	FLT kerval = ker2[dy]*ker3[dz];
-	FLT *trg = du+2*j;
-	for (int dx=0; dx<2*ns; ++dx) {
+	FLT *trg = du+nc*j;
+	for (int dx=0; dx<nc*ns; ++dx) {
 	  trg[dx] += kerval*ker1val[dx];
 	}	
       }
@@ -1032,11 +1884,12 @@ void spread_subproblem_3d(BIGINT off1,BIGINT off2,BIGINT off3,BIGINT size1,
 
 void add_wrapped_subgrid(BIGINT offset1,BIGINT offset2,BIGINT offset3,
 			 BIGINT size1,BIGINT size2,BIGINT size3,BIGINT N1,
-			 BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0)
+			 BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0, int nc)
 /* Add a large subgrid (du0) to output grid (data_uniform),
    with periodic wrapping to N1,N2,N3 box.
    offset1,2,3 give the offset of the subgrid from the lowest corner of output.
    size1,2,3 give the size of subgrid.
+   nc=2 for complex data, 1 for real (FLTs per entry of both grids).
    Works in all dims. Not thread-safe and must be called inside omp critical.
    Barnett 3/27/18 made separate routine, tried to speed up inner loop.
 */
@@ -1060,16 +1913,16 @@ void add_wrapped_subgrid(BIGINT offset1,BIGINT offset2,BIGINT offset3,
     BIGINT oz = N1*N2*o3[dz];            // offset due to z (0 in <3D)
     for (int dy=0; dy<size2; dy++) {
       BIGINT oy = oz + N1*o2[dy];        // off due to y & z (0 in 1D)
-      FLT *out = data_uniform + 2*oy;
-      FLT *in  = du0 + 2*size1*(dy + size2*dz);   // ptr to subgrid array
-      BIGINT o = 2*(offset1+N1);         // 1d offset for output
-      for (int j=0; j<2*nlo; j++)        // j is really dx/2 (since re,im parts)
+      FLT *out = data_uniform + nc*oy;
+      FLT *in  = du0 + nc*size1*(dy + size2*dz);   // ptr to subgrid array
+      BIGINT o = nc*(offset1+N1);         // 1d offset for output
+      for (int j=0; j<nc*nlo; j++)        // j is really nc*dx (re,im parts if nc=2)
 	out[j+o] += in[j];
-      o = 2*offset1;
-      for (int j=2*nlo; j<2*(size1-nhi); j++)
+      o = nc*offset1;
+      for (int j=nc*nlo; j<nc*(size1-nhi); j++)
 	out[j+o] += in[j];
-      o = 2*(offset1-N1);
-      for (int j=2*(size1-nhi); j<2*size1; j++)
+      o = nc*(offset1-N1);
+      for (int j=nc*(size1-nhi); j<nc*size1; j++)
       	out[j+o] += in[j];
     }
   }
@@ -1077,11 +1930,13 @@ void add_wrapped_subgrid(BIGINT offset1,BIGINT offset2,BIGINT offset3,
 
 void add_wrapped_subgrid_thread_safe(BIGINT offset1,BIGINT offset2,BIGINT offset3,
                                      BIGINT size1,BIGINT size2,BIGINT size3,BIGINT N1,
-                                     BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0)
+                                     BIGINT N2,BIGINT N3,FLT *data_uniform, FLT *du0,
+                                     int nc)
 /* Add a large subgrid (du0) to output grid (data_uniform),
    with periodic wrapping to N1,N2,N3 box.
    offset1,2,3 give the offset of the subgrid from the lowest corner of output.
    size1,2,3 give the size of subgrid.
+   nc=2 for complex data, 1 for real (FLTs per entry of both grids).
    Works in all dims. Thread-safe variant of the above routine,
    using atomic writes (R Blackwell, Nov 2020).
 */
@@ -1105,20 +1960,20 @@ void add_wrapped_subgrid_thread_safe(BIGINT offset1,BIGINT offset2,BIGINT offset
     BIGINT oz = N1*N2*o3[dz];            // offset due to z (0 in <3D)
     for (int dy=0; dy<size2; dy++) {
       BIGINT oy = oz + N1*o2[dy];        // off due to y & z (0 in 1D)
-      FLT *out = data_uniform + 2*oy;
-      FLT *in  = du0 + 2*size1*(dy + size2*dz);   // ptr to subgrid array
-      BIGINT o = 2*(offset1+N1);         // 1d offset for output
-      for (int j=0; j<2*nlo; j++) { // j is really dx/2 (since re,im parts)
+      FLT *out = data_uniform + nc*oy;
+      FLT *in  = du0 + nc*size1*(dy + size2*dz);   // ptr to subgrid array
+      BIGINT o = nc*(offset1+N1);         // 1d offset for output
+      for (int j=0; j<nc*nlo; j++) { // j is really nc*dx (re,im parts if nc=2)
 #pragma omp atomic
         out[j + o] += in[j];
       }
-      o = 2*offset1;
-      for (int j=2*nlo; j<2*(size1-nhi); j++) {
+      o = nc*offset1;
+      for (int j=nc*nlo; j<nc*(size1-nhi); j++) {
 #pragma omp atomic
         out[j + o] += in[j];
       }
-      o = 2*(offset1-N1);
-      for (int j=2*(size1-nhi); j<2*size1; j++) {
+      o = nc*(offset1-N1);
+      for (int j=nc*(size1-nhi); j<nc*size1; j++) {
 #pragma omp atomic
         out[j+o] += in[j];
       }
@@ -1127,38 +1982,17 @@ void add_wrapped_subgrid_thread_safe(BIGINT offset1,BIGINT offset2,BIGINT offset
 }
 
 
-void bin_sort_singlethread(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-	      BIGINT N1,BIGINT N2,BIGINT N3,int pirange,
-	      double bin_size_x,double bin_size_y,double bin_size_z, int debug)
-/* Returns permutation of all nonuniform points with good RAM access,
- * ie less cache misses for spreading, in 1D, 2D, or 3D. Single-threaded version
- *
- * This is achieved by binning into cuboids (of given bin_size within the
- * overall box domain), then reading out the indices within
- * these bins in a Cartesian cuboid ordering (x fastest, y med, z slowest).
- * Finally the permutation is inverted, so that the good ordering is: the
- * NU pt of index ret[0], the NU pt of index ret[1],..., NU pt of index ret[M-1]
- * 
- * Inputs: M - number of input NU points.
- *         kx,ky,kz - length-M arrays of real coords of NU pts, in the domain
- *                    for FOLDRESCALE, which includes [0,N1], [0,N2], [0,N3]
- *                    respectively, if pirange=0; or [-pi,pi] if pirange=1.
- *         N1,N2,N3 - integer sizes of overall box (N2=N3=1 for 1D, N3=1 for 2D)
- *         bin_size_x,y,z - what binning box size to use in each dimension
- *                    (in rescaled coords where ranges are [0,Ni] ).
- *                    For 1D, only bin_size_x is used; for 2D, it & bin_size_y.
- * Output:
- *         writes to ret a vector list of indices, each in the range 0,..,M-1.
- *         Thus, ret must have been preallocated for M BIGINTs.
- *
- * Notes: I compared RAM usage against declaring an internal vector and passing
- * back; the latter used more RAM and was slower.
- * Avoided the bins array, as in JFM's spreader of 2016,
- * tidied up, early 2017, Barnett.
- *
- * Timings (2017): 3s for M=1e8 NU pts on 1 core of i7; 5s on 1 core of xeon.
- */
+template <typename I>
+static void bin_sort_counting(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky,
+                              FLT *kz, BIGINT N1, BIGINT N2, BIGINT N3,
+                              int pirange, double bin_size_x,
+                              double bin_size_y, double bin_size_z, int debug,
+                              int nthr)
+/* The work of bin_sort, with the bins and NU pt indices held (in the working
+   arrays) as the unsigned integer type I, which must hold M and nbins.
+*/
 {
+  CNTime timer; timer.start();
   bool isky=(N2>1), iskz=(N3>1);  // ky,kz avail? (cannot access if not)
   // here the +1 is needed to allow round-off error causing i1=N1/bin_size_x,
   // for kx near +pi, ie foldrescale gives N1 (exact arith would be 0 to N1-1).
@@ -1167,119 +2001,170 @@ void bin_sort_singlethread(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
   nbins2 = isky ? N2/bin_size_y+1 : 1;
   nbins3 = iskz ? N3/bin_size_z+1 : 1;
   BIGINT nbins = nbins1*nbins2*nbins3;
+  int nt = (int)min(M,(BIGINT)nthr);  // handle case of less points than threads
+  std::vector<BIGINT> brk(nt+1);      // list of start NU pt indices per thread
+  for (int t=0; t<=nt; ++t)
+    brk[t] = (BIGINT)(0.5 + M*t/(double)nt);   // start index for t'th chunk
 
-  std::vector<BIGINT> counts(nbins,0);  // count how many pts in each bin
+  // the bin of each NU pt, found once...
+  std::vector<I> key(M);
+#pragma omp parallel for num_threads(nt) schedule(static)
   for (BIGINT i=0; i<M; i++) {
-    // find the bin index in however many dims are needed
     BIGINT i1=FOLDRESCALE(kx[i],N1,pirange)/bin_size_x, i2=0, i3=0;
     if (isky) i2 = FOLDRESCALE(ky[i],N2,pirange)/bin_size_y;
     if (iskz) i3 = FOLDRESCALE(kz[i],N3,pirange)/bin_size_z;
-    BIGINT bin = i1+nbins1*(i2+nbins2*i3);
-    counts[bin]++;
+    key[i] = (I)(i1+nbins1*(i2+nbins2*i3));
   }
-  std::vector<BIGINT> offsets(nbins);   // cumulative sum of bin counts
-  offsets[0]=0;     // do: offsets = [0 cumsum(counts(1:end-1)]
-  for (BIGINT i=1; i<nbins; i++)
-    offsets[i]=offsets[i-1]+counts[i-1];
-  
-  std::vector<BIGINT> inv(M);           // fill inverse map
-  for (BIGINT i=0; i<M; i++) {
-    // find the bin index (again! but better than using RAM)
-    BIGINT i1=FOLDRESCALE(kx[i],N1,pirange)/bin_size_x, i2=0, i3=0;
-    if (isky) i2 = FOLDRESCALE(ky[i],N2,pirange)/bin_size_y;
-    if (iskz) i3 = FOLDRESCALE(kz[i],N3,pirange)/bin_size_z;
-    BIGINT bin = i1+nbins1*(i2+nbins2*i3);
-    BIGINT offset=offsets[bin];
-    offsets[bin]++;
-    inv[i]=offset;
+  // superbins: blocks of 2^sh consecutive bins, at most MAX_SUPERBINS of
+  // them, and at most M/nt (or 1024) so that the counts below are O(M)
+  BIGINT maxsup = min((BIGINT)MAX_SUPERBINS, max((BIGINT)1024, M/nt));
+  int sh = 0;
+  while (((nbins-1)>>sh) >= maxsup)
+    ++sh;
+  BIGINT nsup = ((nbins-1)>>sh) + 1;
+  if (debug)
+    printf("\tbin_sort: %lld bins, %lld superbins, %d threads, %d-byte ints\n",
+           (long long)nbins, (long long)nsup, nt, (int)sizeof(I));
+
+  // 1) stable counting sort by superbin: per-thread counts, offsets...
+  std::vector<I> ot(nt*nsup, 0);       // ot[t*nsup+b]: thread t's pts in b
+#pragma omp parallel num_threads(nt)
+  {
+    int t = MY_OMP_GET_THREAD_NUM();
+    I* c = ot.data() + t*nsup;
+    for (BIGINT i=brk[t]; i<brk[t+1]; i++)
+      c[key[i]>>sh]++;
   }
-  // invert the map, writing to output pointer (writing pattern is random)
-  for (BIGINT i=0; i<M; i++)
-    ret[inv[i]]=i;
+  std::vector<BIGINT> start(nsup+1);   // start of each superbin in the output
+  BIGINT off = 0;
+  for (BIGINT b=0; b<nsup; ++b) {      // cumsum in (superbin, thread) order
+    start[b] = off;
+    for (int t=0; t<nt; ++t) {
+      BIGINT n = ot[t*nsup+b];
+      ot[t*nsup+b] = (I)off;
+      off += n;
+    }
+  }
+  start[nsup] = M;
+  // ...then each thread writes its pts to its slots of ret, in order (since
+  // the superbins are few, this writes to few places at a time, in cache),
+  // and if sh>0 the low bits of their bins to the same slots of tmpk
+  std::vector<I> tmpk(sh ? M : 0);
+  I mask = (I)(((BIGINT)1<<sh)-1);
+#pragma omp parallel num_threads(nt)
+  {
+    int t = MY_OMP_GET_THREAD_NUM();
+    I* o = ot.data() + t*nsup;
+    if (sh==0)                         // superbins are the bins: done
+      for (BIGINT i=brk[t]; i<brk[t+1]; i++)
+        ret[o[key[i]]++] = i;
+    else
+      for (BIGINT i=brk[t]; i<brk[t+1]; i++) {
+        BIGINT j = o[key[i]>>sh]++;
+        ret[j] = i;
+        tmpk[j] = key[i] & mask;
+      }
+  }
+  if (debug) printf("\tbin_sort bins & superbins:\t%.3g s\n",timer.restart());
+  if (sh==0)
+    return;
+  std::vector<I>().swap(key);          // free
+
+  // 2) stable counting sort of each superbin by the low bits of the bins, in
+  // parallel, from a copy of its range of ret (of size M/nsup or so)
+#pragma omp parallel num_threads(nt)
+  {
+    std::vector<BIGINT> cnt((BIGINT)1<<sh);
+    std::vector<I> buf;                // the copy
+#pragma omp for schedule(dynamic,1)
+    for (BIGINT b=0; b<nsup; ++b) {
+      BIGINT lo = start[b], hi = start[b+1];
+      if (lo==hi)
+        continue;
+      if ((BIGINT)buf.size() < hi-lo)
+        buf.resize(hi-lo);
+      for (BIGINT j=lo; j<hi; j++)
+        buf[j-lo] = (I)ret[j];
+      BIGINT nlow = min((BIGINT)1<<sh, nbins-(b<<sh));  // bins in superbin
+      std::fill(cnt.begin(), cnt.begin()+nlow, 0);
+      for (BIGINT j=lo; j<hi; j++)
+        cnt[tmpk[j]]++;
+      BIGINT o = lo;
+      for (BIGINT k=0; k<nlow; k++) {
+        BIGINT n = cnt[k];
+        cnt[k] = o;
+        o += n;
+      }
+      for (BIGINT j=lo; j<hi; j++)
+        ret[cnt[tmpk[j]]++] = buf[j-lo];
+    }
+  }
+  if (debug) printf("\tbin_sort within superbins:\t%.3g s\n",timer.elapsedsec());
 }
 
-void bin_sort_multithread(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
-	      BIGINT N1,BIGINT N2,BIGINT N3,int pirange,
+void bin_sort(BIGINT *ret, BIGINT M, FLT *kx, FLT *ky, FLT *kz,
+              BIGINT N1,BIGINT N2,BIGINT N3,int pirange,
               double bin_size_x,double bin_size_y,double bin_size_z, int debug,
               int nthr)
-/* Mostly-OpenMP'ed version of bin_sort.
-   For documentation see: bin_sort_singlethread.
-   Caution: when M (# NU pts) << N (# U pts), is SLOWER than single-thread.
-   Barnett 2/8/18
-   Explicit #threads control argument 7/20/20.
-   Todo: if debug, print timing breakdowns.
+/* Returns permutation of all nonuniform points with good RAM access,
+ * ie less cache misses for spreading, in 1D, 2D, or 3D, using nthr threads.
+ *
+ * This is achieved by binning into cuboids (of given bin_size within the
+ * overall box domain), then reading out the indices within
+ * these bins in a Cartesian cuboid ordering (x fastest, y med, z slowest).
+ * Within a bin the pts keep their input order (the sort is stable), so the
+ * result does not depend on nthr. The good ordering is: the NU pt of index
+ * ret[0], the NU pt of index ret[1],..., NU pt of index ret[M-1]
+ * 
+ * Inputs: M - number of input NU points.
+ *         kx,ky,kz - length-M arrays of real coords of NU pts, in the domain
+ *                    for FOLDRESCALE, which includes [0,N1], [0,N2], [0,N3]
+ *                    respectively, if pirange=0; or [-pi,pi] if pirange=1.
+ *         N1,N2,N3 - integer sizes of overall box (N2=N3=1 for 1D, N3=1 for 2D)
+ *         bin_size_x,y,z - what binning box size to use in each dimension
+ *                    (in rescaled coords where ranges are [0,Ni] ).
+ *                    For 1D, only bin_size_x is used; for 2D, it & bin_size_y.
+ *         debug - if nonzero, print timings of the stages.
+ *         nthr - number of threads to use.
+ * Output:
+ *         writes to ret a vector list of indices, each in the range 0,..,M-1.
+ *         Thus, ret must have been preallocated for M BIGINTs.
+ *
+ * Method: the bin of each pt is computed once. If there are at most
+ * MAX_SUPERBINS bins, a parallel counting sort (each thread counting, then
+ * writing, its own contiguous chunk of pts) writes ret directly. Otherwise
+ * the bins are grouped into at most MAX_SUPERBINS superbins of 2^sh
+ * consecutive bins, and such a counting sort by superbin is followed by a
+ * counting sort of each superbin by the low sh bits of its bins, the
+ * superbins being shared out among the threads. Thus both passes write to
+ * few places at a time, or within a small range, also when there are many
+ * more bins than pts (where the old per-thread counts of all bins made
+ * multithreading slower than one thread). The cost is
+ * O((M+nbins)/nthr + nthr*MAX_SUPERBINS). The working arrays (the bins, then
+ * their low bits in superbin order, ret itself holding the pts) are 32-bit
+ * when M, nbins < 2^31, and so are the per-thread counts, which are capped at
+ * O(M): at most two such arrays are held at once, and no inverse permutation
+ * is formed.
+ *
+ * Barnett 2017, multithreaded 2/8/18; one stable two-pass counting sort,
+ * replacing bin_sort_singlethread and bin_sort_multithread.
  */
 {
-  bool isky=(N2>1), iskz=(N3>1);  // ky,kz avail? (cannot access if not)
-  BIGINT nbins1=N1/bin_size_x+1, nbins2, nbins3;  // see above note on why +1
-  nbins2 = isky ? N2/bin_size_y+1 : 1;
-  nbins3 = iskz ? N3/bin_size_z+1 : 1;
-  BIGINT nbins = nbins1*nbins2*nbins3;
-  if (nthr==0)
+  if (nthr<=0) {
     fprintf(stderr,"[%s] nthr (%d) must be positive!\n",__func__,nthr);
-  int nt = min(M,(BIGINT)nthr);     // handle case of less points than threads
-  std::vector<BIGINT> brk(nt+1);    // list of start NU pt indices per thread
-
-  // distribute the NU pts to threads once & for all...
-  for (int t=0; t<=nt; ++t)
-    brk[t] = (BIGINT)(0.5 + M*t/(double)nt);   // start index for t'th chunk
-  
-  std::vector<BIGINT> counts(nbins,0);     // global counts: # pts in each bin
-  // offsets per thread, size nt * nbins, init to 0 by copying the counts vec...
-  std::vector< std::vector<BIGINT> > ot(nt,counts);
-  {    // scope for ct, the 2d array of counts in bins for each thread's NU pts
-    std::vector< std::vector<BIGINT> > ct(nt,counts);   // nt * nbins, init to 0
-    
-#pragma omp parallel num_threads(nt)
-    {  // parallel binning to each thread's count. Block done once per thread
-      int t = MY_OMP_GET_THREAD_NUM();     // (we assume all nt threads created)
-      //printf("\tt=%d: [%d,%d]\n",t,jlo[t],jhi[t]);
-      for (BIGINT i=brk[t]; i<brk[t+1]; i++) {
-        // find the bin index in however many dims are needed
-        BIGINT i1=FOLDRESCALE(kx[i],N1,pirange)/bin_size_x, i2=0, i3=0;
-        if (isky) i2 = FOLDRESCALE(ky[i],N2,pirange)/bin_size_y;
-        if (iskz) i3 = FOLDRESCALE(kz[i],N3,pirange)/bin_size_z;
-        BIGINT bin = i1+nbins1*(i2+nbins2*i3);
-        ct[t][bin]++;               // no clash btw threads
-      }
-    }
-    // sum along thread axis to get global counts
-    for (BIGINT b=0; b<nbins; ++b)   // (not worth omp. Either loop order is ok)
-      for (int t=0; t<nt; ++t)
-	counts[b] += ct[t][b];
-    
-    std::vector<BIGINT> offsets(nbins);   // cumulative sum of bin counts
-    // do: offsets = [0 cumsum(counts(1:end-1))] ...
-    offsets[0] = 0;
-    for (BIGINT i=1; i<nbins; i++)
-      offsets[i]=offsets[i-1]+counts[i-1];
-    
-    for (BIGINT b=0; b<nbins; ++b)  // now build offsets for each thread & bin:
-      ot[0][b] = offsets[b];                     // init
-    for (int t=1; t<nt; ++t)   // (again not worth omp. Either loop order is ok)
-      for (BIGINT b=0; b<nbins; ++b)
-	ot[t][b] = ot[t-1][b]+ct[t-1][b];        // cumsum along t axis
-    
-  }  // scope frees up ct here, before inv alloc
-  
-  std::vector<BIGINT> inv(M);           // fill inverse map, in parallel
-#pragma omp parallel num_threads(nt)
-  {
-    int t = MY_OMP_GET_THREAD_NUM();
-    for (BIGINT i=brk[t]; i<brk[t+1]; i++) {
-      // find the bin index (again! but better than using RAM)
-      BIGINT i1=FOLDRESCALE(kx[i],N1,pirange)/bin_size_x, i2=0, i3=0;
-      if (isky) i2 = FOLDRESCALE(ky[i],N2,pirange)/bin_size_y;
-      if (iskz) i3 = FOLDRESCALE(kz[i],N3,pirange)/bin_size_z;
-      BIGINT bin = i1+nbins1*(i2+nbins2*i3);
-      inv[i]=ot[t][bin];   // get the offset for this NU pt and thread
-      ot[t][bin]++;               // no clash
-    }
+    nthr = 1;
   }
-  // invert the map, writing to output pointer (writing pattern is random)
-#pragma omp parallel for num_threads(nt) schedule(dynamic,10000)
-  for (BIGINT i=0; i<M; i++)
-    ret[inv[i]]=i;
+  if (M==0)
+    return;
+  BIGINT nbins = (BIGINT)(N1/bin_size_x+1) *
+    ((N2>1) ? (BIGINT)(N2/bin_size_y+1) : 1) *
+    ((N3>1) ? (BIGINT)(N3/bin_size_z+1) : 1);
+  if (M < ((BIGINT)1<<31) && nbins < ((BIGINT)1<<31))
+    bin_sort_counting<uint32_t>(ret,M,kx,ky,kz,N1,N2,N3,pirange,bin_size_x,
+                                bin_size_y,bin_size_z,debug,nthr);
+  else
+    bin_sort_counting<uint64_t>(ret,M,kx,ky,kz,N1,N2,N3,pirange,bin_size_x,
+                                bin_size_y,bin_size_z,debug,nthr);
 }
 
 
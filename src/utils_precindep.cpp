@@ -8,6 +8,12 @@
 #include "dataTypes.h"
 #include "defs.h"
 
+#ifdef __APPLE__
+#include <sys/sysctl.h>
+#elif !defined(_WIN32)
+#include <unistd.h>
+#endif
+
 
 BIGINT next235even(BIGINT n)
 // finds even integer not less than n, with prime factors no larger than 5
@@ -71,6 +77,108 @@ int get_num_threads_parallel_block()
 }
 
 
+// --------------------------- CPU cache sizes --------------------------------
+void get_cache_sizes(BIGINT *l1, BIGINT *l2)
+// Sizes in bytes of the L1 data cache and the L2 cache of the CPU, as reported
+// by the OS (sysconf on linux, sysctl on mac), or 32 KB and 1 MB where they
+// are not available. Only detected on the first call.
+{
+  static BIGINT c1 = 0, c2 = 0;
+#pragma omp critical (finufft_cache_sizes)
+  {
+    if (c1==0) {
+      long s1 = 0, s2 = 0;
+#if defined(__APPLE__)
+      size_t len = sizeof(long long);
+      long long v = 0;
+      if (sysctlbyname("hw.l1dcachesize", &v, &len, NULL, 0)==0) s1 = (long)v;
+      len = sizeof(long long); v = 0;
+      if (sysctlbyname("hw.l2cachesize", &v, &len, NULL, 0)==0) s2 = (long)v;
+#elif defined(_SC_LEVEL1_DCACHE_SIZE) && defined(_SC_LEVEL2_CACHE_SIZE)
+      s1 = sysconf(_SC_LEVEL1_DCACHE_SIZE);
+      s2 = sysconf(_SC_LEVEL2_CACHE_SIZE);
+#endif
+      c2 = (s2>0) ? s2 : (1<<20);
+      c1 = (s1>0) ? s1 : (1<<15);     // (written last: tested above)
+    }
+  }
+  *l1 = c1;
+  *l2 = c2;
+}
+
+
+// ------------------ per-thread scratch arenas (thread_arenas.h) -------------
+#define ARENA_ALIGN 64      // bytes; a cache line, and enough for any SIMD
+
+void arenas_init(thread_arenas* a)
+// Sets a to hold no slots (no allocation).
+{
+  a->n = 0;
+  a->cap = NULL; a->raw = NULL; a->buf = NULL;
+}
+
+int arenas_resize(thread_arenas* a, int n)
+// Ensures a has at least n slots, new ones empty. Not thread-safe: call
+// outside of any parallel region using a. Returns 0 if success, 1 if alloc
+// failed (in which case a is unchanged).
+{
+  if (n<=a->n)
+    return 0;
+  size_t* cap = (size_t*)realloc(a->cap, sizeof(size_t)*n);
+  if (!cap) return 1;
+  a->cap = cap;
+  char** raw = (char**)realloc(a->raw, sizeof(char*)*n);
+  if (!raw) return 1;
+  a->raw = raw;
+  char** buf = (char**)realloc(a->buf, sizeof(char*)*n);
+  if (!buf) return 1;
+  a->buf = buf;
+  for (int i=a->n; i<n; ++i) {
+    a->cap[i] = 0; a->raw[i] = NULL; a->buf[i] = NULL;
+  }
+  a->n = n;
+  return 0;
+}
+
+void* arena_get(thread_arenas* a, int i, size_t bytes)
+// Returns slot i (which must be <a->n) of a, grown if needed to hold at least
+// bytes, ARENA_ALIGN-aligned; its old contents are lost if it grew. Distinct
+// slots may be got by different threads at once. Returns NULL if alloc failed.
+{
+  if (bytes<=a->cap[i])
+    return a->buf[i];
+  free(a->raw[i]);
+  bytes += bytes/4;                       // some slack to grow into
+  char* raw = (char*)malloc(bytes + ARENA_ALIGN);
+  a->raw[i] = raw;
+  if (!raw) {
+    a->cap[i] = 0; a->buf[i] = NULL;
+    return NULL;
+  }
+  a->buf[i] = raw + (ARENA_ALIGN - (size_t)raw % ARENA_ALIGN) % ARENA_ALIGN;
+  a->cap[i] = bytes;
+  return a->buf[i];
+}
+
+size_t arenas_bytes(const thread_arenas* a)
+// Total bytes held by all slots of a.
+{
+  size_t b = 0;
+  for (int i=0; i<a->n; ++i)
+    b += a->cap[i];
+  return b;
+}
+
+void arenas_free(thread_arenas* a)
+// Frees all slots of a, leaving it as after arenas_init.
+{
+  for (int i=0; i<a->n; ++i)
+    free(a->raw[i]);
+  free(a->cap); free(a->raw); free(a->buf);
+  arenas_init(a);
+}
+
+
 // ---------- thread-safe rand number generator for Windows platform ---------
 // (note this is used by macros in defs.h, and supplied in linux/macosx)
 #ifdef _WIN32